@@ -0,0 +1,113 @@
+import os
+import time
+
+import carla
+
+# ---------------------------------------------------------
+# Actor Registry and World Reuse
+# ---------------------------------------------------------
+# ActorRegistry keeps every actor a run spawns (ego, NPC, camera, traffic)
+# so teardown is one client.apply_batch_sync of DestroyActor commands
+# instead of a filter over the whole world and one RPC per actor. Sensors
+# are stopped first so no callback fires into a closed run folder.
+#
+# prepare_world() skips load_world when the server already has the town
+# loaded from an earlier run in this process: it clears any vehicles and
+# sensors left behind (one batch), unfreezes and resets the traffic lights
+# and hands back the same world. Set CARLA_FAST_RESET=0 to always reload.
+
+FAST_RESET = os.environ.get("CARLA_FAST_RESET", "1") != "0"
+LOAD_SETTLE = 2.0                # s to wait after load_world
+
+_loaded_towns = {}               # world.id -> town loaded by prepare_world
+
+
+class ActorRegistry:
+    def __init__(self, client, world):
+        self.client = client
+        self.world = world
+        self.actors = {}         # id -> actor, in spawn order
+
+    def __len__(self):
+        return len(self.actors)
+
+    def add(self, actor):
+        """Track an actor spawned elsewhere. None is passed through."""
+        if actor is not None:
+            self.actors[actor.id] = actor
+        return actor
+
+    def spawn(self, blueprint, transform, attach_to=None):
+        return self.add(self.world.spawn_actor(blueprint, transform, attach_to=attach_to))
+
+    def try_spawn(self, blueprint, transform, attach_to=None):
+        return self.add(self.world.try_spawn_actor(blueprint, transform, attach_to=attach_to))
+
+    def spawn_batch(self, spawns, autopilot=False, tm_port=8000):
+        """
+        Spawn [(blueprint, transform), ...] in one apply_batch_sync; an item
+        may add a parent id as a third element (e.g. walker controllers).
+        With autopilot, each vehicle is handed to the traffic manager in the
+        same batch. Returns the new actor ids (failed spawns are skipped).
+        """
+        batch = []
+        for blueprint, transform, *parent in spawns:
+            cmd = carla.command.SpawnActor(blueprint, transform, *parent)
+            if autopilot:
+                cmd = cmd.then(carla.command.SetAutopilot(carla.command.FutureActor, True, tm_port))
+            batch.append(cmd)
+
+        ids = [r.actor_id for r in self.client.apply_batch_sync(batch, False) if not r.error]
+        for actor in self.world.get_actors(ids):
+            self.actors[actor.id] = actor
+        return ids
+
+    def destroy_all(self):
+        """Destroy every tracked actor in one batch; returns how many were destroyed."""
+        if not self.actors:
+            return 0
+        for actor in self.actors.values():
+            if getattr(actor, "is_listening", False):
+                actor.stop()
+
+        # Children (the camera) before the vehicles they are attached to
+        batch = [carla.command.DestroyActor(i) for i in reversed(list(self.actors))]
+        responses = self.client.apply_batch_sync(batch, False)
+        self.actors = {}
+        return sum(1 for r in responses if not r.error)
+
+
+# ---------------------------------------------------------
+# World Setup
+# ---------------------------------------------------------
+def destroy_leftovers(client, world):
+    """Vehicles and sensors still in the world (e.g. from a crashed run), in one batch."""
+    actors = world.get_actors()
+    leftovers = list(actors.filter("sensor.*")) + list(actors.filter("vehicle.*"))
+    for actor in leftovers:
+        if getattr(actor, "is_listening", False):
+            actor.stop()
+    if leftovers:
+        client.apply_batch_sync([carla.command.DestroyActor(a.id) for a in leftovers], False)
+    return len(leftovers)
+
+
+def prepare_world(client, town_name, clock=time):
+    """
+    World ready for a new run: the loaded one, reset, when it is already
+    town_name; otherwise a fresh load_world. Returns (world, reused).
+    """
+    if FAST_RESET:
+        world = client.get_world()
+        if _loaded_towns.get(world.id) == town_name:
+            removed = destroy_leftovers(client, world)
+            world.freeze_all_traffic_lights(False)
+            world.reset_all_traffic_lights()
+            print(f"Reusing loaded {town_name} (removed {removed} leftover actors)")
+            return world, True
+
+    world = client.load_world(town_name)
+    clock.sleep(LOAD_SETTLE)
+    _loaded_towns.clear()
+    _loaded_towns[world.id] = town_name
+    return world, False
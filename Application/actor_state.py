@@ -0,0 +1,122 @@
+import carla
+
+# ---------------------------------------------------------
+# Snapshot Reads and Batched Commands
+# ---------------------------------------------------------
+# The scenario controllers talk to vehicles through ActorState proxies
+# instead of carla.Actor. Once per tick TickState.refresh() takes one
+# world.get_snapshot() and every get_velocity / get_location /
+# get_transform is answered from it. apply_control, set_light_state and
+# the spectator transform are queued and sent together by
+# TickState.flush() in a single client.apply_batch. Light states are only
+# sent when they change.
+#
+# Anything the proxy does not implement (destroy, set_autopilot, ...) is
+# forwarded to the real actor, and attributes the controllers set on the
+# proxy (warning_start, s6_drift, ...) stay on the proxy. TickState is
+# passed to the controllers in place of the world the same way: get_map()
+# is fetched once (it is an RPC plus an OpenDRIVE parse on a real server)
+# and everything else goes to the real world.
+
+
+class ActorState:
+    def __init__(self, actor, tick_state):
+        self.actor = actor
+        self.id = actor.id
+        self._tick = tick_state
+        self._snapshot = None
+        self._control = None
+        self._light_state = None
+
+    def __getattr__(self, name):
+        # Only reached for names not set on the proxy itself
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.actor, name)
+
+    # -----------------------------------------------------
+    # Reads (from the tick's snapshot)
+    # -----------------------------------------------------
+    def _state(self):
+        if self._snapshot is None:
+            # Not in the snapshot yet (spawned since the last tick): ask the server
+            return self.actor
+        return self._snapshot
+
+    def get_transform(self):
+        return self._state().get_transform()
+
+    def get_location(self):
+        return self._state().get_transform().location
+
+    def get_velocity(self):
+        return self._state().get_velocity()
+
+    def get_control(self):
+        """The last control sent through this proxy (read from the actor only once)."""
+        if self._control is None:
+            self._control = self.actor.get_control()
+        return carla.VehicleControl(
+            throttle=self._control.throttle, steer=self._control.steer, brake=self._control.brake,
+            hand_brake=self._control.hand_brake, reverse=self._control.reverse,
+            manual_gear_shift=self._control.manual_gear_shift, gear=self._control.gear,
+        )
+
+    # -----------------------------------------------------
+    # Writes (queued until TickState.flush)
+    # -----------------------------------------------------
+    def apply_control(self, control):
+        self._control = control
+        self._tick.queue(carla.command.ApplyVehicleControl(self.id, control))
+
+    def set_light_state(self, light_state):
+        if self._light_state is not None and int(light_state) == int(self._light_state):
+            return
+        self._light_state = light_state
+        self._tick.queue(carla.command.SetVehicleLightState(self.id, light_state))
+
+    def set_transform(self, transform):
+        self._tick.queue(carla.command.ApplyTransform(self.id, transform))
+
+
+class TickState:
+    """One snapshot read and one command batch per tick."""
+
+    def __init__(self, world, client):
+        self.world = world
+        self.client = client
+        self.snapshot = None
+        self.actors = {}
+        self.commands = []
+        self._map = None
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.world, name)
+
+    def get_map(self):
+        if self._map is None:
+            self._map = self.world.get_map()
+        return self._map
+
+    def track(self, actor):
+        proxy = ActorState(actor, self)
+        self.actors[actor.id] = proxy
+        if self.snapshot is not None:
+            proxy._snapshot = self.snapshot.find(actor.id)
+        return proxy
+
+    def queue(self, command):
+        self.commands.append(command)
+
+    def refresh(self):
+        self.snapshot = self.world.get_snapshot()
+        for actor_id, proxy in self.actors.items():
+            proxy._snapshot = self.snapshot.find(actor_id)
+        return self.snapshot
+
+    def flush(self):
+        if self.commands:
+            self.client.apply_batch(self.commands)
+            self.commands = []
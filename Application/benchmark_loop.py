@@ -0,0 +1,320 @@
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("CARLA_SIM_MUTE", "1")
+
+from capture_profiles import CAPTURE_PROFILES
+from driver_input import DriverInput
+from loop_profiler import PhaseTimer, PERCENTILES
+
+# ---------------------------------------------------------
+# Control-Loop Latency Benchmark
+# ---------------------------------------------------------
+# Runs every scenario / driver class headless through run_scenario with a
+# PhaseTimer attached and writes per-phase percentiles, histograms and
+# achieved ticks per second to JSON. A stored baseline can be compared
+# against with a relative threshold; any regression exits non-zero.
+# Each case runs --repeat times and the median of every number is kept.
+# Only the phases the loop itself owns (GATED_PHASES) and ticks/s fail
+# the check; sensor, tick and the rest depend on the server and the disk.
+# Runs use the "benchmark" capture profile unless --capture says otherwise.
+#
+#     python benchmark_loop.py --out bench.json --save-baseline baseline.json
+#     python benchmark_loop.py --out bench.json --compare baseline.json --threshold 0.2
+#
+# The default backend is the kinematic_carla stand-in, which needs no
+# server and measures the Python side of the loop. --backend carla runs
+# against a real server on CARLA_HOST / CARLA_PORT. --inputs replays a
+# driver_input script (e.g. OK at t=10.5) so the OK paths are covered too.
+#
+# --traffic switches to a scaling run: one scenario (--scenarios, default
+# 2) with N background vehicles for each N given, reporting ticks/s and
+# the whole-loop latency ("loop", tick to tick) per N:
+#
+#     python benchmark_loop.py --traffic 0 50 100 200 300 --walkers 0.5
+
+SCENARIO_TOWNS = {1: "Town01", 2: "Town04", 3: "Town01", 4: "Town05", 5: "Town05", 6: "Town04"}
+DRIVER_CLASSES = ["alert", "slightly drowsy", "very drowsy", "critical drowsiness"]
+GATED_PERCENTILES = ("p50_us",)   # tails are reported, but too noisy on shared hosts to gate on
+GATED_PHASES = ("controller", "submit", "log", "hazards")
+DEFAULT_CAPTURE = "benchmark" if "benchmark" in CAPTURE_PROFILES else "off"
+MIN_GATED_US = 20.0               # phases faster than this are dominated by timer overhead
+
+
+def default_cases():
+    """Driver class only changes the controller in scenarios 1 and 2."""
+    cases = []
+    for scenario_id in (1, 2):
+        for driver_class in DRIVER_CLASSES:
+            cases.append((scenario_id, driver_class))
+    for scenario_id in (3, 4, 5, 6):
+        cases.append((scenario_id, "alert"))
+    return cases
+
+
+def case_key(scenario_id, driver_class):
+    return f"s{scenario_id}/{driver_class.replace(' ', '_')}"
+
+
+def calibrate(rounds=7):
+    """
+    Times a fixed pure-Python workload (best of `rounds`, in us). compare()
+    scales the baseline by the ratio of calibrations, so a slower or busier
+    machine does not read as a regression of the loop itself.
+    """
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter_ns()
+        acc = 0.0
+        for i in range(20000):
+            acc += math.sqrt(i) * 0.5
+        elapsed = (time.perf_counter_ns() - start) / 1000.0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _make_client(backend):
+    if backend == "kinematic":
+        import kinematic_carla
+        kinematic_carla.install()
+        client = kinematic_carla.Client()
+        return client, client.clock
+
+    import carla
+    from carla_simulation import CARLA_HOST, CARLA_PORT
+    client = carla.Client(CARLA_HOST, CARLA_PORT)
+    client.set_timeout(30.0)
+    return client, time
+
+
+def run_case(client, clock, scenario_id, driver_class, output_root, capture=DEFAULT_CAPTURE, inputs=None,
+             traffic=0):
+    from carla_simulation import run_scenario
+
+    timer = PhaseTimer()
+    start = time.perf_counter()
+    run_scenario(client, SCENARIO_TOWNS[scenario_id], scenario_id, driver_class,
+                 output_root=output_root, clock=clock, tracer=timer, capture=capture,
+                 inputs=inputs or DriverInput(), traffic=traffic)
+    wall = time.perf_counter() - start
+
+    return {
+        "scenario_id": scenario_id,
+        "driver_class": driver_class,
+        "wall_s": wall,
+        "ticks": len(timer.samples.get("tick", ())),
+        "ticks_per_second": timer.ticks_per_second(),
+        "phases": timer.summary(),
+    }
+
+
+def median_case(runs):
+    """
+    One case from `repeat` runs: ticks/s and every phase percentile are the
+    median over the runs, so one lucky or disturbed run moves nothing.
+    """
+    case = dict(sorted(runs, key=lambda r: r["ticks_per_second"])[len(runs) // 2])
+    case["ticks_per_second"] = statistics.median(r["ticks_per_second"] for r in runs)
+    case["wall_s"] = statistics.median(r["wall_s"] for r in runs)
+    case["repeats_ticks_per_second"] = [r["ticks_per_second"] for r in runs]
+
+    phases = {}
+    for phase, stats in case["phases"].items():
+        samples = [r["phases"][phase] for r in runs if phase in r["phases"]]
+        phases[phase] = dict(stats)
+        for name in stats:
+            if name.endswith("_us"):
+                phases[phase][name] = statistics.median(s[name] for s in samples)
+    case["phases"] = phases
+    return case
+
+
+def run_benchmark(cases, backend="kinematic", repeat=3, capture=DEFAULT_CAPTURE, inputs=None):
+    """Each case runs `repeat` times; the median of each number is kept (see median_case)."""
+    client, clock = _make_client(backend)
+    results = {}
+    calibration_before = calibrate()
+
+    with tempfile.TemporaryDirectory(prefix="bench_loop_") as output_root:
+        for scenario_id, driver_class in cases:
+            key = case_key(scenario_id, driver_class)
+            print(f"Running {key} ...")
+            runs = [run_case(client, clock, scenario_id, driver_class, output_root, capture, inputs)
+                    for _ in range(repeat)]
+            results[key] = median_case(runs)
+            print(f"  {results[key]['ticks']} ticks, {results[key]['ticks_per_second']:.0f} ticks/s")
+
+    return {
+        "backend": backend,
+        "repeat": repeat,
+        "capture": capture,
+        "inputs": inputs,
+        "calibration_us": min(calibration_before, calibrate()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "cases": results,
+    }
+
+
+def run_scaling(counts, scenario_id=2, driver_class="alert", backend="kinematic", walker_share=0.0,
+                repeat=1, capture=DEFAULT_CAPTURE):
+    """One case per background-vehicle count (plus walker_share * N walkers)."""
+    client, clock = _make_client(backend)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_traffic_") as output_root:
+        for n in counts:
+            traffic = (n, int(round(n * walker_share)))
+            print(f"Running s{scenario_id} with {traffic[0]} vehicles, {traffic[1]} walkers ...")
+            runs = [run_case(client, clock, scenario_id, driver_class, output_root, capture, traffic=traffic)
+                    for _ in range(repeat)]
+            results[str(n)] = median_case(runs)
+            results[str(n)]["traffic"] = traffic
+    return {
+        "backend": backend,
+        "scenario_id": scenario_id,
+        "driver_class": driver_class,
+        "capture": capture,
+        "walker_share": walker_share,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "scaling": results,
+    }
+
+
+def print_scaling(result):
+    print(f"\n{'vehicles':>8} {'walkers':>8} {'ticks/s':>9} {'loop p50':>10} {'loop p99':>10} "
+          f"{'hazards p50':>12}   (us)")
+    for case in result["scaling"].values():
+        loop = case["phases"].get("loop", {})
+        hazards = case["phases"].get("hazards", {})
+        print(f"{case['traffic'][0]:>8} {case['traffic'][1]:>8} {case['ticks_per_second']:>9.0f} "
+              f"{loop.get('p50_us', float('nan')):>10.1f} {loop.get('p99_us', float('nan')):>10.1f} "
+              f"{hazards.get('p50_us', float('nan')):>12.1f}")
+
+
+# ---------------------------------------------------------
+# Baseline Comparison
+# ---------------------------------------------------------
+def compare(current, baseline, threshold=0.2, gated=GATED_PERCENTILES, phases=GATED_PHASES):
+    """
+    Returns a list of regression messages. A percentile of a gated phase
+    regresses when it is more than `threshold` (relative) slower than the
+    baseline; ticks/s regresses when it drops by more than `threshold`.
+    Baseline numbers are first scaled by the machine calibration ratio.
+    """
+    regressions = []
+    scale = 1.0
+    if current.get("calibration_us") and baseline.get("calibration_us"):
+        scale = current["calibration_us"] / baseline["calibration_us"]
+
+    for key, base_case in baseline["cases"].items():
+        case = current["cases"].get(key)
+        if case is None:
+            continue
+
+        base_tps = base_case["ticks_per_second"] / scale
+        if base_tps and case["ticks_per_second"] < base_tps * (1 - threshold):
+            regressions.append(
+                f"{key}: ticks/s {case['ticks_per_second']:.0f} < baseline {base_tps:.0f}"
+            )
+
+        for phase in phases:
+            base_stats = base_case["phases"].get(phase)
+            stats = case["phases"].get(phase)
+            if base_stats is None or stats is None:
+                continue
+            for p in gated:
+                if base_stats[p] < MIN_GATED_US:
+                    continue
+                allowed = base_stats[p] * scale
+                if stats[p] > allowed * (1 + threshold):
+                    regressions.append(
+                        f"{key}: {phase} {p} {stats[p]:.1f} us > baseline {allowed:.1f} us"
+                    )
+
+    return regressions
+
+
+def print_table(result):
+    cols = "".join(f"{'p' + str(p):>10}" for p in PERCENTILES)
+    for key, case in result["cases"].items():
+        print(f"\n{key}  ({case['ticks']} ticks, {case['ticks_per_second']:.0f} ticks/s)")
+        print(f"  {'phase':<15}{cols}   (us)")
+        for phase, stats in case["phases"].items():
+            values = "".join(f"{stats[f'p{p}_us']:>10.1f}" for p in PERCENTILES)
+            print(f"  {phase:<15}{values}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the run_scenario control loop.")
+    parser.add_argument("--backend", choices=["kinematic", "carla"], default="kinematic")
+    parser.add_argument("--scenarios", nargs="+", type=int, help="only run these scenario ids")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the median is kept")
+    parser.add_argument("--capture", choices=sorted(CAPTURE_PROFILES), default=DEFAULT_CAPTURE,
+                        help=f"capture profile (default: {DEFAULT_CAPTURE})")
+    parser.add_argument("--inputs", metavar="CSV", help="scripted driver input (see driver_input.py)")
+    parser.add_argument("--out", default="benchmark_loop.json")
+    parser.add_argument("--save-baseline", metavar="PATH", help="also write the result as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="baseline JSON to check against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--traffic", nargs="+", type=int, metavar="N",
+                        help="scaling run: background vehicle counts, e.g. 0 50 100 200 300")
+    parser.add_argument("--walkers", type=float, default=0.0,
+                        help="with --traffic: walkers per background vehicle")
+    parser.add_argument("--gate", nargs="+", choices=[f"p{p}" for p in PERCENTILES], default=["p50"],
+                        help="percentiles that fail the check")
+    args = parser.parse_args()
+
+    if args.traffic:
+        scenario_id = args.scenarios[0] if args.scenarios else 2
+        result = run_scaling(args.traffic, scenario_id, backend=args.backend, walker_share=args.walkers,
+                             repeat=args.repeat, capture=args.capture)
+        print_scaling(result)
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved to {args.out}")
+        sys.exit(0)
+
+    cases = default_cases()
+    if args.scenarios:
+        cases = [c for c in cases if c[0] in args.scenarios]
+
+    result = run_benchmark(cases, args.backend, args.repeat, args.capture, args.inputs)
+    print_table(result)
+
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSaved to {args.out}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for key in ("backend", "capture", "inputs"):
+            if baseline.get(key) != result[key]:
+                print(f"Baseline {key} is {baseline.get(key)}, not {result[key]}")
+                sys.exit(2)
+
+        print(f"\nMachine calibration: {result['calibration_us']:.0f} us "
+              f"(baseline {baseline.get('calibration_us', float('nan')):.0f} us)")
+        regressions = compare(result, baseline, args.threshold, [f"{p}_us" for p in args.gate])
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.compare}")
@@ -0,0 +1,72 @@
+import os
+
+# ---------------------------------------------------------
+# Sensor Capture Profiles
+# ---------------------------------------------------------
+# How much a run captures, from nothing to full-size frames on disk. A
+# profile without a camera also puts the server in no_rendering_mode, so
+# telemetry-only runs do not pay for rendering at all.
+#
+#   off        no camera, no rendering; controls/states/manifest only
+#   preview    small camera at 5 Hz, thumbnails only (live view + replay)
+#   record     800x600 every tick, PNGs and thumbnails (the original setup)
+#   benchmark  800x600 every tick, nothing written; measures sensor cost
+#
+# run_scenario(..., capture="off") picks one by name; a dict with the same
+# keys works for one-off settings. The chosen profile goes in manifest.json.
+
+CAPTURE_PROFILES = {
+    "off": {
+        "sensor": None,
+        "no_rendering_mode": True,
+    },
+    "preview": {
+        "sensor": "sensor.camera.rgb",
+        "image_size_x": 400, "image_size_y": 300, "fov": 90, "sensor_tick": 0.2,
+        "save_frames": False, "thumbnails": True,
+        "no_rendering_mode": False,
+    },
+    "record": {
+        "sensor": "sensor.camera.rgb",
+        "image_size_x": 800, "image_size_y": 600, "fov": 90, "sensor_tick": 0.0,
+        "save_frames": True, "thumbnails": True,
+        "no_rendering_mode": False,
+    },
+    "benchmark": {
+        "sensor": "sensor.camera.rgb",
+        "image_size_x": 800, "image_size_y": 600, "fov": 90, "sensor_tick": 0.0,
+        "save_frames": False, "thumbnails": False,
+        "no_rendering_mode": False,
+    },
+}
+
+DEFAULT_PROFILE = os.environ.get("CARLA_CAPTURE_PROFILE", "record")
+
+
+def resolve_profile(capture=None):
+    """Name or dict -> (name, settings). None means DEFAULT_PROFILE."""
+    if capture is None:
+        capture = DEFAULT_PROFILE
+    if isinstance(capture, dict):
+        profile = {**CAPTURE_PROFILES["record"], **capture}
+        if "no_rendering_mode" not in capture:
+            profile["no_rendering_mode"] = profile["sensor"] is None
+        return "custom", profile
+    if capture not in CAPTURE_PROFILES:
+        raise ValueError(f"Unknown capture profile '{capture}'. Choose from {', '.join(CAPTURE_PROFILES)}.")
+    return capture, dict(CAPTURE_PROFILES[capture])
+
+
+def apply_rendering(world, profile):
+    """Switch no_rendering_mode to what the profile needs (only if it differs)."""
+    settings = world.get_settings()
+    if bool(settings.no_rendering_mode) != bool(profile["no_rendering_mode"]):
+        settings.no_rendering_mode = profile["no_rendering_mode"]
+        world.apply_settings(settings)
+
+
+def configure_camera(blueprint, profile):
+    for key in ("image_size_x", "image_size_y", "fov", "sensor_tick"):
+        if key in profile and blueprint.has_attribute(key):
+            blueprint.set_attribute(key, str(profile[key]))
+    return blueprint
@@ -3,42 +3,159 @@ import time
 import csv
 import math
 import os
-import shutil
 import subprocess
 import psutil
 import pygame
-import keyboard
+from actor_registry import ActorRegistry, prepare_world, destroy_leftovers
+from actor_state import TickState
+from capture_profiles import resolve_profile, apply_rendering, configure_camera
+from driver_input import DriverInput, ScriptedSource, default_input, OK
+from frame_store import ThumbnailWriter
+from hazard_monitor import HazardMonitor
+from loop_profiler import NULL_TRACER
+from output_manager import OutputRun, apply_retention
+from replay import StateRecorder, save_town_map
+from run_index import add_run, code_version, remove_runs, summarize
+from traffic_lights import TrafficLightIndex, index_for
+from traffic import TrafficLayer, parse_traffic
+from takeover_params import (
+    WARNING_DELAY, OK_WINDOW, S1_CRUISE_SPEED, S1_SLOWDOWN_DURATION,
+    S2_CRUISE_SPEED, S2_LOOKAHEAD_CENTERED, S2_LOOKAHEAD_CHANGE,
+    S2_GAIN_CENTERED, S2_GAIN_CENTERING, S2_GAIN_CHANGING, S2_STEER_LIMIT,
+    S2_STOP_DURATION_IN_LANE, S2_STOP_DURATION_CHANGING, S5_CRUISE_SPEED,
+    S5_WARNING_TIME, S5_OK_WINDOW, S5_STOP_DURATION, S5_MAX_BRAKE,
+    S6_CRUISE_SPEED, S6_WARNING_DISTANCE, S6_DRIFT_DISTANCE, S6_EVADE_DISTANCE,
+    S6_EVADE_STEER, S6_RETURN_STEER, S6_NPC_DRIFT_STEER, S2_TRACKER, S2_HOLD_BRAKE,
+)
+from takeover_planner import plan_takeover
 
 # ---------------------------------------------------------
 # Variables Initialization
 # ---------------------------------------------------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CARLA_PATH = os.path.join(BASE_DIR, "CARLA_0.9.16", "CarlaUE4.exe")
-pygame.mixer.init()
-beep_soft = pygame.mixer.Sound("assets/audio/softbeep.wav")
-beep_heavy = pygame.mixer.Sound("assets/audio/heavybeep.wav")
-cancel_sound = pygame.mixer.Sound("assets/audio/cancelled.wav")
-flasher_sound = pygame.mixer.Sound("assets/audio/flasher.wav")
-scenario3_sound = pygame.mixer.Sound("assets/audio/scenario3.wav")
-scenario4_sound = pygame.mixer.Sound("assets/audio/scenario4.wav")
-scenario5_sound = pygame.mixer.Sound("assets/audio/scenario5.wav")
-scenario6_sound = pygame.mixer.Sound("assets/audio/scenario6.wav")
+CARLA_HOST = os.getenv("CARLA_HOST", "localhost")
+CARLA_PORT = int(os.getenv("CARLA_PORT", "2000"))
+TM_PORT = int(os.getenv("CARLA_TM_PORT", "8000"))
+
+
+class _SilentSound:
+    """Stands in for pygame.mixer.Sound when there is no audio device."""
+
+    def play(self, loops=0):
+        pass
+
+    def stop(self):
+        pass
+
+
+AUDIO_ENABLED = os.getenv("CARLA_SIM_MUTE", "0") != "1"
+if AUDIO_ENABLED:
+    try:
+        pygame.mixer.init()
+    except pygame.error as e:
+        print("Audio disabled:", e)
+        AUDIO_ENABLED = False
+
+
+def _load_sound(name):
+    if not AUDIO_ENABLED:
+        return _SilentSound()
+    return pygame.mixer.Sound(os.path.join(BASE_DIR, "assets", "audio", name))
+
+
+def _play_trimmed(sound, ms):
+    # Blocking play, cut after `ms`; nothing to trim when muted
+    sound.play()
+    if AUDIO_ENABLED:
+        pygame.time.delay(ms)
+    sound.stop()
+
+
+beep_soft = _load_sound("softbeep.wav")
+beep_heavy = _load_sound("heavybeep.wav")
+cancel_sound = _load_sound("cancelled.wav")
+flasher_sound = _load_sound("flasher.wav")
+scenario3_sound = _load_sound("scenario3.wav")
+scenario4_sound = _load_sound("scenario4.wav")
+scenario5_sound = _load_sound("scenario5.wav")
+scenario6_sound = _load_sound("scenario6.wav")
+SOUND_NAMES = ["beep_soft", "beep_heavy", "cancel_sound", "flasher_sound",
+               "scenario3_sound", "scenario4_sound", "scenario5_sound", "scenario6_sound"]
+ALARM_SOUNDS = ["beep_heavy", "flasher_sound"]    # the rest are one-shots on the voice channel
+
+
+class _ChannelSound:
+    """A Sound played on one mixer channel; stop() only silences that channel."""
+
+    def __init__(self, sound, channel):
+        self.sound = sound
+        self.channel = channel
+
+    def play(self, loops=0):
+        self.channel.play(self.sound, loops=loops)
+
+    def stop(self):
+        if self.channel.get_sound() is self.sound:
+            self.channel.stop()
+
+
+class EgoSounds:
+    """
+    One ego's alert sounds. Ego k owns mixer channels 2k (alarm: heavy beep,
+    flasher) and 2k + 1 (voice: everything else), reserved so pygame never
+    hands them out, so one ego's OK stops only its own beep. Without an
+    index (replay, one-off controller calls) it is the shared module sounds.
+    """
+
+    def __init__(self, index=None):
+        shared = {name: globals()[name] for name in SOUND_NAMES}
+        if index is None or not AUDIO_ENABLED:
+            self.__dict__.update(shared)
+            return
+        channels = 2 * (index + 1)
+        if pygame.mixer.get_num_channels() < channels + 2:
+            pygame.mixer.set_num_channels(channels + 2)
+        pygame.mixer.set_reserved(channels)     # egos are set up in index order
+        alarm, voice = pygame.mixer.Channel(2 * index), pygame.mixer.Channel(2 * index + 1)
+        for name, sound in shared.items():
+            setattr(self, name, _ChannelSound(sound, alarm if name in ALARM_SOUNDS else voice))
+
+
+SHARED_SOUNDS = EgoSounds()
+
+
+def sounds_for(vehicle):
+    """The ego's own sounds (EgoRun puts them on vehicle.sounds), else the shared ones."""
+    return getattr(vehicle, "sounds", None) or SHARED_SOUNDS
+
 HAZARD = carla.VehicleLightState.LeftBlinker | carla.VehicleLightState.RightBlinker
 
 # ---------------------------------------------------------
 # Start Carla Process
 # ---------------------------------------------------------
-def start_carla():
-    print("Launching CARLA simulator...")
+def start_carla(rpc_port=CARLA_PORT, streaming_port=None, wait=15):
+    """
+    Launch a CARLA server.
+
+    rpc_port / streaming_port let several servers share one machine
+    (streaming_port defaults to rpc_port + 1, as CARLA itself does).
+    """
+    if streaming_port is None:
+        streaming_port = rpc_port + 1
+
+    print(f"Launching CARLA simulator on port {rpc_port}...")
     process = subprocess.Popen([
         CARLA_PATH,
         "-vulkan",
         "-ResX=640",
         "-ResY=360",
         "-quality-level=Low",
+        f"-carla-rpc-port={rpc_port}",
+        f"-carla-streaming-port={streaming_port}",
     ])
-    print("Waiting 15 seconds for CARLA to load...")
-    time.sleep(15)
+    print(f"Waiting {wait} seconds for CARLA to load...")
+    time.sleep(wait)
     return process
 
 
@@ -59,14 +176,16 @@ def stop_carla(process):
 # ---------------------------------------------------------
 # Scenario 1 Urban Driving with Drowsiness Reactions
 # ---------------------------------------------------------
-def scenario_1_control(vehicle, t, driver_class, driver_ok_pressed):
+def scenario_1_control(vehicle, t, driver_class, driver_ok_pressed, ok_time=None):
     """
     Scenario 1 behavior:
     - alert → normal driving
     - slightly drowsy → soft beep after 5 sec
     - very drowsy → hard beep after 5 sec
     - critical drowsiness → looping alert + 3 sec OK window + AI takeover
+    ok_time is when OK was pressed (default t); the window is judged on it.
     """
+    sounds = sounds_for(vehicle)      # this ego's alert channels
 
     # -----------------------------
     # Speed calculation
@@ -99,7 +218,7 @@ def scenario_1_control(vehicle, t, driver_class, driver_ok_pressed):
         interval = 60            # then every 60 seconds
 
         if t > first_beep_delay and (t - vehicle.last_slight_beep >= interval):
-            beep_soft.play()
+            sounds.beep_soft.play()
             vehicle.last_slight_beep = t
 
     # -----------------------------------------------------
@@ -111,9 +230,7 @@ def scenario_1_control(vehicle, t, driver_class, driver_ok_pressed):
         interval = 60
 
         if t > first_beep_delay and (t - vehicle.last_very_beep >= interval):
-            beep_heavy.play()
-            pygame.time.delay(3000)  # trim to 3 seconds
-            beep_heavy.stop()
+            _play_trimmed(sounds.beep_heavy, 3000)  # trim to 3 seconds
             vehicle.last_very_beep = t
 
     # -----------------------------------------------------
@@ -129,14 +246,14 @@ def scenario_1_control(vehicle, t, driver_class, driver_ok_pressed):
 
         # If driver already pressed OK once, behave normally forever
         if vehicle.critical_resolved:
-            throttle = 0.45 if speed < 30 else 0.0
-            brake = 0.0 if speed < 30 else 0.2
+            throttle = 0.45 if speed < S1_CRUISE_SPEED else 0.0
+            brake = 0.0 if speed < S1_CRUISE_SPEED else 0.2
             return steer, throttle, brake, speed
 
         # BEFORE warning (first 5 sec)
-        if t < 5:
-            throttle = 0.45 if speed < 30 else 0.0
-            brake = 0.0 if speed < 30 else 0.2
+        if t < WARNING_DELAY:
+            throttle = 0.45 if speed < S1_CRUISE_SPEED else 0.0
+            brake = 0.0 if speed < S1_CRUISE_SPEED else 0.2
             return steer, throttle, brake, speed
 
         # Start warning once
@@ -146,22 +263,23 @@ def scenario_1_control(vehicle, t, driver_class, driver_ok_pressed):
             print("CRITICAL WARNING: Press O within 3 sec.")
 
             # start beep
-            beep_heavy.play(loops=-1)
+            sounds.beep_heavy.play(loops=-1)
 
             # turn on hazard lights
             vehicle.set_light_state(carla.VehicleLightState(HAZARD))
 
         warning_elapsed = t - vehicle.warning_start
 
-        # DRIVER PRESSED O during the warning window
-        if driver_ok_pressed and warning_elapsed < 3:
+        # DRIVER PRESSED O during the warning window (not before it; polled up to a tick later)
+        pressed_at = t if ok_time is None else ok_time
+        if driver_ok_pressed and 0 <= pressed_at - vehicle.warning_start < OK_WINDOW:
             print(">>> DRIVER CONFIRMED OK — continuing normally.")
 
             # stop beep
-            beep_heavy.stop()
+            sounds.beep_heavy.stop()
 
             # Cancel Button Sound
-            cancel_sound.play()
+            sounds.cancel_sound.play()
 
             # turn off hazards
             vehicle.set_light_state(carla.VehicleLightState.NONE)
@@ -169,14 +287,14 @@ def scenario_1_control(vehicle, t, driver_class, driver_ok_pressed):
             # Permanently resolve critical mode
             vehicle.critical_resolved = True
 
-            throttle = 0.45 if speed < 30 else 0.0
-            brake = 0.0 if speed < 30 else 0.2
+            throttle = 0.45 if speed < S1_CRUISE_SPEED else 0.0
+            brake = 0.0 if speed < S1_CRUISE_SPEED else 0.2
             return steer, throttle, brake, speed
 
         # Waiting window (0 to 3 sec)
-        if warning_elapsed < 3:
-            throttle = 0.45 if speed < 30 else 0.0
-            brake = 0.0 if speed < 30 else 0.2
+        if warning_elapsed < OK_WINDOW:
+            throttle = 0.45 if speed < S1_CRUISE_SPEED else 0.0
+            brake = 0.0 if speed < S1_CRUISE_SPEED else 0.2
             return steer, throttle, brake, speed
 
         # AI TAKEOVER (user did not respond)
@@ -186,7 +304,7 @@ def scenario_1_control(vehicle, t, driver_class, driver_ok_pressed):
             print("AI TAKEOVER ACTIVE – beginning smooth slowdown.")
 
         # total time to reduce speed to zero
-        slowdown_duration = 5.0  
+        slowdown_duration = S1_SLOWDOWN_DURATION
 
         elapsed = t - vehicle.takeover_start_time
 
@@ -209,7 +327,7 @@ def scenario_1_control(vehicle, t, driver_class, driver_ok_pressed):
     # -----------------------------------------------------
     # DEFAULT SPEED CONTROL (alert, slightly, very)
     # -----------------------------------------------------
-    if speed < 30:
+    if speed < S1_CRUISE_SPEED:
         throttle = 0.45
         brake = 0.0
     else:
@@ -221,7 +339,7 @@ def scenario_1_control(vehicle, t, driver_class, driver_ok_pressed):
 # ---------------------------------------------------------
 # Scenario 2 Highway Driving with Drowsiness Reactions
 # ---------------------------------------------------------
-def scenario_2_control(vehicle, t, driver_class, driver_ok_pressed, world):
+def scenario_2_control(vehicle, t, driver_class, driver_ok_pressed, world, ok_time=None):
     """
     Scenario 2 behavior:
     - alert → normal driving
@@ -231,7 +349,9 @@ def scenario_2_control(vehicle, t, driver_class, driver_ok_pressed, world):
         If user does NOT respond:
             AI maintains highway speed until reaching safe area
             then performs smooth stop
+    ok_time is when OK was pressed (default t); the window is judged on it.
     """
+    sounds = sounds_for(vehicle)      # this ego's alert channels
     vel = vehicle.get_velocity()
     speed = (vel.x**2 + vel.y**2 + vel.z**2)**0.5 * 3.6
     steer = 0.0
@@ -247,14 +367,12 @@ def scenario_2_control(vehicle, t, driver_class, driver_ok_pressed, world):
 
     elif driver_class == "slightly drowsy":
         if t > 5 and (t - vehicle.last_slight_beep >= 60):
-            beep_soft.play()
+            sounds.beep_soft.play()
             vehicle.last_slight_beep = t
 
     elif driver_class == "very drowsy":
         if t > 5 and (t - vehicle.last_very_beep >= 60):
-            beep_heavy.play()
-            pygame.time.delay(3000)
-            beep_heavy.stop()
+            _play_trimmed(sounds.beep_heavy, 3000)
             vehicle.last_very_beep = t
 
     elif driver_class == "critical drowsiness":
@@ -267,14 +385,14 @@ def scenario_2_control(vehicle, t, driver_class, driver_ok_pressed, world):
 
         # If driver already pressed OK, behave normally forever
         if vehicle.critical_resolved:
-            throttle = 0.55 if speed < 90 else 0.0
-            brake = 0.0 if speed < 90 else 0.2
+            throttle = 0.55 if speed < S2_CRUISE_SPEED else 0.0
+            brake = 0.0 if speed < S2_CRUISE_SPEED else 0.2
             return steer, throttle, brake, speed
 
         # BEFORE warning (first 5 sec)
-        if t < 5:
-            throttle = 0.55 if speed < 90 else 0.0
-            brake = 0.0 if speed < 90 else 0.2
+        if t < WARNING_DELAY:
+            throttle = 0.55 if speed < S2_CRUISE_SPEED else 0.0
+            brake = 0.0 if speed < S2_CRUISE_SPEED else 0.2
             return steer, throttle, brake, speed
 
         # Start warning once
@@ -284,22 +402,23 @@ def scenario_2_control(vehicle, t, driver_class, driver_ok_pressed, world):
             print("CRITICAL WARNING: Press O within 3 sec.")
 
             # Start beep
-            beep_heavy.play(loops=-1)
+            sounds.beep_heavy.play(loops=-1)
 
             # Turn on hazard lights
             vehicle.set_light_state(carla.VehicleLightState(HAZARD))
 
         warning_elapsed = t - vehicle.warning_start
 
-        # DRIVER PRESSED O during warning window
-        if driver_ok_pressed and warning_elapsed < 3:
+        # DRIVER PRESSED O during warning window (not before it; polled up to a tick later)
+        pressed_at = t if ok_time is None else ok_time
+        if driver_ok_pressed and 0 <= pressed_at - vehicle.warning_start < OK_WINDOW:
             print(">>> DRIVER CONFIRMED OK — continuing normally.")
 
             # Stop beep
-            beep_heavy.stop()
+            sounds.beep_heavy.stop()
 
             # Cancel Button Sound
-            cancel_sound.play()
+            sounds.cancel_sound.play()
 
             # Turn off hazards
             vehicle.set_light_state(carla.VehicleLightState.NONE)
@@ -307,17 +426,43 @@ def scenario_2_control(vehicle, t, driver_class, driver_ok_pressed, world):
             # Permanently resolve critical mode
             vehicle.critical_resolved = True
 
-            throttle = 0.55 if speed < 90 else 0.0
-            brake = 0.0 if speed < 90 else 0.2
+            throttle = 0.55 if speed < S2_CRUISE_SPEED else 0.0
+            brake = 0.0 if speed < S2_CRUISE_SPEED else 0.2
             return steer, throttle, brake, speed
 
         # Waiting window (0 to 3 sec)
-        if warning_elapsed < 3:
-            throttle = 0.55 if speed < 90 else 0.0
-            brake = 0.0 if speed < 90 else 0.2
+        if warning_elapsed < OK_WINDOW:
+            throttle = 0.55 if speed < S2_CRUISE_SPEED else 0.0
+            brake = 0.0 if speed < S2_CRUISE_SPEED else 0.2
             return steer, throttle, brake, speed
 
         # AI TAKEOVER - Move to rightmost lane AND stop
+        if S2_TRACKER == "stanley":
+            # Whole maneuver planned once, then tracked (see takeover_planner.py)
+            if not hasattr(vehicle, "takeover_start_time"):
+                vehicle.takeover_start_time = t
+                vehicle.takeover_initial_speed = speed
+                print("AI TAKEOVER ACTIVE – moving to rightmost shoulder lane and stopping.")
+                vehicle.takeover_plan = plan_takeover(world.get_map(), vehicle.get_transform(), speed)
+                vehicle.target_lane_id = vehicle.takeover_plan.target_lane_id
+                print(f"Target rightmost lane ID: {vehicle.target_lane_id} "
+                      f"({vehicle.takeover_plan.length:.0f} m planned)")
+
+            steer, target_speed, stopped = vehicle.takeover_plan.track(vehicle.get_transform(), speed)
+            if stopped:
+                throttle = 0.0
+                brake = max(S2_HOLD_BRAKE, min(1.0, speed / 50.0))
+            elif speed > target_speed + 2:
+                throttle = 0.0
+                brake = min(1.0, (speed - target_speed) / 50.0)
+            elif speed < target_speed - 2:
+                throttle = 0.2
+                brake = 0.0
+            else:
+                throttle = 0.1
+                brake = 0.0
+            return steer, throttle, brake, speed
+
         if not hasattr(vehicle, "takeover_start_time"):
             vehicle.takeover_start_time = t
             vehicle.takeover_initial_speed = speed
@@ -360,12 +505,12 @@ def scenario_2_control(vehicle, t, driver_class, driver_ok_pressed, world):
         # Determine target waypoint
         if in_target_lane and lateral_distance < lane_width * 0.5:
             # Centered - follow straight (increased threshold from 0.3 to 0.5)
-            lookahead = 10.0
+            lookahead = S2_LOOKAHEAD_CENTERED
             next_wps = current_waypoint.next(lookahead)
             target_waypoint = next_wps[0] if next_wps else current_waypoint
         else:
             # Need to change lanes or center
-            lookahead = 12.0  # Increased from 8.0 to look further ahead
+            lookahead = S2_LOOKAHEAD_CHANGE
             forward_wp = current_waypoint.next(lookahead)
             forward_wp = forward_wp[0] if forward_wp else current_waypoint
             
@@ -390,22 +535,22 @@ def scenario_2_control(vehicle, t, driver_class, driver_ok_pressed, world):
         
         # Steering control
         if in_target_lane and lateral_distance < lane_width * 0.5:
-            steer = angle_diff * 0.2
+            steer = angle_diff * S2_GAIN_CENTERED
         elif in_target_lane:
-            steer = angle_diff * 0.6  # Increased from 0.5 to center more aggressively
+            steer = angle_diff * S2_GAIN_CENTERING
         else:
-            steer = angle_diff * 0.4
+            steer = angle_diff * S2_GAIN_CHANGING
         
-        steer = max(-0.5, min(0.5, steer))
+        steer = max(-S2_STEER_LIMIT, min(S2_STEER_LIMIT, steer))
 
         # Speed control
         elapsed = t - vehicle.takeover_start_time
         initial = vehicle.takeover_initial_speed
         
         if in_target_lane and lateral_distance < lane_width * 0.3:
-            decel_rate = initial / 6.0
+            decel_rate = initial / S2_STOP_DURATION_IN_LANE
         else:
-            decel_rate = initial / 10.0
+            decel_rate = initial / S2_STOP_DURATION_CHANGING
         
         target_speed = max(0.0, initial - decel_rate * elapsed)
 
@@ -424,7 +569,7 @@ def scenario_2_control(vehicle, t, driver_class, driver_ok_pressed, world):
     # ----------------------------------------------
     # DEFAULT SPEED LOGIC
     # ----------------------------------------------
-    if speed < 90:
+    if speed < S2_CRUISE_SPEED:
         throttle = 0.55
         brake = 0.0
     else:
@@ -447,6 +592,7 @@ def scenario_3_control(vehicle, t):
     - AI steers left to bring the car back to the lane center
     - after correction, AI stabilizes steering and continues straight
     """
+    sounds = sounds_for(vehicle)      # this ego's alert channels
     vel = vehicle.get_velocity()
     speed = math.sqrt(vel.x**2 + vel.y**2 + vel.z**2) * 3.6
 
@@ -464,12 +610,12 @@ def scenario_3_control(vehicle, t):
         steer = 0.03
         if t>= 5.3 and not vehicle.assitant_warning:
             vehicle.assitant_warning = True
-            scenario3_sound.play()
+            sounds.scenario3_sound.play()
 
     elif 6.3 <= t < 7.5:
         if not vehicle.beep_played:
             vehicle.beep_played = True
-            beep_heavy.play()       
+            sounds.beep_heavy.play()       
         # big correction
         steer = -0.034
     elif 7.5 <= t < 8.3:
@@ -479,7 +625,7 @@ def scenario_3_control(vehicle, t):
         # stabilize straight
         steer = 0.0
         vehicle.beep_played = False
-        beep_heavy.stop()
+        sounds.beep_heavy.stop()
 
     # Speed control
     if speed < 30:
@@ -509,6 +655,7 @@ def scenario_4_control(vehicle, t):
     The function returns steering, throttle, brake, and speed for each time step,
     allowing the simulation to smoothly transition through alert, correction, and recovery.
     """
+    sounds = sounds_for(vehicle)      # this ego's alert channels
     vel = vehicle.get_velocity()
     speed = (vel.x**2 + vel.y**2 + vel.z**2)**0.5 * 3.6
 
@@ -539,10 +686,10 @@ def scenario_4_control(vehicle, t):
         vehicle.set_light_state(carla.VehicleLightState.NONE)
         if not vehicle.assitant_started:
             vehicle.assitant_started = True
-            scenario4_sound.play()
+            sounds.scenario4_sound.play()
         if t > 6 and not vehicle.warning_started: 
             vehicle.warning_started = True
-            beep_heavy.play(loops=-1)
+            sounds.beep_heavy.play(loops=-1)
             print("AI ALERT: You are switching into the wrong lane. This is a two way street. Correcting now.")
         vehicle.set_light_state(carla.VehicleLightState(HAZARD))
         return steer, throttle, brake, speed
@@ -560,8 +707,8 @@ def scenario_4_control(vehicle, t):
     elif 9 <= t < 14:
         if not vehicle.stabilized:
             vehicle.stabilized = True
-            beep_heavy.stop()  # stop beep, keep flashers running
-            flasher_sound.play(loops=-1)
+            sounds.beep_heavy.stop()  # stop beep, keep flashers running
+            sounds.flasher_sound.play(loops=-1)
 
         steer = -0.0025
         vehicle.set_light_state(carla.VehicleLightState(HAZARD))
@@ -570,7 +717,7 @@ def scenario_4_control(vehicle, t):
     # 11–20 sec: Stable shared control
     # -------------------------------
     else:
-        flasher_sound.stop()
+        sounds.flasher_sound.stop()
         steer = 0.0
         vehicle.set_light_state(carla.VehicleLightState.NONE)
 
@@ -580,14 +727,16 @@ def scenario_4_control(vehicle, t):
 # ---------------------------------------------------------
 # Scenario 5: Driver unresponsive during red light
 # ---------------------------------------------------------
-def scenario_5_control(vehicle, t, driver_ok_pressed, world):
+def scenario_5_control(vehicle, t, driver_ok_pressed, world, ok_time=None):
     """
     Scenario 5: Red light warning
     - 0–9.5s : Normal driving
     - 9.5s  : Warning + 2 sec window
     - If no response: AI takeover gradual stop
     - If user overrides: sound stops + right flasher ON but STILL follow same AI stop curve
+    - ok_time is when OK was pressed (default t); the window is judged on it
     """
+    sounds = sounds_for(vehicle)      # this ego's alert channels
     vel = vehicle.get_velocity()
     speed = math.sqrt(vel.x**2 + vel.y**2 + vel.z**2) * 3.6
     steer = 0.0
@@ -600,43 +749,50 @@ def scenario_5_control(vehicle, t, driver_ok_pressed, world):
         vehicle.s5_lights_turned_red = False
 
     # Before warning window
-    if t < 9.5:
+    if t < S5_WARNING_TIME:
         if t > 8 and not vehicle.assistant_warning:
             vehicle.assistant_warning = True
-            scenario5_sound.play()
-        throttle = 0.60 if speed < 40 else 0.0
-        brake = 0.0 if speed < 40 else 0.2
+            sounds.scenario5_sound.play()
+        throttle = 0.60 if speed < S5_CRUISE_SPEED else 0.0
+        brake = 0.0 if speed < S5_CRUISE_SPEED else 0.2
         return steer, throttle, brake, speed
 
     # Turn traffic lights red once
     if not vehicle.s5_lights_turned_red:
         vehicle.s5_lights_turned_red = True
-        set_all_traffic_lights(world, "red")
-        print("🔴 Traffic lights turned RED at t=9s")
+        lights = getattr(world, "traffic_lights", None)
+        if lights is None:
+            lights = TrafficLightIndex(world)
+        turned = lights.set_route_state(vehicle, "red", count=1)   # the next light ahead
+        if turned:
+            print(f"🔴 Traffic light ahead turned RED at t={t:.1f}s")
+        else:
+            print("No traffic light on the route ahead to turn RED")
 
     # Start warning once
     if not vehicle.s5_warn_phase:
         vehicle.s5_warn_phase = True
         vehicle.warning_start = t
         print("⚠️ RED LIGHT AHEAD! Press O within 2 sec!")
-        beep_heavy.play(loops=-1)
+        sounds.beep_heavy.play(loops=-1)
         vehicle.set_light_state(carla.VehicleLightState(HAZARD))
 
     warning_elapsed = t - vehicle.warning_start
 
-    # User override DURING the warning window
-    if driver_ok_pressed and warning_elapsed < 2:
+    # User override DURING the warning window (not before it; polled up to a tick later)
+    pressed_at = t if ok_time is None else ok_time
+    if driver_ok_pressed and 0 <= pressed_at - vehicle.warning_start < S5_OK_WINDOW:
         if not vehicle.s5_resolved:
-            beep_heavy.stop()
-            cancel_sound.play()
+            sounds.beep_heavy.stop()
+            sounds.cancel_sound.play()
             vehicle.s5_resolved = True
             vehicle.set_light_state(carla.VehicleLightState.RightBlinker)
             print(">>> USER OVERRIDE — stopping sound, keeping AI stop timing")
 
     # Waiting window
-    if warning_elapsed < 2:
-        throttle = 0.60 if speed < 40 else 0.0
-        brake = 0.0 if speed < 40 else 0.2
+    if warning_elapsed < S5_OK_WINDOW:
+        throttle = 0.60 if speed < S5_CRUISE_SPEED else 0.0
+        brake = 0.0 if speed < S5_CRUISE_SPEED else 0.2
         return steer, throttle, brake, speed
 
     # -------- AI TAKEOVER (OR USER OVERRIDE) --------
@@ -647,7 +803,7 @@ def scenario_5_control(vehicle, t, driver_ok_pressed, world):
         print("🤖 AI TAKEOVER — smooth stop engaged")
 
     # Smooth gradual AI stop
-    slowdown_duration = 2.0        # how long the stop lasts
+    slowdown_duration = S5_STOP_DURATION
     initial = vehicle.takeover_initial_speed
     elapsed = t - vehicle.takeover_start_time
 
@@ -656,19 +812,20 @@ def scenario_5_control(vehicle, t, driver_ok_pressed, world):
     # Apply same gentle braking curve whether AI or user override
     if speed > target_speed:
         throttle = 0.0
-        brake = min(0.4, (speed - target_speed) / initial)
+        brake = min(S5_MAX_BRAKE, (speed - target_speed) / initial)
     else:
         throttle = 0.0
-        brake = 0.4
+        brake = S5_MAX_BRAKE
 
     return steer, throttle, brake, speed
 
 def scenario_6_control(vehicle, npc, t):
+    sounds = sounds_for(vehicle)      # this ego's alert channels
     vel = vehicle.get_velocity()
     speed = math.sqrt(vel.x**2 + vel.y**2 + vel.z**2) * 3.6
 
     steer = 0.0
-    throttle = 0.55 if speed < 90 else 0.0
+    throttle = 0.55 if speed < S6_CRUISE_SPEED else 0.0
     brake = 0.0
 
     ego_loc = vehicle.get_location()
@@ -688,33 +845,33 @@ def scenario_6_control(vehicle, npc, t):
     if not hasattr(vehicle, "flacher_warning"):
         vehicle.flacher_warning = False
 
-    if dist < 40 and not npc.s6_drift:
+    if dist < S6_DRIFT_DISTANCE and not npc.s6_drift:
         print("🚗💥 NPC is drifting toward your lane!")
         npc.s6_drift = True
     
     if npc.s6_drift:
         ctrl = npc.get_control()
         ctrl.throttle = 0.5
-        ctrl.steer = -0.0135
+        ctrl.steer = S6_NPC_DRIFT_STEER
         npc.apply_control(ctrl)
 
     # === 1. Warning phase ===
-    if dist < 50 and not vehicle.s6_warning:
+    if dist < S6_WARNING_DISTANCE and not vehicle.s6_warning:
         print("⚠️ Oncoming traffic detected")
-        scenario6_sound.play()
-        beep_heavy.play(loops=-1)
+        sounds.scenario6_sound.play()
+        sounds.beep_heavy.play(loops=-1)
         vehicle.s6_warning = True
         vehicle.set_light_state(carla.VehicleLightState.RightBlinker)
 
     # === 2. Emergency deviation ===
-    if dist < 25 and not vehicle.s6_evade:
+    if dist < S6_EVADE_DISTANCE and not vehicle.s6_evade:
         print("➡️ Slight evasive move to the right")
         vehicle.s6_evade = True
         vehicle.s6_evade_start = t
 
     # Apply small evasive steer
     if vehicle.s6_evade and not vehicle.s6_return:
-        steer = 0.012   # right shift
+        steer = S6_EVADE_STEER   # right shift
         throttle = 0.40
         brake = 0.0
 
@@ -726,7 +883,7 @@ def scenario_6_control(vehicle, npc, t):
 
     # === 3. Smooth return to center line ===
     if vehicle.s6_return:
-        steer = -0.0017   # gentle correction left
+        steer = S6_RETURN_STEER   # gentle correction left
         throttle = 0.45
         brake = 0.0
 
@@ -736,11 +893,11 @@ def scenario_6_control(vehicle, npc, t):
             vehicle.s6_return = False
             if t > 4 and not vehicle.flacher_warning:
                 vehicle.flacher_warning = True
-                beep_heavy.stop()
-                flasher_sound.play(loops=-1)
+                sounds.beep_heavy.stop()
+                sounds.flasher_sound.play(loops=-1)
             if t > 15:
                 vehicle.set_light_state(carla.VehicleLightState.NONE)
-                flasher_sound.stop()
+                sounds.flasher_sound.stop()
         return steer, throttle, brake, speed
 
     # Default highway cruise
@@ -810,147 +967,396 @@ def shift_along_road(transform, distance):
 
     return carla.Transform(new_loc, transform.rotation)
 
-def set_all_traffic_lights(world, state="green"):
-    """
-    Set all traffic lights in the world to a specific state.
-    
-    Args:
-        world: CARLA world object
-        state: "green", "red", or "yellow"
-    """
-    traffic_lights = world.get_actors().filter('*traffic_light*')
-    
-    # Map string to CARLA state
-    state_map = {
-        "green": carla.TrafficLightState.Green,
-        "red": carla.TrafficLightState.Red,
-        "yellow": carla.TrafficLightState.Yellow
-    }
-    
-    if state.lower() not in state_map:
-        print(f"Invalid state '{state}'. Use 'green', 'red', or 'yellow'")
-        return
-    
-    carla_state = state_map[state.lower()]
-    count = 0
-    
-    for tl in traffic_lights:
-        tl.set_state(carla_state)
-        tl.freeze(True)
-        count += 1
-    
-    print(f"✅ Set {count} traffic lights to {state.upper()}")
-
 # ---------------------------------------------------------
 # Run Scenario
 # ---------------------------------------------------------
-def run_scenario(client, town_name, scenario_id, driver_class, status_box=None):
+# Vehicle attributes the controllers set when an alert stage begins,
+# reported to the tracer as (event, attribute). Attributes are checked
+# once per tick, in this order.
+ALERT_MARKERS = [
+    ("warning", "warning_start"),          # scenarios 1, 2, 5
+    ("warning", "assitant_warning"),       # scenario 3
+    ("warning", "warning_started"),        # scenario 4
+    ("warning", "s6_warning"),             # scenario 6
+    ("driver_ok", "driver_cancelled"),
+    ("driver_ok", "s5_resolved"),
+    ("takeover", "takeover_start_time"),   # scenarios 1, 2, 5
+    ("takeover", "s6_evade"),              # scenario 6
+]
+
+# run_multi_scenario drives K egos in one world, e.g. the four driver
+# classes of scenario 1 in one world load instead of four:
+#
+#     run_multi_scenario(client, "Town01", 1,
+#                        ["alert", "slightly drowsy", "very drowsy", "critical drowsiness"])
+#
+# Every ego has its own spawn point (the town's fixed spawn first, then
+# the nearest spawn points at least EGO_SEPARATION from all the others),
+# driver class, controller state (the attributes the controllers set on
+# its proxy), camera, hazard monitor, inputs and output folder, which is
+# finalized and indexed like a single run's. They share the snapshot, the
+# command batch and the tick. The egos see each other as traffic; keep
+# them apart with EGO_SEPARATION. run_scenario is the one-ego case.
+EGO_SEPARATION = 150.0           # m between ego spawn points
+
+
+def ego_spawns(world, town_name, count):
+    """count spawn transforms at least EGO_SEPARATION apart, the town's fixed spawn first."""
+    first = get_fixed_spawn(world, town_name)
+    spawns = [first]
+    if count == 1:
+        return spawns
+    nearest = sorted(world.get_map().get_spawn_points(),
+                     key=lambda p: p.location.distance(first.location))
+    for point in nearest:
+        if len(spawns) == count:
+            break
+        if all(point.location.distance(s.location) >= EGO_SEPARATION for s in spawns):
+            spawns.append(point)
+    if len(spawns) < count:
+        raise RuntimeError(f"{town_name} has room for {len(spawns)} egos "
+                           f"{EGO_SEPARATION:.0f} m apart, {count} requested.")
+    return spawns
+
+
+class EgoRun:
+    """One ego of a run: driver class, spawned actors, logs and output folder."""
+
+    def __init__(self, index, scenario_id, town_name, driver_class, output_root):
+        self.index = index
+        self.scenario_id = scenario_id
+        self.driver_class = driver_class
+        self.final_state = driver_class  # updated later for critical cases
+        self.tag = {}                    # extra tracer event args ({"ego": index} with several egos)
+
+        if scenario_id == 1 or scenario_id == 2:
+            safe_state = driver_class.replace(" ", "_")
+            self.label = f"Scenario{scenario_id}-{town_name}-{safe_state}"
+        else:
+            self.label = f"Scenario{scenario_id}-{town_name}"
+
+        # Fresh directory per run; previous runs are left to apply_retention
+        self.run = OutputRun.create(output_root, self.label)
+        self.base_folder = self.run.path
+        self.images_folder = self.run.images
+        print(f"\nSaving outputs to: {self.base_folder}")
+
+        self.vehicle = None
+        self.npc = None
+        self.camera = None
+        self.thumbnails = None
+        self.frame_id = 0
+        self.reaction_time = None
+        self.alerts_seen = set()
+        self.alert_times = {}        # event -> scenario time it was first flagged
+        self.ok_pressed = False
+        self.ok_time = None          # event time of this tick's first OK press
+        self.controls = None
+
     # -----------------------------------------------------
-    # INITIAL FOLDER SETUP
+    # Setup
     # -----------------------------------------------------
-    final_state = driver_class  # updated later for critical cases
+    def spawn(self, world, registry, bp_lib, spawn_point):
+        """Spawn the ego (and scenario 6's NPC) around spawn_point; returns the ego's spawn."""
+        vehicle_bp = bp_lib.filter("model3")[0]
+        if self.scenario_id == 4:
+            spawn_point = shift_lane(world, spawn_point) # Move to the left lane
+            spawn_point = shift_along_road(spawn_point,-100) # Move 100 meters to the back
+        elif self.scenario_id == 6:
+            npc_bp = bp_lib.filter("vehicle.*model3*")[0]
+            npc_spawn = shift_lane(world, spawn_point, +1)     # move to opposite lane
+            npc_spawn = shift_along_road(npc_spawn, +120)      # place NPC ahead
+            # Fix rotation: align to lane and flip direction toward the ego car
+            wp = world.get_map().get_waypoint(npc_spawn.location)
+            npc_spawn.rotation.yaw = wp.transform.rotation.yaw + 180
+            npc = registry.try_spawn(npc_bp, npc_spawn)
+            # Make NPC drive toward ego
+            npc.set_autopilot(False)
+            npc.set_target_velocity(npc.get_transform().get_forward_vector() * 20)
+            npc.s6_drift_active = False
+            npc.s6_drift_trigger_distance = 40   # start drifting at 40 meters
+            self.npc = npc
+
+        vehicle = registry.try_spawn(vehicle_bp, spawn_point)
+        if not vehicle:
+            raise RuntimeError("Failed to spawn vehicle.")
+        vehicle.set_autopilot(False)
+        self.vehicle = vehicle
+        self.spawn_point = spawn_point
+        return spawn_point
+
+    def attach_camera(self, registry, bp_lib, profile, tracer, report_frames):
+        """Camera per capture profile (none at all when capture is "off")."""
+        if profile["sensor"] is None:
+            return
+        cam_bp = configure_camera(bp_lib.find(profile["sensor"]), profile)
+        cam_transform = carla.Transform(carla.Location(x=0.6, z=1.6))
+        self.camera = registry.spawn(cam_bp, cam_transform, attach_to=self.vehicle)
+        if profile["thumbnails"]:
+            self.thumbnails = ThumbnailWriter(self.images_folder)
+        vehicle = self.vehicle
+
+        def process_image(image):
+            with tracer.span("sensor"):
+                vel = vehicle.get_velocity()
+                speed = math.sqrt(vel.x**2 + vel.y**2 + vel.z**2) * 3.6
+                filename = ""
+                if profile["save_frames"]:
+                    filename = f"{self.images_folder}/frame_{self.frame_id:05d}_speed_{speed:.1f}.png"
+                    image.save_to_disk(filename)
+                if self.thumbnails is not None:
+                    self.thumbnails.add(image, speed, filename)
+                self.frame_id += 1
+            if report_frames:
+                tracer.sensor_frame(image.frame, image.timestamp, image)
+
+        self.camera.listen(process_image)
+
+    def open_logs(self, inputs):
+        csv_path = os.path.join(self.base_folder, "controls.csv")
+        self.log_file = open(csv_path, "w", newline="")
+        self.logger = csv.writer(self.log_file)
+        self.logger.writerow(["time", "steer", "throttle", "brake", "speed_kmh", "driver_state"])
+        self.recorder = StateRecorder(self.base_folder)
+        self.input_file = open(os.path.join(self.base_folder, "inputs.csv"), "w", newline="")
+        self.input_log = csv.writer(self.input_file)
+        self.input_log.writerow(["time", "name", "source", "reaction_s"])
+
+        if inputs is None:
+            inputs = default_input()
+        elif isinstance(inputs, str):
+            inputs = DriverInput([ScriptedSource(inputs)])
+        self.inputs = inputs
+
+    def track(self, state):
+        """Swap the spawned actors for TickState proxies."""
+        self.hazards = HazardMonitor(state.world, self.vehicle.id)
+        self.vehicle = state.track(self.vehicle)
+        if self.npc is not None:
+            self.npc = state.track(self.npc)
+        # Track critical behavior
+        self.vehicle.driver_cancelled = False
+        # Each ego's own monitor and alert channels: controllers read them
+        # as vehicle.hazards and vehicle.sounds
+        self.vehicle.hazards = self.hazards
+        self.vehicle.sounds = EgoSounds(self.index)
 
-    if scenario_id == 1 or scenario_id == 2:
-        safe_state = driver_class.replace(" ", "_")
-        base_folder = f"output/Scenario{scenario_id}-{town_name}-{safe_state}"
-    else:
-        base_folder = f"output/Scenario{scenario_id}-{town_name}"
+    # -----------------------------------------------------
+    # Per tick
+    # -----------------------------------------------------
+    def poll_inputs(self, t, tracer):
+        """Driver input since the last tick; sets ok_pressed and ok_time."""
+        self.ok_pressed = False
+        self.ok_time = None
+        warning_start = getattr(self.vehicle, "warning_start", None)
+        for ev in self.inputs.poll(t):
+            reaction = ev.t - warning_start if warning_start is not None else None
+            if ev.name == OK:
+                self.ok_pressed = True
+                if self.ok_time is None or ev.t < self.ok_time:
+                    self.ok_time = ev.t
+                if reaction is not None and reaction >= 0 and self.reaction_time is None:
+                    self.reaction_time = reaction
+            self.input_log.writerow([f"{ev.t:.4f}", ev.name, ev.source,
+                                     "" if reaction is None else f"{reaction:.4f}"])
+            tracer.event("input", t=ev.t, input=ev.name, source=ev.source, reaction_s=reaction,
+                         **self.tag)
+
+    def control(self, t, state):
+        """Run the scenario controller; returns (steer, throttle, brake, speed)."""
+        scenario_id, vehicle = self.scenario_id, self.vehicle
+        driver_class, driver_ok_pressed, ok_time = self.driver_class, self.ok_pressed, self.ok_time
+        if scenario_id == 1 or scenario_id == 2:
+            if scenario_id == 1:
+                steer, throttle, brake, speed = scenario_1_control(vehicle,t,driver_class,driver_ok_pressed, ok_time)
+
+            else:   # scenario 2
+                steer, throttle, brake, speed = scenario_2_control(vehicle,t,driver_class,driver_ok_pressed, state, ok_time)
+
+            # Unified final state logic for both scenarios
+            if driver_class == "critical drowsiness":
+                if vehicle.driver_cancelled:
+                    self.final_state = "critical_user_cancelled"
+                else:
+                    if hasattr(vehicle, "critical_start") and t - vehicle.critical_start > 5:
+                        self.final_state = "critical_ai_takeover"
+        elif scenario_id == 3:
+            steer, throttle, brake, speed = scenario_3_control(vehicle, t)
+        elif scenario_id == 4:
+            steer, throttle, brake, speed = scenario_4_control(vehicle, t)
+        elif scenario_id == 5:
+            steer, throttle, brake, speed = scenario_5_control(vehicle, t, driver_ok_pressed, state, ok_time)
+            if vehicle.s5_resolved:
+                self.final_state = "user_cancelled"
+            elif hasattr(vehicle, "takeover_initial_speed"):
+                self.final_state = "ai_takeover"
+        elif scenario_id == 6:
+            steer, throttle, brake, speed = scenario_6_control(vehicle, self.npc, t)
+        else:
+            raise ValueError("Scenario not implemented yet.")
+        self.controls = (steer, throttle, brake, speed)
+        return self.controls
 
-    # Clean old folder
-    if os.path.exists(base_folder):
-        shutil.rmtree(base_folder)
+    def report_alerts(self, t, tracer):
+        """Report warnings / takeovers the controller flagged this tick."""
+        for event, marker in ALERT_MARKERS:
+            if marker not in self.alerts_seen and getattr(self.vehicle, marker, None) not in (None, False):
+                self.alerts_seen.add(marker)
+                self.alert_times.setdefault(event, t)
+                tracer.event(event, t=t, marker=marker, **self.tag)
+
+    # -----------------------------------------------------
+    # Teardown
+    # -----------------------------------------------------
+    def close(self):
+        if self.camera is not None:
+            try:
+                self.camera.stop()
+            except:
+                pass
+
+        if self.thumbnails is not None:
+            self.thumbnails.close()
+
+        self.inputs.stop()
+        self.log_file.close()
+        self.input_file.close()
+        self.recorder.close()
+
+    def finalize(self, output_root, town_name, **fields):
+        label = self.label
+        if self.scenario_id == 1 or self.scenario_id == 2 or self.scenario_id == 5:
+            label = f"Scenario{self.scenario_id}-{town_name}-{self.final_state.replace(' ', '_')}"
+
+        summary = summarize(self.base_folder, takeover_s=self.alert_times.get("takeover"))
+        reaction_time = None if self.reaction_time is None else round(self.reaction_time, 4)
+        manifest = self.run.finalize(label, scenario_id=self.scenario_id, town=town_name,
+                                     driver_class=self.driver_class, final_state=self.final_state,
+                                     reaction_time_s=reaction_time, **fields,
+                                     summary=summary, code_version=code_version())
+        add_run(output_root, self.run.path, manifest)
+        print(f"Run recorded as {label}")
+
+
+def run_scenario(client, town_name, scenario_id, driver_class, status_box=None,
+                 output_root="output", tm_port=TM_PORT, clock=time, tracer=None, capture=None,
+                 inputs=None, traffic=None, retention=True):
+    """
+    clock: anything with time()/sleep(); defaults to wall time. Pass
+    client.clock when running on the kinematic_carla stand-in backend.
+    tracer: receives span(name) around every phase of the tick
+    (see loop_profiler.py).
+    capture: capture profile name or dict (see capture_profiles.py);
+    defaults to CARLA_CAPTURE_PROFILE or "record".
+    inputs: a driver_input.DriverInput, or the path of a "t,name" script
+    to press OK without a human; defaults to the O key.
+    traffic: background autopilot vehicles and walkers, as N or (N, M)
+    (see traffic.py); defaults to CARLA_TRAFFIC or none.
+    retention: prune old runs (apply_retention) once the run is saved;
+    parallel_runner turns it off in its workers and prunes once at the end.
+    """
+    return run_multi_scenario(client, town_name, scenario_id, [driver_class], status_box,
+                              output_root, tm_port, clock, tracer, capture, [inputs], traffic,
+                              retention)[0]
 
-    os.makedirs(base_folder, exist_ok=True)
 
-    images_folder = os.path.join(base_folder, "images")
-    os.makedirs(images_folder, exist_ok=True)
+def run_multi_scenario(client, town_name, scenario_id, driver_classes, status_box=None,
+                       output_root="output", tm_port=TM_PORT, clock=time, tracer=None, capture=None,
+                       inputs=None, traffic=None, retention=True):
+    """
+    One ego per entry of driver_classes, stepped together in one world
+    (see EGO_SEPARATION). inputs: one per ego (DriverInput, script path or
+    None), or a single script path every ego replays; by default only the
+    first ego listens to the O key. Each ego's beeps play on its own
+    mixer channels (EgoSounds). The tracer's span / sample /
+    sensor_frame follow the first ego; events carry ego=index when there
+    are several. Returns the egos' output folders, in order. Other
+    arguments as run_scenario.
+    """
+    tracer = tracer or NULL_TRACER
+    profile_name, profile = resolve_profile(capture)
+    if not driver_classes:
+        raise ValueError("run_multi_scenario needs at least one driver class.")
+    if inputs is None or isinstance(inputs, str):
+        inputs = [inputs] + [inputs if inputs else DriverInput() for _ in driver_classes[1:]]
+    elif len(inputs) != len(driver_classes):
+        raise ValueError(f"{len(inputs)} inputs for {len(driver_classes)} egos.")
 
-    print(f"\nSaving outputs to: {base_folder}")
+    # -----------------------------------------------------
+    # INITIAL FOLDER SETUP
+    # -----------------------------------------------------
+    egos = [EgoRun(k, scenario_id, town_name, driver_class, output_root)
+            for k, driver_class in enumerate(driver_classes)]
+    if len(egos) > 1:
+        for ego in egos:
+            ego.tag = {"ego": ego.index}
 
     # -----------------------------------------------------
     # LOAD WORLD
     # -----------------------------------------------------
     print(f"\nLoading town: {town_name}")
-    world = client.load_world(town_name)
-    time.sleep(2)
-
-    # Foce all traffic lights to be green initially
-    set_all_traffic_lights(world, "green")
+    # Same town as the last run: reset it instead of reloading the map
+    world, reused = prepare_world(client, town_name, clock)
+    registry = ActorRegistry(client, world)
+    apply_rendering(world, profile)
+    save_town_map(output_root, world, town_name)   # once per town, for offline replay
 
     bp_lib = world.get_blueprint_library()
-    vehicle_bp = bp_lib.filter("model3")[0]
-
-    # Spawn vehicle
-    spawn_point = get_fixed_spawn(world, town_name)
-    npc = None
-    if scenario_id == 4:
-        spawn_point = shift_lane(world, spawn_point) # Move to the left lane
-        spawn_point = shift_along_road(spawn_point,-100) # Move 100 meters to the back
-    elif scenario_id == 6:
-        npc_bp = bp_lib.filter("vehicle.*model3*")[0]
-        npc_spawn = shift_lane(world, spawn_point, +1)     # move to opposite lane
-        npc_spawn = shift_along_road(npc_spawn, +120)      # place NPC ahead
-        # Fix rotation: align to lane and flip direction toward the ego car
-        wp = world.get_map().get_waypoint(npc_spawn.location)
-        npc_spawn.rotation.yaw = wp.transform.rotation.yaw + 180
-        npc = world.try_spawn_actor(npc_bp, npc_spawn)
-        # Make NPC drive toward ego
-        npc.set_autopilot(False)
-        npc.set_target_velocity(npc.get_transform().get_forward_vector() * 20)
-        npc.s6_drift_active = False
-        npc.s6_drift_trigger_distance = 40   # start drifting at 40 meters
-
-    vehicle = world.try_spawn_actor(vehicle_bp, spawn_point)
-    if not vehicle:
-        raise RuntimeError("Failed to spawn vehicle.")
-    vehicle.set_autopilot(False)
+
+    # Spawn the egos, then force the traffic lights on their routes to be green initially
+    spawn_points = [ego.spawn(world, registry, bp_lib, point)
+                    for ego, point in zip(egos, ego_spawns(world, town_name, len(egos)))]
+    lights = index_for(world)
+    for point in spawn_points:
+        lights.set_route_state(point.location, "green")
+    lead = egos[0]
+
+    # Optional background traffic, kept clear of the egos and scenario NPCs
+    traffic_layer = None
+    traffic_vehicles, traffic_walkers = parse_traffic(traffic)
+    if traffic_vehicles or traffic_walkers:
+        traffic_layer = TrafficLayer(client, world, registry, tm_port)
+        avoid = [p.location for p in spawn_points] + [e.npc.get_location() for e in egos if e.npc is not None]
+        traffic_layer.spawn(traffic_vehicles, traffic_walkers, avoid)
 
     # Camera spectator
     spectator = world.get_spectator()
-    cam_loc = spawn_point.location + carla.Location(z=30)
+    cam_loc = spawn_points[0].location + carla.Location(z=30)
     spectator.set_transform(carla.Transform(cam_loc, carla.Rotation(pitch=-90)))
 
-    # Attach RGB camera
-    cam_bp = bp_lib.find("sensor.camera.rgb")
-    cam_bp.set_attribute("image_size_x", "800")
-    cam_bp.set_attribute("image_size_y", "600")
-    cam_bp.set_attribute("fov", "90")
-
-    cam_transform = carla.Transform(carla.Location(x=0.6, z=1.6))
-    camera = world.spawn_actor(cam_bp, cam_transform, attach_to=vehicle)
-
-    frame_counter = {"id": 0}
-
-    def process_image(image, vehicle):
-        vel = vehicle.get_velocity()
-        speed = math.sqrt(vel.x**2 + vel.y**2 + vel.z**2) * 3.6
-        frame_id = frame_counter["id"]
-        filename = f"{images_folder}/frame_{frame_id:05d}_speed_{speed:.1f}.png"
-        image.save_to_disk(filename)
-        frame_counter["id"] += 1
-
-    camera.listen(lambda img: process_image(img, vehicle))
+    # Attach cameras (per capture profile; none at all when capture is "off")
+    for ego in egos:
+        ego.attach_camera(registry, bp_lib, profile, tracer, report_frames=ego is lead)
 
     # -----------------------------------------------------
     # CSV LOG
     # -----------------------------------------------------
-    csv_path = os.path.join(base_folder, "controls.csv")
-    log_file = open(csv_path, "w", newline="")
-    logger = csv.writer(log_file)
-    logger.writerow(["time", "steer", "throttle", "brake", "speed_kmh", "driver_state"])
+    for ego, ego_inputs in zip(egos, inputs):
+        ego.open_logs(ego_inputs)
 
     # -----------------------------------------------------
     # MAIN SIMULATION LOOP
     # -----------------------------------------------------
-    print(f"\nRunning Scenario {scenario_id} on {town_name}...")
+    egos_note = f" with {len(egos)} egos" if len(egos) > 1 else ""
+    print(f"\nRunning Scenario {scenario_id} on {town_name}{egos_note}...")
+
+    start = clock.time()
+    for ego in egos:
+        ego.inputs.start(clock, start)   # event times are scenario seconds from here
 
-    start = time.time()
+    # From here on the loop reads one snapshot per tick and sends one batch
+    state = TickState(world, client)
+    state.traffic_lights = lights
+    for ego in egos:
+        ego.track(state)
+    spectator = state.track(spectator)
 
-    # Track critical behavior
-    vehicle.driver_cancelled = False
+    for ego in egos:
+        tracer.event("run_start", scenario=scenario_id, town=town_name, driver_class=ego.driver_class,
+                     **ego.tag)
 
-    while time.time() - start < 20:
-        t = time.time() - start
+    while clock.time() - start < 20:
+        t = clock.time() - start
 
         # UPDATE SPECTATOR TO FOLLOW VEHICLE
         # vehicle_location = vehicle.get_transform().location
@@ -960,143 +1366,138 @@ def run_scenario(client, town_name, scenario_id, driver_class, status_box=None):
         #     carla.Rotation(pitch=-90)
         # ))
 
-        # UPDATE SPECTATOR TO FOLLOW VEHICLE (behind view)
-        vehicle_transform = vehicle.get_transform()
-        vehicle_location = vehicle_transform.location
-        vehicle_rotation = vehicle_transform.rotation
+        with tracer.span("snapshot"):
+            state.refresh()
 
-        # Position camera behind and above the vehicle
-        spectator_location = vehicle_location - vehicle_transform.get_forward_vector() * 8 + carla.Location(z=3)
-        spectator.set_transform(carla.Transform(
-            spectator_location, 
-            carla.Rotation(pitch=-15, yaw=vehicle_rotation.yaw)
-        ))
+        # Nearby vehicles / walkers from the same snapshot: TTC and lane-relative closing speed
+        with tracer.span("hazards"):
+            for ego in egos:
+                ego.hazards.update(state.snapshot)
+        for ego in egos:
+            for h in ego.hazards.events:
+                tracer.event("hazard", t=t, actor=h.actor_id, level=h.level, ttc=round(h.ttc, 3),
+                             distance=round(h.distance, 2), same_lane=h.same_lane,
+                             oncoming=h.oncoming, **ego.tag)
 
-        # Check keyboard
-        driver_ok_pressed = keyboard.is_pressed("o")
+        # UPDATE SPECTATOR TO FOLLOW VEHICLE (behind view)
+        with tracer.span("spectator"):
+            vehicle_transform = lead.vehicle.get_transform()
+            vehicle_location = vehicle_transform.location
+            vehicle_rotation = vehicle_transform.rotation
+
+            # Position camera behind and above the vehicle
+            spectator_location = vehicle_location - vehicle_transform.get_forward_vector() * 8 + carla.Location(z=3)
+            spectator.set_transform(carla.Transform(
+                spectator_location, 
+                carla.Rotation(pitch=-15, yaw=vehicle_rotation.yaw)
+            ))
+
+        # Driver input since the last tick (keyboard / gamepad / dashboard / script)
+        with tracer.span("input"):
+            for ego in egos:
+                ego.poll_inputs(t, tracer)
+
+        # What the controllers are about to see, for replay.py
+        with tracer.span("record"):
+            for ego in egos:
+                ego.recorder.record(t, ego.ok_pressed, ego.vehicle, ego.npc, ego.ok_time)
 
         # Live dashboard message
-        if driver_ok_pressed:
-            vehicle.driver_cancelled = True
-            if status_box is not None:
-                try:
-                    status_box.warning("🟠 Driver cancelled AI takeover — OK pressed")
-                except:
-                    pass
-
-        if scenario_id == 1 or scenario_id == 2:
-            if scenario_id == 1:
-                steer, throttle, brake, speed = scenario_1_control(vehicle,t,driver_class,driver_ok_pressed)
-
-            else:   # scenario 2
-                steer, throttle, brake, speed = scenario_2_control(vehicle,t,driver_class,driver_ok_pressed, world)
-
-            # Unified final state logic for both scenarios
-            if driver_class == "critical drowsiness":
-                if vehicle.driver_cancelled:
-                    final_state = "critical_user_cancelled"
-                else:
-                    if hasattr(vehicle, "critical_start") and t - vehicle.critical_start > 5:
-                        final_state = "critical_ai_takeover"
-        elif scenario_id == 3:
-            steer, throttle, brake, speed = scenario_3_control(vehicle, t)
-        elif scenario_id == 4:
-            steer, throttle, brake, speed = scenario_4_control(vehicle, t)
-        elif scenario_id == 5:
-            steer, throttle, brake, speed = scenario_5_control(vehicle, t, driver_ok_pressed, world)
-            if vehicle.s5_resolved:
-                final_state = "user_cancelled"
-            elif hasattr(vehicle, "takeover_initial_speed"):
-                final_state = "ai_takeover"
-        elif scenario_id == 6:
-            steer, throttle, brake, speed = scenario_6_control(vehicle, npc, t)
-        else:
-            raise ValueError("Scenario not implemented yet.")
-
-        # Apply control
-        vehicle.apply_control(
-            carla.VehicleControl(
-                steer=float(steer),
-                throttle=float(throttle),
-                brake=float(brake)
-            )
-        )
-
-        logger.writerow([time.time(), steer, throttle, brake, speed, driver_class])
-        world.tick()
+        for ego in egos:
+            if ego.ok_pressed:
+                ego.vehicle.driver_cancelled = True
+                if status_box is not None:
+                    try:
+                        status_box.warning("🟠 Driver cancelled AI takeover — OK pressed")
+                    except:
+                        pass
+
+        with tracer.span("controller"):
+            for ego in egos:
+                ego.control(t, state)
+
+        # Apply every ego's control, then send them with this tick's light / spectator / NPC commands
+        with tracer.span("submit"):
+            for ego in egos:
+                steer, throttle, brake, _ = ego.controls
+                ego.vehicle.apply_control(
+                    carla.VehicleControl(
+                        steer=float(steer),
+                        throttle=float(throttle),
+                        brake=float(brake)
+                    )
+                )
+            state.flush()
+
+        with tracer.span("log"):
+            now = clock.time()
+            for ego in egos:
+                ego.logger.writerow([now, *ego.controls, ego.driver_class])
+        tracer.sample(t, *lead.controls)
+
+        for ego in egos:
+            ego.report_alerts(t, tracer)
+
+        with tracer.span("tick"):
+            frame = world.tick()
+        tracer.tick_done(frame)
 
     # -----------------------------------------------------
     # CLEANUP
     # -----------------------------------------------------
+    for ego in egos:
+        tracer.event("run_end", final_state=ego.final_state, **ego.tag)
     print("\nCleaning up...")
 
-    try:
-        camera.stop()
-    except:
-        pass
+    for ego in egos:
+        ego.close()
+    if traffic_layer is not None:
+        traffic_layer.stop()
 
-    try:
-        camera.destroy()
-    except:
-        pass
-
-    try:
-        vehicle.destroy()
-    except:
-        pass
-
-    log_file.close()
-
-    cleanup_after_scenario(world, client)
-
-    # Allow OS time to release locks
-    import gc
-    gc.collect()
-    time.sleep(0.5)
+    cleanup_after_scenario(world, client, tm_port, registry)
 
     # -----------------------------------------------------
-    # FINAL RENAME
+    # FINALIZE OUTPUT
     # -----------------------------------------------------
-    if scenario_id == 1 or scenario_id == 2 or scenario_id == 5:
-        new_folder = f"output/Scenario{scenario_id}-{town_name}-{final_state.replace(' ', '_')}"
-
-        if new_folder != base_folder:
-            # remove destination if exists
-            if os.path.exists(new_folder):
-                shutil.rmtree(new_folder)
-
-            try:
-                os.rename(base_folder, new_folder)
-                base_folder = new_folder
-                print(f"Folder renamed → {new_folder}")
-            except Exception as e:
-                print("Rename error:", e)
-
-    print(f"\nScenario {scenario_id} complete. Files saved in: {base_folder}\n")
-    return base_folder
+    carla_backend = "kinematic" if carla.__name__ == "kinematic_carla" else "carla"
+    for ego in egos:
+        extra = {"ego": ego.index, "egos": len(egos)} if len(egos) > 1 else {}
+        ego.finalize(output_root, town_name, capture_profile=profile_name, capture=profile,
+                     world_reused=reused, carla_backend=carla_backend,
+                     traffic=traffic_layer.info() if traffic_layer is not None else None, **extra)
+
+    if retention:
+        deleted = apply_retention(output_root)
+        if deleted:
+            remove_runs(output_root, deleted)
+            print(f"Retention: removed {len(deleted)} old run(s)")
+
+    folders = [ego.base_folder for ego in egos]
+    for folder in folders:
+        print(f"\nScenario {scenario_id} complete. Files saved in: {folder}\n")
+    return folders
 
 # ---------------------------------------------------------
 # Cleanup After Scenario
 # ---------------------------------------------------------
-def cleanup_after_scenario(world, client):
+def cleanup_after_scenario(world, client, tm_port=TM_PORT, registry=None):
     # turn off sync
     settings = world.get_settings()
     settings.synchronous_mode = False
     settings.fixed_delta_seconds = None
+    settings.no_rendering_mode = False
     world.apply_settings(settings)
 
-    tm = client.get_trafficmanager()
+    tm = client.get_trafficmanager(tm_port)
     tm.set_synchronous_mode(False)
 
-    # destroy all vehicles except traffic
-    for a in world.get_actors().filter("vehicle.*"):
-        try: a.destroy()
-        except: pass
-
-    # destroy every sensor
-    for a in world.get_actors().filter("sensor.*"):
-        try: a.destroy()
-        except: pass
+    # destroy what the run spawned in one batch; without a registry, sweep
+    # every vehicle and sensor in the world (also one batch)
+    if registry is not None:
+        destroyed = registry.destroy_all()
+    else:
+        destroyed = destroy_leftovers(client, world)
+    print(f"Destroyed {destroyed} actors")
 
     import gc
     gc.collect()
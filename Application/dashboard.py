@@ -1,10 +1,16 @@
 import streamlit as st
 import os
 import json
+import sys
+import time
 import pandas as pd
-import carla
+import telemetry_view
+import run_index
+import result_cache
 from llm_explanation import generate_explanation
-from carla_simulation import run_scenario, start_carla, stop_carla, BASE_DIR
+from carla_simulation import BASE_DIR
+from frame_store import FrameStore
+from sim_worker import start_worker, list_workers, Subscriber
 import subprocess
 
 
@@ -65,6 +71,49 @@ st.set_page_config(page_title="CARLA AI Drowsiness Monitor", layout="wide")
 st.title("CARLA AI Drowsiness Monitor")
 
 JSON_FOLDER = "assets/json"
+OUTPUT_ROOT = os.path.join(BASE_DIR, "output")
+SIM_BACKEND = os.environ.get("CARLA_BACKEND", "carla")   # "kinematic" runs without a CARLA server
+
+
+# Parsed once per run; the file's mtime is part of the key so a new run invalidates it
+@st.cache_data(show_spinner=False, max_entries=8)
+def load_telemetry(csv_path, mtime):
+    return telemetry_view.load_controls(csv_path)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def telemetry_chart(csv_path, mtime, columns):
+    data = telemetry_view.plot_series(load_telemetry(csv_path, mtime), list(columns))
+    return pd.DataFrame(data).set_index("time")
+
+
+# One FrameStore (memmap + thumbnail LRU) per run, shared across reruns
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_frames(run_dir, mtime):
+    return FrameStore(run_dir)
+
+
+@st.fragment
+def replay_player(store):
+    # Only this fragment reruns while scrubbing
+    step = float(store.times[1] - store.times[0]) if len(store) > 1 else 0.05
+    t = st.slider("Simulation time (s)", 0.0, store.duration, 0.0, step=step)
+    i = store.index_at(t)
+    caption = f"frame {store.frame_ids[i]} · {store.times[i]:.2f} s · {store.speeds[i]:.1f} km/h"
+
+    if store.files[i] and st.toggle("Full resolution"):
+        st.image(store.frame_path(i), caption=caption, use_container_width=True)
+    else:
+        st.image(store.thumbnail(i), caption=caption, width=480)
+
+
+def open_folder(path):
+    if sys.platform.startswith("win"):
+        os.startfile(path)
+    elif sys.platform == "darwin":
+        subprocess.Popen(["open", path])
+    else:
+        subprocess.Popen(["xdg-open", path])
 
 
 # =========================================================
@@ -187,46 +236,105 @@ if scenario_id in SCENARIO_TOWN_MAP and SCENARIO_TOWN_MAP[scenario_id] is not No
 # =========================================================
 # STEP 4 — RUN SIMULATION
 # =========================================================
+# Runs execute in sim_worker processes; the dashboard only subscribes to
+# their telemetry, so the UI stays responsive and several runs (also ones
+# started elsewhere on this machine) can be watched at once.
+if "live_runs" not in st.session_state:
+    st.session_state["live_runs"] = {}
+    st.session_state["worker_processes"] = {}
+
 if "selected_town" in st.session_state and "scenario_id" in st.session_state:
+    # An identical finished run (same inputs, code and server build) is shown instead of re-running
+    use_cache = st.checkbox("Reuse an identical earlier run", value=True)
     if st.button("🚗 Run CARLA Simulation", use_container_width=True):
 
         scenario = st.session_state["scenario_id"]
         town = st.session_state["selected_town"]
         driver_class = st.session_state["driver_class"]
 
-        st.write(f"Starting CARLA for Scenario {scenario} in {town}...")
-
-        # Placeholder status box for real-time updates
-        status_box = st.empty()
-
-        # TEMPORARY placeholder output (final is assigned after sim)
-        temp_folder = os.path.join(BASE_DIR, "output", "temp_running_folder")
-        st.session_state["output_path"] = temp_folder
-
-        carla_process = start_carla()
-        st.write("CARLA launched. Connecting to server...")
-        is_error = False
-
-        try:
-            client = carla.Client("localhost", 2000)
-            client.set_timeout(60.0)
-
-            st.write("Connection successful. Running scenario now...")
-            final_folder = run_scenario(client, town, scenario, driver_class, status_box)
-
-            # SAVE THE REAL FINAL FOLDER
-            st.session_state["output_path"] = os.path.join(BASE_DIR, final_folder)
-
-        except Exception as e:
-            is_error = True
-            st.error(f"**Simulation Error:** {str(e)}")
-
-        finally:
-            if not is_error:
-                st.success("Simulation Completed!")
-            st.write("Shutting down CARLA simulator...")
-            stop_carla(carla_process)
-            st.write("CARLA stopped successfully.")
+        cached = None
+        if use_cache:
+            key, _ = result_cache.fingerprint(scenario, town, driver_class, backend=SIM_BACKEND)
+            cached = result_cache.lookup(OUTPUT_ROOT, key)
+
+        if cached is not None:
+            st.success(f"Identical run found, showing {os.path.basename(cached)}")
+            st.session_state["output_path"] = cached
+        else:
+            st.write(f"Starting CARLA for Scenario {scenario} in {town}...")
+
+            try:
+                process, entry = start_worker(scenario, town, driver_class, output_root=OUTPUT_ROOT,
+                                              backend=SIM_BACKEND, cache=use_cache)
+                st.session_state["worker_processes"][entry["run_id"]] = process
+                st.session_state["live_runs"][entry["run_id"]] = Subscriber(entry)
+            except Exception as e:
+                st.error(f"**Simulation Error:** {str(e)}")
+
+with st.expander("Monitor other running simulations"):
+    others = [w for w in list_workers(OUTPUT_ROOT) if w["run_id"] not in st.session_state["live_runs"]]
+    if not others:
+        st.write("No other simulations running.")
+    for w in others:
+        if st.button(f"Watch Scenario {w['scenario_id']} · {w['town']} · {w['driver_class']} (started {time.strftime('%H:%M:%S', time.localtime(w['started']))})",
+                     key=f"attach-{w['run_id']}"):
+            st.session_state["live_runs"][w["run_id"]] = Subscriber(w)
+
+
+@st.fragment(run_every=1.0)
+def live_runs_panel():
+    runs = st.session_state["live_runs"]
+    finished = []
+
+    for run_id, sub in list(runs.items()):
+        sub.poll()
+        entry = sub.entry
+
+        with st.container(border=True):
+            st.markdown(f"**Scenario {entry['scenario_id']} · {entry['town']} · {entry['driver_class']}** — {sub.phase}")
+            c1, c2 = st.columns([2, 1])
+
+            with c1:
+                if sub.latest is not None:
+                    m = st.columns(4)
+                    m[0].metric("Speed", f"{sub.latest['speed']:.1f} km/h")
+                    m[1].metric("Steer", f"{sub.latest['steer']:.3f}")
+                    m[2].metric("Throttle", f"{sub.latest['throttle']:.2f}")
+                    m[3].metric("Brake", f"{sub.latest['brake']:.2f}")
+                    st.line_chart(pd.DataFrame(list(sub.samples), columns=["t", "speed"]).set_index("t"),
+                                  height=160)
+                else:
+                    st.write("Waiting for the simulator...")
+
+            with c2:
+                if sub.thumbnail is not None:
+                    st.image(sub.thumbnail, use_container_width=True)
+
+            if sub.phase in ("driving", "warning", "takeover"):
+                if st.button("✅ I'm OK (same as the O key)", key=f"ok_{run_id}"):
+                    sub.send_input("ok")
+
+            if sub.phase == "driver_ok":
+                st.warning("🟠 Driver cancelled AI takeover — OK pressed")
+            elif sub.phase == "failed":
+                st.error(f"**Simulation Error:** {sub.events[-1].get('message', '')}")
+
+        if sub.closed:
+            finished.append(run_id)
+            if sub.folder:
+                st.session_state["output_path"] = sub.folder
+
+    if finished:
+        for run_id in finished:
+            runs.pop(run_id)
+            st.session_state["worker_processes"].pop(run_id, None)
+        # Full rerun so step 5 shows the finished run
+        st.rerun()
+
+
+if st.session_state["live_runs"]:
+    st.header("Live Simulations")
+    live_runs_panel()
 
 
 # =========================================================
@@ -240,26 +348,88 @@ if "output_path" in st.session_state:
     csv_path = os.path.join(output_dir, "controls.csv")
 
     if os.path.exists(csv_path):
-        df = pd.read_csv(csv_path)
-        st.dataframe(df, use_container_width=True)
+        mtime = os.path.getmtime(csv_path)
+        data = load_telemetry(csv_path, mtime)
+        rows = len(data["time"])
+
+        stats = telemetry_view.summary(data)
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Duration", f"{stats['time']['max']:.1f} s" if "time" in stats else "-")
+        m2.metric("Max speed", f"{stats['speed_kmh']['max']:.1f} km/h" if "speed_kmh" in stats else "-")
+        m3.metric("Rows", f"{rows:,}")
+
+        # Charts: LTTB-downsampled, a few thousand points at most
+        st.subheader("Speed (km/h)")
+        st.line_chart(telemetry_chart(csv_path, mtime, ("speed_kmh",)))
+        st.subheader("Controls")
+        st.line_chart(telemetry_chart(csv_path, mtime, ("steer", "throttle", "brake")))
+
+        # Table: only the selected page is sent to the browser
+        p1, p2 = st.columns([1, 1])
+        with p2:
+            page_size = st.selectbox("Rows per page", telemetry_view.PAGE_SIZES, index=1)
+        pages = telemetry_view.page_count(data, page_size)
+        with p1:
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1) - 1
+        st.dataframe(
+            pd.DataFrame(telemetry_view.table_page(data, page, page_size)),
+            use_container_width=True
+        )
 
         col1, col2 = st.columns([1, 1])
 
         with col1:
-            st.download_button(
-                "⬇️ Download CSV",
-                data=df.to_csv(index=False),
-                file_name="controls.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
+            with open(csv_path, "rb") as f:
+                st.download_button(
+                    "⬇️ Download CSV",
+                    data=f.read(),
+                    file_name="controls.csv",
+                    mime="text/csv",
+                    use_container_width=True
+                )
 
         with col2:
             if st.button("📂 Open Folder", use_container_width=True):
                 try:
-                    subprocess.Popen(f'explorer "{output_dir}"')
+                    open_folder(output_dir)
                 except Exception as e:
                     st.error(f"Failed to open folder: {e}")
 
+        # Frame replay
+        store = load_frames(output_dir, os.path.getmtime(os.path.join(output_dir, "images")))
+        if len(store):
+            st.subheader("Replay")
+            replay_player(store)
+
     else:
-        st.warning("CSV file not found.")
\ No newline at end of file
+        st.warning("CSV file not found.")
+
+
+# =========================================================
+# RUN HISTORY — queries the SQLite run index
+# =========================================================
+st.header("Run History")
+
+f1, f2, f3, f4 = st.columns(4)
+with f1:
+    q_scenario = st.selectbox("Scenario", [None] + list(SCENARIO_TITLES), format_func=lambda s: "Any" if s is None else f"Scenario {s}")
+with f2:
+    q_town = st.selectbox("Town", [None, "Town01", "Town04", "Town05"], format_func=lambda t: t or "Any")
+with f3:
+    q_state = st.text_input("Final state", placeholder="e.g. critical_ai_takeover").strip() or None
+with f4:
+    q_stop = st.number_input("Stop took longer than (s)", min_value=0.0, value=0.0, step=0.5)
+
+history = run_index.query(OUTPUT_ROOT, scenario_id=q_scenario, town=q_town, final_state=q_state,
+                          min_stop_s=q_stop or None, limit=500)
+if history:
+    columns = ["label", "final_state", "takeover_s", "stop_time_s", "stopping_distance_m",
+               "peak_brake", "min_npc_gap_m", "reaction_time_s", "code_version"]
+    st.dataframe(pd.DataFrame(history)[columns], use_container_width=True)
+
+    chosen = st.selectbox("Open run", range(len(history)), format_func=lambda i: os.path.basename(history[i]["path"]))
+    if st.button("View run"):
+        st.session_state["output_path"] = history[chosen]["path"]
+        st.rerun()
+else:
+    st.info("No indexed runs match. Index older runs with: python run_index.py --rebuild --output output")
@@ -0,0 +1,169 @@
+import csv
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# ---------------------------------------------------------
+# Driver Input Events
+# ---------------------------------------------------------
+# Sources push timestamped events ("ok", ...) from their own threads into
+# one DriverInput queue; the simulation loop drains it once per tick with
+# poll(t). Nothing is lost between ticks, and every event keeps the time
+# it happened (scenario seconds, stamped when the source saw it), so the
+# reaction time to a warning is known to the millisecond, not to the tick.
+#
+#   KeyboardSource   the "o" key through the keyboard package's hook
+#                    (root on Linux; skipped with a note when unavailable)
+#   GamepadSource    a joystick button via pygame, polled at POLL_HZ
+#   ScriptedSource   a CSV of "t,name" rows; runs without a human
+#   push()           anything else, e.g. sim_worker forwarding the
+#                    dashboard's OK button
+#
+#     inputs = DriverInput([ScriptedSource("press_ok.csv")])
+#     run_scenario(client, town, 1, "critical drowsiness", inputs=inputs)
+
+InputEvent = namedtuple("InputEvent", ["t", "name", "source"])
+
+OK = "ok"
+POLL_HZ = 500                    # gamepad polling rate
+
+_keyboard_error = None           # set once the keyboard package failed to load
+
+
+class DriverInput:
+    def __init__(self, sources=()):
+        self.sources = list(sources)
+        self._queue = queue.Queue()
+        self._pending = []           # drained but not yet due (scripted, future t)
+        self._clock = time
+        self._origin = None
+
+    def add_source(self, source):
+        self.sources.append(source)
+        if self._origin is not None:
+            source.start(self)
+
+    def start(self, clock=time, origin=None):
+        """Start every source; event times are clock.time() - origin."""
+        self._clock = clock
+        self._origin = clock.time() if origin is None else origin
+        for source in self.sources:
+            source.start(self)
+
+    def now(self):
+        return self._clock.time() - self._origin
+
+    def push(self, name, source="", t=None):
+        """Thread-safe. t is scenario time; defaults to now."""
+        if self._origin is None:
+            return   # not started: nobody is listening yet
+        self._queue.put(InputEvent(self.now() if t is None else t, name, source))
+
+    def poll(self, t):
+        """Events with time <= t, oldest first."""
+        while True:
+            try:
+                self._pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._pending.sort(key=lambda e: e.t)
+        due = [e for e in self._pending if e.t <= t]
+        self._pending = self._pending[len(due):]
+        return due
+
+    def stop(self):
+        for source in self.sources:
+            source.stop()
+        self._origin = None
+
+
+# ---------------------------------------------------------
+# Sources
+# ---------------------------------------------------------
+class KeyboardSource:
+    def __init__(self, key="o", name=OK):
+        self.key = key
+        self.name = name
+        self._hook = None
+
+    def start(self, inputs):
+        global _keyboard_error
+        if _keyboard_error is not None:
+            return
+        try:
+            import keyboard
+            self._hook = keyboard.on_press_key(self.key, lambda e: inputs.push(self.name, "keyboard"))
+        except ImportError as e:
+            # keyboard needs root on Linux; headless runs go without the OK key
+            _keyboard_error = e
+            print("Keyboard input disabled:", e)
+
+    def stop(self):
+        if self._hook is not None:
+            import keyboard
+            keyboard.unhook(self._hook)
+            self._hook = None
+
+
+class GamepadSource:
+    def __init__(self, button=0, name=OK, joystick=0, poll_hz=POLL_HZ):
+        self.button = button
+        self.name = name
+        self.joystick = joystick
+        self.period = 1.0 / poll_hz
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, inputs):
+        import pygame
+
+        pygame.joystick.init()
+        if pygame.joystick.get_count() <= self.joystick:
+            print("Gamepad input disabled: no joystick connected")
+            return
+        pad = pygame.joystick.Joystick(self.joystick)
+        pad.init()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(pygame, pad, inputs), daemon=True)
+        self._thread.start()
+
+    def _loop(self, pygame, pad, inputs):
+        was_down = False
+        while not self._stop.wait(self.period):
+            pygame.event.pump()
+            down = bool(pad.get_button(self.button))
+            if down and not was_down:
+                inputs.push(self.name, "gamepad")
+            was_down = down
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class ScriptedSource:
+    """Events at fixed scenario times, from a CSV ("t,name") or a list of (t, name)."""
+
+    def __init__(self, script):
+        if isinstance(script, str):
+            with open(script, newline="") as f:
+                rows = [r for r in csv.reader(f) if r and not r[0].startswith("#")]
+            if rows and rows[0][0] == "t":
+                rows = rows[1:]
+            script = [(float(r[0]), r[1].strip() if len(r) > 1 else OK) for r in rows]
+        self.events = sorted(script)
+
+    def start(self, inputs):
+        for t, name in self.events:
+            inputs.push(name, "script", t)
+
+    def stop(self):
+        pass
+
+
+def default_input():
+    """What run_scenario listens to when no inputs are given: the O key."""
+    return DriverInput([KeyboardSource()])
@@ -0,0 +1,189 @@
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# ---------------------------------------------------------
+# Preallocated Frame Preprocessing
+# ---------------------------------------------------------
+# FramePreprocessor turns camera frames into the classifier's inputs
+# without allocating per frame. It takes BGRA straight from a CARLA
+# image (np.frombuffer over raw_data, no copy) or a BGR webcam frame
+# (cv2.VideoCapture.read(pre.bgr) fills the buffer in place), and writes:
+#
+#   gray          full-size uint8 grayscale, for the landmark detector
+#   resized       model-size uint8 (gray or RGB)
+#   model_input   (1, H, W, C) float32 in [0, 1], ready for model(...)
+#
+# All three are allocated once and overwritten by every process_*() call,
+# so copy anything you keep. With OpenCV installed every step runs with
+# dst= into those buffers (same conversions as the classifier notebook);
+# without it a numpy fallback does integer luma and nearest-neighbour
+# resizing, also in place.
+#
+#     python frame_preprocess.py --frames 500      # allocation / throughput benchmark
+
+LUMA_WEIGHTS = (29, 150, 77)     # B, G, R; sum 256, ~BT.601 like cv2's BGR2GRAY
+
+
+class FramePreprocessor:
+    def __init__(self, height, width, model_hw=(224, 224), channels=1):
+        if channels not in (1, 3):
+            raise ValueError("channels must be 1 (gray) or 3 (RGB)")
+        self.height, self.width = height, width
+        self.model_hw = model_hw
+        self.channels = channels
+        mh, mw = model_hw
+
+        self.bgr = np.empty((height, width, 3), dtype=np.uint8)        # webcam read target
+        self.gray = np.empty((height, width), dtype=np.uint8)
+        self.rgb = np.empty((height, width, 3), dtype=np.uint8) if channels == 3 else None
+        self.resized = np.empty((mh, mw) if channels == 1 else (mh, mw, 3), dtype=np.uint8)
+        self.model_input = np.empty((1, mh, mw, channels), dtype=np.float32)
+
+        # Views made once so the per-frame path creates no arrays
+        self._resized_c = self.resized.reshape(mh, mw, channels)
+        self._model_out = self.model_input[0]
+        self._scale = np.float32(1.0 / 255.0)
+        if cv2 is None:
+            self._scratch = np.empty((height, width), dtype=np.uint16)
+            self._term = np.empty((height, width), dtype=np.uint16)
+            self._weights = [np.uint16(w) for w in LUMA_WEIGHTS]
+            self._shift = np.uint16(8)
+            rows = np.arange(mh) * height // mh
+            cols = np.arange(mw) * width // mw
+            self._flat_idx = (rows[:, None] * width + cols[None, :]).ravel()
+            self._gray_flat = self.gray.reshape(-1)
+            self._resized_flat = self.resized.reshape(mh * mw, -1) if channels == 3 else self.resized.reshape(-1)
+            self._pixels = np.empty((mh * mw, 4), dtype=np.uint8) if channels == 3 else None
+
+    # -----------------------------------------------------
+    # Sources
+    # -----------------------------------------------------
+    def process_carla(self, image):
+        """carla.Image (BGRA raw_data) -> self."""
+        bgra = np.frombuffer(image.raw_data, dtype=np.uint8).reshape(self.height, self.width, 4)
+        return self.process_bgra(bgra)
+
+    def process_bgra(self, bgra):
+        if cv2 is not None:
+            cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY, dst=self.gray)
+            if self.channels == 3:
+                cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=self.rgb)
+        else:
+            self._luma(bgra)
+            if self.channels == 3:
+                np.take(bgra.reshape(-1, 4), self._flat_idx, axis=0, out=self._pixels, mode="clip")
+                np.copyto(self._resized_flat, self._pixels[:, 2::-1])
+        return self._finish()
+
+    def process_bgr(self, bgr=None):
+        """BGR frame (default: self.bgr, as filled by VideoCapture.read) -> self."""
+        bgr = self.bgr if bgr is None else bgr
+        if cv2 is None:
+            raise RuntimeError("process_bgr needs OpenCV; use process_bgra for CARLA frames")
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        if self.channels == 3:
+            cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        return self._finish()
+
+    # -----------------------------------------------------
+    # Steps
+    # -----------------------------------------------------
+    def _luma(self, bgra):
+        wb, wg, wr = self._weights
+        np.multiply(bgra[..., 0], wb, out=self._scratch)
+        np.multiply(bgra[..., 1], wg, out=self._term)
+        np.add(self._scratch, self._term, out=self._scratch)
+        np.multiply(bgra[..., 2], wr, out=self._term)
+        np.add(self._scratch, self._term, out=self._scratch)
+        np.right_shift(self._scratch, self._shift, out=self._scratch)
+        np.copyto(self.gray, self._scratch, casting="unsafe")
+
+    def _finish(self):
+        mh, mw = self.model_hw
+        if cv2 is not None:
+            src = self.gray if self.channels == 1 else self.rgb
+            cv2.resize(src, (mw, mh), dst=self.resized)
+        elif self.channels == 1:
+            np.take(self._gray_flat, self._flat_idx, out=self._resized_flat, mode="clip")
+        np.multiply(self._resized_c, self._scale, out=self._model_out)
+        return self
+
+
+# ---------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------
+def _naive(bgra, model_hw, channels):
+    """The per-frame path from the classifier notebook: fresh arrays at every step."""
+    mh, mw = model_hw
+    img = bgra[..., :3].astype(np.float32)
+    if cv2 is not None:
+        code = cv2.COLOR_BGR2GRAY if channels == 1 else cv2.COLOR_BGR2RGB
+        proc = cv2.cvtColor(img.astype(np.uint8), code)
+        proc = cv2.resize(proc.astype(np.float32), (mw, mh))
+    else:
+        proc = img @ np.array([0.114, 0.587, 0.299], dtype=np.float32) if channels == 1 else img[..., ::-1]
+        rows = np.arange(mh) * img.shape[0] // mh
+        cols = np.arange(mw) * img.shape[1] // mw
+        proc = proc[rows][:, cols]
+    if channels == 1:
+        proc = proc[..., None]
+    gray = np.clip(img.mean(axis=2), 0, 255).astype(np.uint8)   # extract_features' uint8 round trip
+    return (proc.astype(np.float32) / 255.0)[None, ...], gray
+
+
+def _measure(fn, frames):
+    fn(frames[0])                       # warm up (first-call setup is not steady state)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    for frame in frames:
+        fn(frame)
+    elapsed = time.perf_counter() - start
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "frames_per_s": len(frames) / elapsed,
+        "peak_kb_over_steady": (peak - before) / 1024,
+        "retained_kb": (after - before) / 1024,
+    }
+
+
+def benchmark(frames=300, height=600, width=800, model_hw=(224, 224), channels=1):
+    """Naive vs preallocated on synthetic BGRA frames (CARLA's 800x600 by default)."""
+    rng = np.random.default_rng(0)
+    pool = [rng.integers(0, 256, (height, width, 4), dtype=np.uint8) for _ in range(8)]
+    sequence = [pool[i % len(pool)] for i in range(frames)]
+
+    pre = FramePreprocessor(height, width, model_hw, channels)
+    return {
+        "backend": "opencv" if cv2 is not None else "numpy",
+        "naive": _measure(lambda f: _naive(f, model_hw, channels), sequence),
+        "preallocated": _measure(pre.process_bgra, sequence),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Allocation / throughput benchmark for frame preprocessing.")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--size", type=int, nargs=2, default=[600, 800], metavar=("H", "W"))
+    parser.add_argument("--model-size", type=int, nargs=2, default=[224, 224], metavar=("H", "W"))
+    parser.add_argument("--channels", type=int, choices=[1, 3], default=1)
+    args = parser.parse_args()
+
+    result = benchmark(args.frames, args.size[0], args.size[1], tuple(args.model_size), args.channels)
+    print(f"Backend: {result['backend']}, {args.frames} frames "
+          f"{args.size[1]}x{args.size[0]} -> {args.model_size[1]}x{args.model_size[0]}x{args.channels}\n")
+    print(f"{'path':<14} {'frames/s':>10} {'peak KB':>10} {'retained KB':>12}")
+    for name in ("naive", "preallocated"):
+        r = result[name]
+        print(f"{name:<14} {r['frames_per_s']:>10.0f} {r['peak_kb_over_steady']:>10.1f} {r['retained_kb']:>12.1f}")
@@ -0,0 +1,147 @@
+import csv
+import os
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+# ---------------------------------------------------------
+# Frame Index and Thumbnail Store
+# ---------------------------------------------------------
+# During a run, ThumbnailWriter appends a small RGB copy of every camera
+# frame to images/thumbs.u8 (fixed-size records) and a row per frame to
+# images/frames.csv (frame id, sim time, speed, file). FrameStore opens a
+# run for replay: thumbnails are read through np.memmap, so any frame is
+# one slice away, and the time index maps a scrub position to a frame with
+# a binary search. Runs recorded before this existed have neither file;
+# their thumbnails are decoded from the PNGs on demand into an LRU cache.
+
+THUMB_WIDTH = 200
+THUMB_FILE = "thumbs.u8"
+INDEX_FILE = "frames.csv"
+INDEX_HEADER = ["frame", "sim_time", "speed_kmh", "file", "thumb_height", "thumb_width"]
+DEFAULT_FRAME_DT = 0.05          # s; only used when an old run has no index
+LRU_SIZE = 512
+
+_FRAME_NAME = re.compile(r"frame_(\d+)_speed_(-?[\d.]+)\.png$")
+
+
+def thumbnail_from_image(image, width=THUMB_WIDTH):
+    """carla.Image (BGRA) -> small RGB uint8 array, by striding."""
+    bgra = np.frombuffer(image.raw_data, dtype=np.uint8).reshape(image.height, image.width, 4)
+    step = max(1, image.width // width)
+    return np.ascontiguousarray(bgra[::step, ::step, 2::-1])
+
+
+class ThumbnailWriter:
+    """Appends one thumbnail record and one index row per camera frame."""
+
+    def __init__(self, images_folder):
+        self._thumbs = open(os.path.join(images_folder, THUMB_FILE), "wb")
+        self._index_file = open(os.path.join(images_folder, INDEX_FILE), "w", newline="")
+        self._index = csv.writer(self._index_file)
+        self._index.writerow(INDEX_HEADER)
+        self._t0 = None
+
+    def add(self, image, speed, filename):
+        if self._thumbs.closed:
+            return   # a callback that arrived after the camera was stopped
+        if self._t0 is None:
+            self._t0 = image.timestamp
+        thumb = thumbnail_from_image(image)
+        self._thumbs.write(thumb.tobytes())
+        self._index.writerow([image.frame, f"{image.timestamp - self._t0:.4f}", f"{speed:.1f}",
+                              os.path.basename(filename), thumb.shape[0], thumb.shape[1]])
+
+    def close(self):
+        self._thumbs.close()
+        self._index_file.close()
+
+
+# ---------------------------------------------------------
+# Replay Access
+# ---------------------------------------------------------
+class FrameStore:
+    def __init__(self, run_dir, cache_size=LRU_SIZE):
+        self.images_dir = os.path.join(run_dir, "images")
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._thumbs = None
+
+        index_path = os.path.join(self.images_dir, INDEX_FILE)
+        if os.path.exists(index_path):
+            self._load_index(index_path)
+        else:
+            self._scan_images()
+
+    def _load_index(self, path):
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            next(reader)
+            rows = list(reader)
+
+        self.frame_ids = np.array([int(r[0]) for r in rows], dtype=np.int64)
+        self.times = np.array([float(r[1]) for r in rows])
+        self.speeds = np.array([float(r[2]) for r in rows])
+        self.files = [r[3] for r in rows]
+
+        thumbs_path = os.path.join(self.images_dir, THUMB_FILE)
+        if rows and os.path.exists(thumbs_path):
+            h, w = int(rows[0][4]), int(rows[0][5])
+            # A run still being written may have a partial last record
+            count = min(len(rows), os.path.getsize(thumbs_path) // (h * w * 3))
+            if count:
+                self._thumbs = np.memmap(thumbs_path, dtype=np.uint8, mode="r", shape=(count, h, w, 3))
+
+    def _scan_images(self):
+        entries = []
+        if os.path.isdir(self.images_dir):
+            for name in os.listdir(self.images_dir):
+                m = _FRAME_NAME.match(name)
+                if m:
+                    entries.append((int(m.group(1)), float(m.group(2)), name))
+        entries.sort()
+
+        self.frame_ids = np.array([e[0] for e in entries], dtype=np.int64)
+        self.speeds = np.array([e[1] for e in entries])
+        self.files = [e[2] for e in entries]
+        self.times = self.frame_ids * DEFAULT_FRAME_DT
+
+    def __len__(self):
+        return len(self.files)
+
+    @property
+    def duration(self):
+        return float(self.times[-1]) if len(self.times) else 0.0
+
+    def index_at(self, t):
+        """Frame shown at simulation time t (the last one at or before t)."""
+        i = int(np.searchsorted(self.times, t, side="right")) - 1
+        return min(max(i, 0), len(self) - 1)
+
+    def frame_path(self, i):
+        return os.path.join(self.images_dir, self.files[i])
+
+    def thumbnail(self, i):
+        if self._thumbs is not None and i < len(self._thumbs):
+            return np.asarray(self._thumbs[i])
+
+        thumb = self._cache.get(i)
+        if thumb is not None:
+            self._cache.move_to_end(i)
+            return thumb
+        thumb = _decode_thumbnail(self.frame_path(i))
+        self._cache[i] = thumb
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return thumb
+
+
+def _decode_thumbnail(path, width=THUMB_WIDTH):
+    import pygame
+
+    surface = pygame.image.load(path)
+    w, h = surface.get_size()
+    small = pygame.transform.smoothscale(surface, (width, max(1, h * width // w)))
+    # surfarray is (x, y, c); images are (y, x, c)
+    return np.ascontiguousarray(pygame.surfarray.pixels3d(small).transpose(1, 0, 2))
@@ -0,0 +1,341 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+# ---------------------------------------------------------
+# Hazard Monitor
+# ---------------------------------------------------------
+# HazardMonitor follows every vehicle and walker in the world from the
+# tick's snapshot (the one TickState.refresh() already took, so no extra
+# RPC) and rates them against the ego:
+#
+#   grid        actors bucketed into CELL_SIZE cells (one argsort per
+#               tick); query() returns the actors near any point by
+#               looking up only the surrounding cells
+#   ttc         time until the centres come within COLLISION_RADIUS on
+#               straight-line motion, for all nearby actors at once
+#   lane frame  longitudinal / lateral offset and closing speed in the
+#               ego's heading frame, and whether the actor is in the ego
+#               lane or oncoming
+#
+# After update(), hazards lists the actors within RADIUS by TTC, and
+# events holds the actors whose level rose this tick ("warning" below
+# WARNING_TTC, "critical" below CRITICAL_TTC). run_scenario gives every
+# ego its own monitor and puts it on that ego's vehicle proxy, so
+# controllers read the hazards around the vehicle they drive:
+#
+#     worst = vehicle.hazards.worst()
+#     if worst and worst.level == "critical" and worst.same_lane: ...
+#
+# New actors are classified (vehicle / walker / other) once, with one
+# world.get_actors(ids) call, whenever the snapshot's set of ids changes
+# (a spawn and a destroy in the same tick included); ids that left the
+# world are dropped then. The check is a has_actor() per known id: with
+# as many ids as before and all of them still there, nothing changed, and
+# the snapshot's actors are only walked when something did.
+# Only actors within RADIUS + FAR_MARGIN are re-read every tick; the rest
+# every FAR_REFRESH_TICKS, so the cost follows the traffic around the ego,
+# not the size of the world.
+#
+#     python hazard_monitor.py --actors 200        # per-tick cost benchmark
+
+CELL_SIZE = 20.0                 # m
+RADIUS = 60.0                    # m around the ego that is rated
+COLLISION_RADIUS = 2.5           # m between centres that counts as contact
+LANE_WIDTH = 3.5                 # m; |lateral| under half of it is "same lane"
+WARNING_TTC = 4.0                # s
+CRITICAL_TTC = 2.0               # s
+TRACKED_TYPES = ("vehicle.", "walker.")
+FAR_MARGIN = 40.0                # m past RADIUS that is still re-read every tick
+FAR_REFRESH_TICKS = 10           # everything is re-read this often (0.5 s: 80 m/s closing < FAR_MARGIN)
+GONE = 1e6                       # m; where an actor that left the world is parked until dropped
+
+LEVELS = {None: 0, "warning": 1, "critical": 2}
+
+Hazard = namedtuple("Hazard", [
+    "actor_id", "kind", "distance", "ttc", "closing_speed",
+    "longitudinal", "lateral", "lane_closing_speed", "same_lane", "oncoming", "level",
+])
+
+
+class HazardMonitor:
+    def __init__(self, world, ego_id, radius=RADIUS, cell_size=CELL_SIZE, lane_width=LANE_WIDTH,
+                 warning_ttc=WARNING_TTC, critical_ttc=CRITICAL_TTC):
+        self.world = world
+        self.ego_id = ego_id
+        self.radius = radius
+        self.cell_size = cell_size
+        self.lane_width = lane_width
+        self.warning_ttc = warning_ttc
+        self.critical_ttc = critical_ttc
+
+        self.kinds = {}              # actor id -> "vehicle" / "walker" / None (not tracked)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.positions = np.empty((0, 2))
+        self.velocities = np.empty((0, 2))
+        self.hazards = []
+        self.events = []
+        self._levels = {}            # actor id -> level at the last update
+        self._tracked = []
+        self._known = frozenset()    # snapshot ids the classification is for
+        self._ego = None             # (x, y, vx, vy, yaw)
+        self._near = None            # indices re-read every tick; None: read everything
+        self._ticks = 0
+        self._cell_keys = np.empty(0, dtype=np.int64)
+        self._order = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # -----------------------------------------------------
+    # Snapshot -> arrays
+    # -----------------------------------------------------
+    def _changed(self, snapshot):
+        if len(snapshot) != len(self._known):
+            return True
+        has_actor = snapshot.has_actor
+        return not all(has_actor(i) for i in self._known)
+
+    def _classify(self, snapshot):
+        ids = [s.id for s in snapshot]
+        known = frozenset(ids)
+        self._forget([i for i in self.kinds if i not in known])
+        unknown = [i for i in ids if i not in self.kinds]
+        if unknown:
+            for actor in self.world.get_actors(unknown):
+                type_id = actor.type_id
+                self.kinds[actor.id] = next((p[:-1] for p in TRACKED_TYPES if type_id.startswith(p)), None)
+            for actor_id in unknown:
+                self.kinds.setdefault(actor_id, None)     # gone again before we asked
+        self._tracked = [i for i, kind in self.kinds.items() if kind is not None and i != self.ego_id]
+        self._known = known
+
+    def _forget(self, gone):
+        for actor_id in gone:
+            self.kinds.pop(actor_id, None)
+            self._levels.pop(actor_id, None)
+        if gone:
+            gone = set(gone)
+            self._tracked = [i for i in self._tracked if i not in gone]
+
+    def update(self, snapshot):
+        """Re-read the actors near the ego (all of them every FAR_REFRESH_TICKS); fills hazards and events."""
+        if self._changed(snapshot):
+            self._classify(snapshot)
+            self._near = None
+
+        ego = snapshot.find(self.ego_id)
+        if ego is None:
+            self.hazards, self.events = [], []
+            return self.hazards
+        tr, v = ego.get_transform(), ego.get_velocity()
+        self._ego = (tr.location.x, tr.location.y, v.x, v.y, math.radians(tr.rotation.yaw))
+
+        if self._near is None or self._ticks % FAR_REFRESH_TICKS == 0:
+            self._read_all(snapshot)
+        else:
+            self._read_near(snapshot)
+        self._ticks += 1
+        self._build_grid()
+        hazards = self._rate()
+        self._near = self.query(self._ego[0], self._ego[1], self.radius + FAR_MARGIN)
+        return hazards
+
+    def _read_all(self, snapshot):
+        rows, ids, gone = [], [], []
+        find = snapshot.find
+        for actor_id in self._tracked:
+            s = find(actor_id)
+            if s is None:
+                gone.append(actor_id)
+                continue
+            loc, vel = s.get_transform().location, s.get_velocity()
+            rows.append((loc.x, loc.y, vel.x, vel.y))
+            ids.append(actor_id)
+        self._forget(gone)
+        data = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        self.ids = np.array(ids, dtype=np.int64)
+        self.positions = data[:, :2]
+        self.velocities = data[:, 2:]
+
+    def _read_near(self, snapshot):
+        # Far actors keep last refresh's state: they cannot get within RADIUS before the next one
+        rows = []
+        find = snapshot.find
+        for actor_id in self.ids[self._near].tolist():
+            s = find(actor_id)
+            if s is None:
+                rows.append((GONE, GONE, 0.0, 0.0))
+                self._known = frozenset()         # reclassify (and drop it) at the next update
+                continue
+            loc, vel = s.get_transform().location, s.get_velocity()
+            rows.append((loc.x, loc.y, vel.x, vel.y))
+        if rows:
+            data = np.array(rows, dtype=np.float64)
+            self.positions[self._near] = data[:, :2]
+            self.velocities[self._near] = data[:, 2:]
+
+    # -----------------------------------------------------
+    # Spatial grid
+    # -----------------------------------------------------
+    def _cells(self, xy):
+        return np.floor(xy / self.cell_size).astype(np.int64)
+
+    @staticmethod
+    def _key(cx, cy):
+        # cells stay far below 2**20 in any CARLA town
+        return (cx << 21) + cy
+
+    def _build_grid(self):
+        cells = self._cells(self.positions)
+        keys = self._key(cells[:, 0], cells[:, 1])
+        self._order = np.argsort(keys, kind="stable")
+        self._cell_keys = keys[self._order]
+
+    def query(self, x, y, radius):
+        """Indices (into ids / positions) of the actors within radius of (x, y)."""
+        if not len(self._cell_keys):
+            return np.empty(0, dtype=np.int64)
+        reach = int(math.ceil(radius / self.cell_size))
+        cx, cy = (int(c) for c in self._cells(np.array([x, y])))
+        rows = np.arange(cx - reach, cx + reach + 1, dtype=np.int64)
+        lo = np.searchsorted(self._cell_keys, self._key(rows, cy - reach), "left")
+        hi = np.searchsorted(self._cell_keys, self._key(rows, cy + reach), "right")
+        idx = np.concatenate([self._order[a:b] for a, b in zip(lo, hi) if b > a] or [np.empty(0, np.int64)])
+        d = self.positions[idx] - (x, y)
+        return idx[np.einsum("ij,ij->i", d, d) <= radius * radius]
+
+    # -----------------------------------------------------
+    # Rating
+    # -----------------------------------------------------
+    def _rate(self):
+        ex, ey, evx, evy, yaw = self._ego
+        idx = self.query(ex, ey, self.radius)
+        p = self.positions[idx] - (ex, ey)
+        v = self.velocities[idx] - (evx, evy)
+
+        dist = np.sqrt(np.einsum("ij,ij->i", p, p))
+        pv = np.einsum("ij,ij->i", p, v)
+        vv = np.einsum("ij,ij->i", v, v)
+        closing = -pv / np.maximum(dist, 1e-6)
+
+        # |p + v t| = R  ->  vv t^2 + 2 pv t + (|p|^2 - R^2) = 0, earliest t >= 0
+        c = dist * dist - COLLISION_RADIUS * COLLISION_RADIUS
+        disc = pv * pv - vv * c
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ttc = (-pv - np.sqrt(np.maximum(disc, 0.0))) / vv
+        ttc = np.where((disc >= 0) & (pv < 0) & (vv > 1e-9), np.maximum(ttc, 0.0), np.inf)
+        ttc[c <= 0] = 0.0
+
+        fwd = np.array([math.cos(yaw), math.sin(yaw)])
+        right = np.array([-fwd[1], fwd[0]])      # CARLA is left-handed: +y is to the right
+        lon, lat = p @ fwd, p @ right
+        lane_closing = -(v @ fwd) * np.sign(lon)
+        same_lane = np.abs(lat) < self.lane_width / 2
+        oncoming = (self.velocities[idx] @ fwd) < -1.0
+
+        order = np.argsort(ttc, kind="stable")
+        hazards, events, levels = [], [], {}
+        for k in order:
+            t = float(ttc[k])
+            level = "critical" if t < self.critical_ttc else "warning" if t < self.warning_ttc else None
+            actor_id = int(self.ids[idx[k]])
+            h = Hazard(actor_id, self.kinds.get(actor_id), float(dist[k]), t, float(closing[k]),
+                       float(lon[k]), float(lat[k]), float(lane_closing[k]),
+                       bool(same_lane[k]), bool(oncoming[k]), level)
+            hazards.append(h)
+            if level is not None:
+                levels[actor_id] = level
+                if LEVELS[level] > LEVELS[self._levels.get(actor_id)]:
+                    events.append(h)
+        self._levels = levels
+        self.hazards, self.events = hazards, events
+        return hazards
+
+    def worst(self):
+        """The hazard with the lowest TTC, or None."""
+        return self.hazards[0] if self.hazards else None
+
+    def hazard_for(self, actor_id):
+        return next((h for h in self.hazards if h.actor_id == actor_id), None)
+
+
+# ---------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------
+class _BenchActor:
+    def __init__(self, actor_id, type_id, x, y, vx, vy, yaw=0.0):
+        self.id = actor_id
+        self.type_id = type_id
+        self._t = _Obj(location=_Obj(x=x, y=y, z=0.0), rotation=_Obj(yaw=yaw))
+        self._v = _Obj(x=vx, y=vy, z=0.0)
+
+    def get_transform(self):
+        return self._t
+
+    def get_velocity(self):
+        return self._v
+
+
+class _Obj:
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+class _BenchSnapshot(dict):
+    def __iter__(self):
+        return iter(self.values())
+
+    def find(self, actor_id):
+        return self.get(actor_id)
+
+    def has_actor(self, actor_id):
+        return actor_id in self
+
+
+class _BenchWorld:
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def get_actors(self, ids):
+        return [self._snapshot[i] for i in ids]
+
+
+def benchmark(actors=200, ticks=500, extent=400.0, seed=0):
+    """Mean / p99 update() time in ms for `actors` vehicles scattered over extent x extent m."""
+    import time
+
+    rng = np.random.default_rng(seed)
+    snapshot = _BenchSnapshot()
+    snapshot[1] = _BenchActor(1, "vehicle.tesla.model3", 0.0, 0.0, 15.0, 0.0)
+    for i in range(actors):
+        x, y = rng.uniform(-extent / 2, extent / 2, 2)
+        vx, vy = rng.uniform(-15, 15, 2)
+        snapshot[i + 2] = _BenchActor(i + 2, "vehicle.audi.tt", x, y, vx, vy)
+    for i in range(50):                          # lights, signs, sensors: classified, then skipped
+        snapshot[10000 + i] = _BenchActor(10000 + i, "traffic.traffic_light", 0.0, 0.0, 0.0, 0.0)
+
+    monitor = HazardMonitor(_BenchWorld(snapshot), ego_id=1)
+    monitor.update(snapshot)
+    times = np.empty(ticks)
+    for k in range(ticks):
+        start = time.perf_counter()
+        monitor.update(snapshot)
+        times[k] = time.perf_counter() - start
+    return {"actors": actors, "nearby": len(monitor.hazards),
+            "mean_ms": float(times.mean() * 1e3), "p99_ms": float(np.percentile(times, 99) * 1e3)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Per-tick cost of the hazard monitor.")
+    parser.add_argument("--actors", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--ticks", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'actors':>7} {'nearby':>7} {'mean ms':>8} {'p99 ms':>8}")
+    for n in args.actors:
+        r = benchmark(n, args.ticks)
+        print(f"{r['actors']:>7} {r['nearby']:>7} {r['mean_ms']:>8.3f} {r['p99_ms']:>8.3f}")
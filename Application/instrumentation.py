@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loop_profiler import Tracer
+
+# ---------------------------------------------------------
+# Runtime Metrics and Tracing
+# ---------------------------------------------------------
+# Pass an Instrumentation as run_scenario's tracer to watch a run while it
+# happens:
+#
+#     instr = Instrumentation()
+#     instr.serve(9400)                       # http://127.0.0.1:9400/metrics
+#     run_scenario(client, town, 2, "critical drowsiness", tracer=instr)
+#     instr.export_trace("trace.json")        # chrome://tracing / Perfetto
+#
+# Every span is timed once and handed to each registered hook as
+# hook(name, start_ns, end_ns); loop_profiler.PhaseTimer.record is one.
+
+METRICS_PORT = int(os.environ.get("CARLA_METRICS_PORT", 9400))
+TRACE_CAPACITY = 500_000     # events kept for export; the oldest are dropped first
+RATE_WINDOW = 100            # ticks / frames used for the rolling rates
+
+
+class _Span:
+    __slots__ = ("_owner", "_name", "_start")
+
+    def __init__(self, owner, name):
+        self._owner = owner
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self._owner.record(self._name, self._start, time.perf_counter_ns())
+        return False
+
+
+class TraceRecorder:
+    """Keeps events in Chrome Trace Event format (complete, instant and counter events)."""
+
+    def __init__(self, capacity=TRACE_CAPACITY):
+        self.events = deque(maxlen=capacity)
+        self.origin_ns = time.perf_counter_ns()
+        self.pid = os.getpid()
+
+    def _us(self, ns):
+        return (ns - self.origin_ns) / 1000.0
+
+    def span(self, name, start_ns, end_ns):
+        self.events.append({
+            "name": name, "ph": "X", "pid": self.pid, "tid": threading.get_ident(),
+            "ts": self._us(start_ns), "dur": (end_ns - start_ns) / 1000.0,
+        })
+
+    def instant(self, name, args):
+        self.events.append({
+            "name": name, "ph": "i", "s": "g", "pid": self.pid, "tid": threading.get_ident(),
+            "ts": self._us(time.perf_counter_ns()), "args": args,
+        })
+
+    def counter(self, name, values):
+        self.events.append({
+            "name": name, "ph": "C", "pid": self.pid,
+            "ts": self._us(time.perf_counter_ns()), "args": values,
+        })
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": list(self.events), "displayTimeUnit": "ms"}, f)
+        return path
+
+
+class Instrumentation(Tracer):
+    """Tracer that keeps live counters/gauges, feeds hooks and records a trace."""
+
+    def __init__(self, hooks=None, trace=True):
+        self.hooks = list(hooks or [])
+        self.trace = TraceRecorder() if trace else None
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.span_totals = defaultdict(lambda: [0, 0])    # name -> [count, total ns]
+        self.last_event = {}
+        self._lock = threading.Lock()
+        self._tick_times = deque(maxlen=RATE_WINDOW)
+        self._sensor_times = deque(maxlen=RATE_WINDOW)    # (wall s, sim s)
+        self._last_sensor_frame = None
+        self._sensor_step = None
+        self._warning_time = None
+        self._server = None
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    # -----------------------------------------------------
+    # Tracer interface
+    # -----------------------------------------------------
+    def span(self, name):
+        return _Span(self, name)
+
+    def record(self, name, start, end):
+        for hook in self.hooks:
+            hook(name, start, end)
+        with self._lock:
+            totals = self.span_totals[name]
+            totals[0] += 1
+            totals[1] += end - start
+            self.gauges[f"span_last_us.{name}"] = (end - start) / 1000.0
+        if self.trace is not None:
+            self.trace.span(name, start, end)
+
+    def event(self, name, **args):
+        """
+        Scenario events. `t` (scenario seconds) on a "warning" followed by
+        a "takeover" gives the warning-to-takeover latency.
+        """
+        with self._lock:
+            self.counters[f"events.{name}"] += 1
+            self.last_event = {"name": name, **args}
+            t = args.get("t")
+            if name == "run_start":
+                self._warning_time = None
+                self.gauges.pop("warning_to_takeover_s", None)
+            elif name == "warning" and t is not None:
+                self._warning_time = t
+            elif name == "takeover" and t is not None and self._warning_time is not None:
+                self.gauges["warning_to_takeover_s"] = t - self._warning_time
+        if self.trace is not None:
+            self.trace.instant(name, args)
+
+    def sensor_frame(self, frame, sim_time, image=None):
+        now = time.perf_counter()
+        with self._lock:
+            self.counters["sensor_frames"] += 1
+            last = self._last_sensor_frame
+            if last is not None and frame > last:
+                gap = frame - last
+                # sensor_tick may skip frames on purpose: the smallest gap seen is the expected step
+                if self._sensor_step is None or gap < self._sensor_step:
+                    self._sensor_step = gap
+                self.counters["dropped_frames"] += gap // self._sensor_step - 1
+            self._last_sensor_frame = frame
+
+            self._sensor_times.append((now, sim_time))
+            if len(self._sensor_times) > 1:
+                (w0, s0), (w1, s1) = self._sensor_times[0], self._sensor_times[-1]
+                if w1 > w0:
+                    self.gauges["sim_wall_ratio"] = (s1 - s0) / (w1 - w0)
+
+    def tick_done(self, frame):
+        now = time.perf_counter()
+        with self._lock:
+            self.counters["ticks"] += 1
+            self._tick_times.append(now)
+            if len(self._tick_times) > 1:
+                window = self._tick_times[-1] - self._tick_times[0]
+                if window > 0:
+                    self.gauges["ticks_per_second"] = (len(self._tick_times) - 1) / window
+            if self._last_sensor_frame is not None and frame is not None:
+                # Frames the server produced that the camera callback has not handled yet
+                self.gauges["frame_queue_depth"] = max(0, frame - self._last_sensor_frame)
+            gauges = {k: self.gauges[k] for k in ("ticks_per_second", "sim_wall_ratio", "frame_queue_depth")
+                      if k in self.gauges}
+        if self.trace is not None and gauges:
+            self.trace.counter("loop", gauges)
+
+    # -----------------------------------------------------
+    # Reporting
+    # -----------------------------------------------------
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "spans": {name: {"count": c, "total_s": ns / 1e9} for name, (c, ns) in self.span_totals.items()},
+                "last_event": dict(self.last_event),
+            }
+
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = []
+
+        for key, value in sorted(snap["counters"].items()):
+            if key.startswith("events."):
+                lines.append(f'carla_sim_events_total{{event="{key[7:]}"}} {value:g}')
+            else:
+                lines.append(f"carla_sim_{key}_total {value:g}")
+
+        for key, value in sorted(snap["gauges"].items()):
+            if key.startswith("span_last_us."):
+                lines.append(f'carla_sim_span_last_us{{phase="{key[13:]}"}} {value:g}')
+            else:
+                lines.append(f"carla_sim_{key} {value:g}")
+
+        for name, stats in sorted(snap["spans"].items()):
+            lines.append(f'carla_sim_span_count{{phase="{name}"}} {stats["count"]}')
+            lines.append(f'carla_sim_span_seconds_total{{phase="{name}"}} {stats["total_s"]:g}')
+
+        return "\n".join(lines) + "\n"
+
+    def export_trace(self, path):
+        if self.trace is None:
+            return None
+        return self.trace.export(path)
+
+    # -----------------------------------------------------
+    # Metrics Endpoint
+    # -----------------------------------------------------
+    def serve(self, port=METRICS_PORT, host="127.0.0.1"):
+        """Serves /metrics (Prometheus text) and /metrics.json from a daemon thread."""
+        instr = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, kind = instr.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, kind = json.dumps(instr.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Metrics on http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,1297 @@
+import enum
+import fnmatch
+import itertools
+import math
+import os
+import random
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+# ---------------------------------------------------------
+# Kinematic stand-in for the CARLA Python API
+# ---------------------------------------------------------
+# Implements the subset of `carla` that carla_simulation.py uses, on top of
+# a bicycle model, so the scenario controllers and run_scenario can run on
+# a machine without Unreal or a GPU:
+#
+#     import kinematic_carla
+#     kinematic_carla.install()          # before importing carla_simulation
+#     from carla_simulation import run_scenario
+#     client = kinematic_carla.Client()
+#     run_scenario(client, "Town04", 2, "critical drowsiness", clock=client.clock)
+#
+# Roads are straight multi-lane segments along +x, one per town, laid out
+# with CARLA's conventions (x forward, y right, negative lane ids drive
+# along the road direction).
+
+DEFAULT_DELTA_SECONDS = 0.05
+
+WHEELBASE = 2.875                  # m (Tesla Model 3)
+MAX_STEER = math.radians(70.0)     # front wheel angle at steer = 1.0
+MAX_ACCEL = 4.5                    # m/s^2 at full throttle, low speed
+MAX_POWER_PER_KG = 110.0           # W/kg, caps acceleration at speed
+MAX_BRAKE = 9.0                    # m/s^2 at brake = 1.0
+DRAG = 0.0004                      # 1/m, aerodynamic term (a = DRAG * v^2)
+ROLLING = 0.1                      # m/s^2
+
+TOWNS = {
+    "Town01": {"forward_lanes": 1, "backward_lanes": 1, "lane_width": 4.0,
+               "shoulder": False, "length": 1500.0, "spawn_lane": -1, "lights_every": 250.0},
+    "Town04": {"forward_lanes": 4, "backward_lanes": 4, "lane_width": 3.5,
+               "shoulder": True, "length": 3000.0, "spawn_lane": -2, "lights_every": 1000.0},
+    "Town05": {"forward_lanes": 2, "backward_lanes": 2, "lane_width": 3.5,
+               "shoulder": False, "length": 2000.0, "spawn_lane": -1, "lights_every": 200.0},
+}
+SHOULDER_WIDTH = 3.0
+SPAWN_POINT_COUNT = 40
+SPAWN_START = 150.0
+SPAWN_SPACING = 20.0
+SIDEWALK_OFFSET = 1.5              # m beyond the outermost lane edge
+
+
+def install():
+    """Register this module as `carla` so existing imports pick it up."""
+    sys.modules["carla"] = sys.modules[__name__]
+    return sys.modules[__name__]
+
+
+# ---------------------------------------------------------
+# Geometry
+# ---------------------------------------------------------
+class Vector3D:
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def __add__(self, other):
+        return type(self)(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return type(self)(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __mul__(self, k):
+        return type(self)(self.x * k, self.y * k, self.z * k)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, k):
+        return type(self)(self.x / k, self.y / k, self.z / k)
+
+    def __eq__(self, other):
+        return isinstance(other, Vector3D) and (self.x, self.y, self.z) == (other.x, other.y, other.z)
+
+    def length(self):
+        return math.sqrt(self.x**2 + self.y**2 + self.z**2)
+
+    def distance(self, other):
+        return math.sqrt((self.x - other.x)**2 + (self.y - other.y)**2 + (self.z - other.z)**2)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(x={self.x:.6f}, y={self.y:.6f}, z={self.z:.6f})"
+
+
+class Location(Vector3D):
+    pass
+
+
+class Rotation:
+    def __init__(self, pitch=0.0, yaw=0.0, roll=0.0):
+        self.pitch = float(pitch)
+        self.yaw = float(yaw)
+        self.roll = float(roll)
+
+    def get_forward_vector(self):
+        yaw = math.radians(self.yaw)
+        pitch = math.radians(self.pitch)
+        return Vector3D(math.cos(pitch) * math.cos(yaw), math.cos(pitch) * math.sin(yaw), math.sin(pitch))
+
+    def get_right_vector(self):
+        yaw = math.radians(self.yaw)
+        return Vector3D(-math.sin(yaw), math.cos(yaw), 0.0)
+
+    def get_up_vector(self):
+        return Vector3D(0.0, 0.0, 1.0)
+
+    def __repr__(self):
+        return f"Rotation(pitch={self.pitch:.6f}, yaw={self.yaw:.6f}, roll={self.roll:.6f})"
+
+
+class Transform:
+    def __init__(self, location=None, rotation=None):
+        # CARLA copies its arguments by value
+        location = location if location is not None else Location()
+        rotation = rotation if rotation is not None else Rotation()
+        self.location = Location(location.x, location.y, location.z)
+        self.rotation = Rotation(rotation.pitch, rotation.yaw, rotation.roll)
+
+    def get_forward_vector(self):
+        return self.rotation.get_forward_vector()
+
+    def get_right_vector(self):
+        return self.rotation.get_right_vector()
+
+    def get_up_vector(self):
+        return self.rotation.get_up_vector()
+
+    def transform(self, point):
+        f = self.get_forward_vector()
+        r = self.get_right_vector()
+        return Location(
+            self.location.x + f.x * point.x + r.x * point.y,
+            self.location.y + f.y * point.x + r.y * point.y,
+            self.location.z + point.z,
+        )
+
+    def __repr__(self):
+        return f"Transform({self.location}, {self.rotation})"
+
+
+def _copy_transform(t):
+    return Transform(t.location, t.rotation)
+
+
+# ---------------------------------------------------------
+# Enums and Plain Data
+# ---------------------------------------------------------
+class VehicleLightState(enum.IntFlag):
+    NONE = 0
+    Position = 1
+    LowBeam = 2
+    HighBeam = 4
+    Brake = 8
+    RightBlinker = 16
+    LeftBlinker = 32
+    Reverse = 64
+    Fog = 128
+    Interior = 256
+    Special1 = 512
+    Special2 = 1024
+    All = 0xFFFFFFFF
+
+
+class TrafficLightState(enum.IntEnum):
+    Red = 0
+    Yellow = 1
+    Green = 2
+    Off = 3
+    Unknown = 4
+
+
+class LaneType(enum.IntFlag):
+    NONE = 1
+    Driving = 2
+    Stop = 4
+    Shoulder = 8
+    Biking = 16
+    Sidewalk = 32
+    Border = 64
+    Any = 0xFFFFFFFE
+
+
+class VehicleControl:
+    def __init__(self, throttle=0.0, steer=0.0, brake=0.0, hand_brake=False,
+                 reverse=False, manual_gear_shift=False, gear=0):
+        self.throttle = float(throttle)
+        self.steer = float(steer)
+        self.brake = float(brake)
+        self.hand_brake = bool(hand_brake)
+        self.reverse = bool(reverse)
+        self.manual_gear_shift = bool(manual_gear_shift)
+        self.gear = int(gear)
+
+    def __repr__(self):
+        return f"VehicleControl(throttle={self.throttle:.6f}, steer={self.steer:.6f}, brake={self.brake:.6f})"
+
+
+class WorldSettings:
+    def __init__(self, synchronous_mode=False, no_rendering_mode=False, fixed_delta_seconds=None):
+        self.synchronous_mode = synchronous_mode
+        self.no_rendering_mode = no_rendering_mode
+        self.fixed_delta_seconds = fixed_delta_seconds
+
+
+class Timestamp:
+    def __init__(self, frame, elapsed_seconds, delta_seconds):
+        self.frame = frame
+        self.elapsed_seconds = elapsed_seconds
+        self.delta_seconds = delta_seconds
+        self.platform_timestamp = elapsed_seconds
+
+
+# ---------------------------------------------------------
+# Blueprints
+# ---------------------------------------------------------
+class ActorAttribute:
+    def __init__(self, id, value):
+        self.id = id
+        self.value = str(value)
+
+    def as_int(self):
+        return int(self.value)
+
+    def as_float(self):
+        return float(self.value)
+
+    def as_str(self):
+        return self.value
+
+    def as_bool(self):
+        return self.value.lower() == "true"
+
+
+class ActorBlueprint:
+    def __init__(self, id, attributes=None):
+        self.id = id
+        self.tags = id.split(".")
+        self._attributes = {k: ActorAttribute(k, v) for k, v in (attributes or {}).items()}
+
+    def has_attribute(self, id):
+        return id in self._attributes
+
+    def has_tag(self, tag):
+        return tag in self.tags
+
+    def get_attribute(self, id):
+        return self._attributes[id]
+
+    def set_attribute(self, id, value):
+        if id not in self._attributes:
+            raise IndexError(f"Blueprint {self.id} has no attribute '{id}'")
+        self._attributes[id] = ActorAttribute(id, value)
+
+    def _copy(self):
+        return ActorBlueprint(self.id, {k: a.value for k, a in self._attributes.items()})
+
+    def __iter__(self):
+        return iter(self._attributes.values())
+
+    def __repr__(self):
+        return f"ActorBlueprint(id={self.id})"
+
+
+def _matches(type_id, pattern):
+    return fnmatch.fnmatch(type_id, pattern) or any(fnmatch.fnmatch(tag, pattern) for tag in type_id.split("."))
+
+
+_CAMERA_ATTRIBUTES = {"image_size_x": 800, "image_size_y": 600, "fov": 90.0, "sensor_tick": 0.0}
+_BLUEPRINTS = [
+    ("vehicle.tesla.model3", {"role_name": "autopilot", "number_of_wheels": 4}),
+    ("vehicle.audi.a2", {"role_name": "autopilot", "number_of_wheels": 4}),
+    ("vehicle.lincoln.mkz_2020", {"role_name": "autopilot", "number_of_wheels": 4}),
+    ("vehicle.nissan.micra", {"role_name": "autopilot", "number_of_wheels": 4}),
+    ("vehicle.toyota.prius", {"role_name": "autopilot", "number_of_wheels": 4}),
+    ("sensor.camera.rgb", _CAMERA_ATTRIBUTES),
+    ("sensor.camera.semantic_segmentation", _CAMERA_ATTRIBUTES),
+    ("sensor.other.collision", {}),
+] + [(f"walker.pedestrian.{k:04d}", {"is_invincible": "false", "speed": "1.4"}) for k in range(1, 11)] + [
+    ("controller.ai.walker", {}),
+]
+
+
+class BlueprintLibrary:
+    def __init__(self, blueprints=None):
+        self._blueprints = blueprints if blueprints is not None else [ActorBlueprint(i, a) for i, a in _BLUEPRINTS]
+
+    def filter(self, pattern):
+        return BlueprintLibrary([bp._copy() for bp in self._blueprints if _matches(bp.id, pattern)])
+
+    def find(self, id):
+        for bp in self._blueprints:
+            if bp.id == id:
+                return bp._copy()
+        raise IndexError(f"Blueprint '{id}' not found")
+
+    def __getitem__(self, k):
+        return self._blueprints[k]
+
+    def __len__(self):
+        return len(self._blueprints)
+
+    def __iter__(self):
+        return iter(self._blueprints)
+
+
+# ---------------------------------------------------------
+# Road Network
+# ---------------------------------------------------------
+class Waypoint:
+    def __init__(self, map, lane_id, s):
+        self._map = map
+        self.lane_id = lane_id
+        self.s = s
+        lane = map._lanes[lane_id]
+        self.road_id = 0
+        self.section_id = 0
+        self.lane_width = lane["width"]
+        self.lane_type = lane["type"]
+        self.id = hash((map.name, lane_id, round(s, 2)))
+        self.junction_id = map._junction_at(s if lane_id < 0 else map.length - s)
+        self.is_junction = self.junction_id != -1
+        self.transform = map._lane_transform(lane_id, s)
+
+    def next(self, distance):
+        s = self.s + distance
+        return [Waypoint(self._map, self.lane_id, s)] if s <= self._map.length else []
+
+    def previous(self, distance):
+        s = self.s - distance
+        return [Waypoint(self._map, self.lane_id, s)] if s >= 0.0 else []
+
+    def next_until_lane_end(self, distance):
+        out = []
+        wp = self.next(distance)
+        while wp:
+            out.append(wp[0])
+            wp = wp[0].next(distance)
+        return out
+
+    def _neighbour(self, lane_id):
+        if lane_id not in self._map._lanes:
+            return None
+        # Lanes in the opposite direction measure s from the other end
+        s = self.s if (lane_id < 0) == (self.lane_id < 0) else self._map.length - self.s
+        return Waypoint(self._map, lane_id, s)
+
+    def get_right_lane(self):
+        return self._neighbour(self.lane_id - 1 if self.lane_id < 0 else self.lane_id + 1)
+
+    def get_left_lane(self):
+        if self.lane_id == -1:
+            return self._neighbour(1)
+        if self.lane_id == 1:
+            return self._neighbour(-1)
+        return self._neighbour(self.lane_id + 1 if self.lane_id < 0 else self.lane_id - 1)
+
+    def __repr__(self):
+        return f"Waypoint(lane_id={self.lane_id}, s={self.s:.2f})"
+
+
+class Map:
+    def __init__(self, town_name):
+        if town_name not in TOWNS:
+            raise RuntimeError(f"map '{town_name}' not found")
+        cfg = TOWNS[town_name]
+        self.name = f"Carla/Maps/{town_name}"
+        self.town = town_name
+        self.length = cfg["length"]
+        self._cfg = cfg
+
+        # lane_id → {"center": lateral y, "width", "type"}
+        self._lanes = {}
+        for side, count in ((-1, cfg["forward_lanes"]), (1, cfg["backward_lanes"])):
+            offset = 0.0
+            for k in range(1, count + 1):
+                w = cfg["lane_width"]
+                self._lanes[side * k] = {"center": -side * (offset + w / 2), "width": w, "type": LaneType.Driving}
+                offset += w
+            if cfg["shoulder"]:
+                k = count + 1
+                self._lanes[side * k] = {"center": -side * (offset + SHOULDER_WIDTH / 2),
+                                         "width": SHOULDER_WIDTH, "type": LaneType.Shoulder}
+
+        every = cfg["lights_every"]
+        self._junctions = list(np.arange(every, self.length - 50.0, every)) if every else []
+
+        # Lane centres and directions as arrays for vectorized lane keeping
+        ids = sorted(i for i, l in self._lanes.items() if l["type"] == LaneType.Driving)
+        self._driving_ids = np.array(ids)
+        self._driving_centers = np.array([self._lanes[i]["center"] for i in ids])
+        self._driving_dirs = np.array([1.0 if i < 0 else -1.0 for i in ids])
+
+    def _junction_at(self, x):
+        for k, jx in enumerate(self._junctions):
+            if abs(x - jx) <= 10.0:
+                return k
+        return -1
+
+    def _lane_transform(self, lane_id, s):
+        y = self._lanes[lane_id]["center"]
+        if lane_id < 0:
+            return Transform(Location(s, y, 0.0), Rotation(yaw=0.0))
+        return Transform(Location(self.length - s, y, 0.0), Rotation(yaw=180.0))
+
+    def get_waypoint(self, location, project_to_road=True, lane_type=LaneType.Driving):
+        best, best_d = None, None
+        for lane_id, lane in self._lanes.items():
+            if not (lane["type"] & lane_type):
+                continue
+            d = abs(location.y - lane["center"])
+            if best_d is None or d < best_d:
+                best, best_d = lane_id, d
+        if best is None:
+            return None
+        if not project_to_road and best_d > self._lanes[best]["width"] / 2:
+            return None
+        x = min(max(location.x, 0.0), self.length)
+        s = x if best < 0 else self.length - x
+        return Waypoint(self, best, s)
+
+    def get_spawn_points(self):
+        lane_id = self._cfg["spawn_lane"]
+        return [
+            _copy_transform(self._lane_transform(lane_id, SPAWN_START + SPAWN_SPACING * k))
+            for k in range(SPAWN_POINT_COUNT)
+        ]
+
+    def generate_waypoints(self, distance):
+        out = []
+        for lane_id in self._lanes:
+            s = 0.0
+            while s <= self.length:
+                out.append(Waypoint(self, lane_id, s))
+                s += distance
+        return out
+
+
+# ---------------------------------------------------------
+# Actors
+# ---------------------------------------------------------
+class ActorList(list):
+    def filter(self, pattern):
+        return ActorList(a for a in self if _matches(a.type_id, pattern))
+
+    def find(self, actor_id):
+        for a in self:
+            if a.id == actor_id:
+                return a
+        return None
+
+
+class Actor:
+    def __init__(self, world, blueprint, transform, parent=None):
+        self._world = world
+        self.id = world._next_id()
+        self.type_id = blueprint.id
+        self.attributes = {a.id: a.value for a in blueprint}
+        self.parent = parent
+        self.is_alive = True
+        self._transform = _copy_transform(transform)
+        self._velocity = Vector3D()
+
+    def get_world(self):
+        return self._world
+
+    def get_transform(self):
+        if self.parent is not None:
+            p = self.parent.get_transform()
+            loc = p.transform(self._transform.location)
+            rot = Rotation(self._transform.rotation.pitch,
+                           p.rotation.yaw + self._transform.rotation.yaw,
+                           self._transform.rotation.roll)
+            return Transform(loc, rot)
+        return _copy_transform(self._transform)
+
+    def get_location(self):
+        return self.get_transform().location
+
+    def get_velocity(self):
+        if self.parent is not None:
+            return self.parent.get_velocity()
+        return Vector3D(self._velocity.x, self._velocity.y, self._velocity.z)
+
+    def get_angular_velocity(self):
+        return Vector3D()
+
+    def get_acceleration(self):
+        return Vector3D()
+
+    def set_transform(self, transform):
+        self._transform = _copy_transform(transform)
+
+    def set_location(self, location):
+        self._transform.location = Location(location.x, location.y, location.z)
+
+    def set_target_velocity(self, velocity):
+        self._velocity = Vector3D(velocity.x, velocity.y, velocity.z)
+
+    def set_simulate_physics(self, enabled=True):
+        pass
+
+    def destroy(self):
+        if not self.is_alive:
+            return False
+        self.is_alive = False
+        self._world._remove(self)
+        return True
+
+    def __repr__(self):
+        return f"Actor(id={self.id}, type={self.type_id})"
+
+
+class Vehicle(Actor):
+    def __init__(self, world, blueprint, transform, parent=None):
+        super().__init__(world, blueprint, transform, parent)
+        self._slot = world._vehicles.add(transform)
+        self._light_state = VehicleLightState.NONE
+
+    def get_transform(self):
+        st = self._world._vehicles
+        i = self._slot
+        return Transform(Location(float(st.x[i]), float(st.y[i]), float(st.z[i])),
+                         Rotation(yaw=math.degrees(float(st.yaw[i]))))
+
+    def get_velocity(self):
+        st = self._world._vehicles
+        i = self._slot
+        v = float(st.v[i])
+        yaw = float(st.yaw[i])
+        return Vector3D(v * math.cos(yaw), v * math.sin(yaw), 0.0)
+
+    def set_transform(self, transform):
+        self._world._vehicles.place(self._slot, transform)
+
+    def set_location(self, location):
+        t = self.get_transform()
+        t.location = location
+        self.set_transform(t)
+
+    def set_target_velocity(self, velocity):
+        st = self._world._vehicles
+        yaw = float(st.yaw[self._slot])
+        st.v[self._slot] = max(0.0, velocity.x * math.cos(yaw) + velocity.y * math.sin(yaw))
+
+    def apply_control(self, control):
+        self._world._vehicles.set_control(self._slot, control)
+
+    def get_control(self):
+        st = self._world._vehicles
+        i = self._slot
+        return VehicleControl(throttle=float(st.throttle[i]), steer=float(st.steer[i]),
+                              brake=float(st.brake[i]))
+
+    def set_autopilot(self, enabled=True, tm_port=8000):
+        self._world._vehicles.autopilot[self._slot] = bool(enabled)
+
+    def set_light_state(self, light_state):
+        self._light_state = VehicleLightState(int(light_state))
+
+    def get_light_state(self):
+        return self._light_state
+
+    def get_speed_limit(self):
+        return 90.0 if self._world._map.town == "Town04" else 30.0
+
+    def destroy(self):
+        alive = super().destroy()
+        if alive:
+            self._world._vehicles.remove(self._slot)
+        return alive
+
+
+class WalkerAIController(Actor):
+    """controller.ai.walker: walks its parent straight to the target, then stands."""
+
+    def __init__(self, world, blueprint, transform, parent=None):
+        super().__init__(world, blueprint, transform, parent)
+        self._target = None
+        self._max_speed = 1.4
+
+    def start(self):
+        if self not in self._world._walker_controllers:
+            self._world._walker_controllers.append(self)
+
+    def stop(self):
+        if self in self._world._walker_controllers:
+            self._world._walker_controllers.remove(self)
+        if self.parent is not None:
+            self.parent.set_target_velocity(Vector3D())
+
+    def go_to_location(self, location):
+        self._target = Location(location.x, location.y, location.z)
+
+    def set_max_speed(self, speed=1.4):
+        self._max_speed = float(speed)
+
+    def _step(self, dt):
+        walker = self.parent
+        if walker is None or not walker.is_alive or self._target is None:
+            return
+        loc = walker._transform.location
+        dx, dy = self._target.x - loc.x, self._target.y - loc.y
+        d = math.hypot(dx, dy)
+        if d < 0.1:
+            walker.set_target_velocity(Vector3D())
+            return
+        step = min(d, self._max_speed * dt)
+        loc.x += dx / d * step
+        loc.y += dy / d * step
+        walker.set_target_velocity(Vector3D(dx / d * step / dt, dy / d * step / dt, 0.0))
+
+    def destroy(self):
+        self.stop()
+        return super().destroy()
+
+
+class Image:
+    def __init__(self, frame, timestamp, width, height, fov, transform):
+        self.frame = frame
+        self.frame_number = frame
+        self.timestamp = timestamp
+        self.width = width
+        self.height = height
+        self.fov = fov
+        self.transform = transform
+
+    @property
+    def raw_data(self):
+        return _blank_bgra(self.width, self.height)
+
+    def save_to_disk(self, path, color_converter=None):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(_blank_png(self.width, self.height))
+
+
+_blank_cache = {}
+
+
+def _blank_bgra(width, height):
+    key = ("bgra", width, height)
+    if key not in _blank_cache:
+        _blank_cache[key] = bytes(width * height * 4)
+    return _blank_cache[key]
+
+
+def _blank_png(width, height):
+    key = ("png", width, height)
+    if key not in _blank_cache:
+        def chunk(kind, data):
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+        rows = (b"\x00" + bytes(width * 3)) * height
+        _blank_cache[key] = (
+            b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 9))
+            + chunk(b"IEND", b"")
+        )
+    return _blank_cache[key]
+
+
+class Sensor(Actor):
+    def __init__(self, world, blueprint, transform, parent=None):
+        super().__init__(world, blueprint, transform, parent)
+        self._callback = None
+        self._since_last = 0.0
+
+    @property
+    def is_listening(self):
+        return self._callback is not None
+
+    def listen(self, callback):
+        self._callback = callback
+
+    def stop(self):
+        self._callback = None
+
+    def _on_tick(self, frame, elapsed, delta):
+        if self._callback is None or not self.type_id.startswith("sensor.camera"):
+            return
+        self._since_last += delta
+        sensor_tick = float(self.attributes.get("sensor_tick", 0.0))
+        if self._since_last + 1e-9 < sensor_tick:
+            return
+        self._since_last = 0.0
+        self._callback(Image(frame, elapsed,
+                             int(self.attributes["image_size_x"]),
+                             int(self.attributes["image_size_y"]),
+                             float(self.attributes["fov"]),
+                             self.get_transform()))
+
+    def destroy(self):
+        self._callback = None
+        return super().destroy()
+
+
+class TrafficLight(Actor):
+    def __init__(self, world, transform, junction_id, direction):
+        super().__init__(world, ActorBlueprint("traffic.traffic_light"), transform)
+        self._state = TrafficLightState.Green
+        self._frozen = False
+        self._junction_id = junction_id
+        self._direction = direction      # -1: serves negative lane ids, 1: positive
+        self._group = [self]
+        self._elapsed = 0.0
+        self._times = {TrafficLightState.Green: 10.0, TrafficLightState.Yellow: 3.0, TrafficLightState.Red: 13.0}
+
+    @property
+    def state(self):
+        return self._state
+
+    def get_state(self):
+        return self._state
+
+    def set_state(self, state):
+        self._state = TrafficLightState(state)
+        self._elapsed = 0.0
+
+    def freeze(self, freeze):
+        self._frozen = bool(freeze)
+
+    def is_frozen(self):
+        return self._frozen
+
+    def get_elapsed_time(self):
+        return self._elapsed
+
+    def set_green_time(self, t):
+        self._times[TrafficLightState.Green] = t
+
+    def set_yellow_time(self, t):
+        self._times[TrafficLightState.Yellow] = t
+
+    def set_red_time(self, t):
+        self._times[TrafficLightState.Red] = t
+
+    def get_group_traffic_lights(self):
+        return list(self._group)
+
+    def get_pole_index(self):
+        return self._group.index(self)
+
+    def get_opendrive_id(self):
+        return str(self.id)
+
+    def _lane_ids(self):
+        m = self._world._map
+        return [i for i in m._lanes if (i < 0) == (self._direction < 0) and m._lanes[i]["type"] == LaneType.Driving]
+
+    def get_affected_lane_waypoints(self):
+        m = self._world._map
+        jx = m._junctions[self._junction_id]
+        return [Waypoint(m, i, jx - 10.0 if i < 0 else m.length - jx - 10.0) for i in self._lane_ids()]
+
+    def get_stop_waypoints(self):
+        return self.get_affected_lane_waypoints()
+
+    def reset_group(self):
+        for tl in self._group:
+            tl.set_state(TrafficLightState.Green if tl is self else TrafficLightState.Red)
+
+    def _advance(self, delta):
+        if self._frozen:
+            return
+        self._elapsed += delta
+        if self._elapsed >= self._times.get(self._state, float("inf")):
+            self._state = {TrafficLightState.Green: TrafficLightState.Yellow,
+                           TrafficLightState.Yellow: TrafficLightState.Red,
+                           TrafficLightState.Red: TrafficLightState.Green}[self._state]
+            self._elapsed = 0.0
+
+
+# ---------------------------------------------------------
+# Vehicle States (vectorized bicycle model)
+# ---------------------------------------------------------
+class _VehicleStates:
+    def __init__(self, capacity=16):
+        self.count = 0
+        self._free = []
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        old = getattr(self, "x", None)
+        fields = ("x", "y", "z", "yaw", "v", "throttle", "steer", "brake", "alive", "autopilot", "target_speed")
+        for name in fields:
+            dtype = bool if name in ("alive", "autopilot") else np.float64
+            arr = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                arr[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, arr)
+        self.capacity = capacity
+
+    def add(self, transform):
+        if self._free:
+            i = self._free.pop()
+        else:
+            if self.count == self.capacity:
+                self._alloc(self.capacity * 2)
+            i = self.count
+            self.count += 1
+        self.place(i, transform)
+        self.v[i] = 0.0
+        self.throttle[i] = self.steer[i] = self.brake[i] = 0.0
+        self.alive[i] = True
+        self.autopilot[i] = False
+        self.target_speed[i] = 30.0 / 3.6
+        return i
+
+    def place(self, i, transform):
+        self.x[i] = transform.location.x
+        self.y[i] = transform.location.y
+        self.z[i] = transform.location.z
+        self.yaw[i] = math.radians(transform.rotation.yaw)
+
+    def remove(self, i):
+        self.alive[i] = False
+        self.autopilot[i] = False
+        self.v[i] = 0.0
+        self._free.append(i)
+
+    def set_control(self, i, control):
+        self.throttle[i] = min(max(control.throttle, 0.0), 1.0)
+        self.steer[i] = min(max(control.steer, -1.0), 1.0)
+        self.brake[i] = min(max(control.brake, 0.0), 1.0)
+
+    def step(self, dt, road):
+        n = self.count
+        if n == 0:
+            return
+        alive = self.alive[:n]
+        v = self.v[:n]
+        yaw = self.yaw[:n]
+
+        auto = self.autopilot[:n] & alive
+        if auto.any():
+            self._autopilot(auto, road)
+
+        throttle = self.throttle[:n]
+        drive = throttle * np.minimum(MAX_ACCEL, MAX_POWER_PER_KG / np.maximum(v, 1.0))
+        a = drive - self.brake[:n] * MAX_BRAKE - DRAG * v * v - ROLLING * (v > 0)
+        v_new = np.where(alive, np.maximum(0.0, v + a * dt), 0.0)
+
+        yaw += v_new / WHEELBASE * np.tan(self.steer[:n] * MAX_STEER) * dt
+        self.x[:n] += v_new * np.cos(yaw) * dt
+        self.y[:n] += v_new * np.sin(yaw) * dt
+        v[:] = v_new
+
+        # Autopilot traffic loops back to the start of its lane
+        if auto.any():
+            wrap_fwd = auto & (np.cos(yaw) > 0) & (self.x[:n] > road.length)
+            wrap_back = auto & (np.cos(yaw) < 0) & (self.x[:n] < 0.0)
+            self.x[:n][wrap_fwd] = 0.0
+            self.x[:n][wrap_back] = road.length
+
+    def _autopilot(self, mask, road):
+        n = self.count
+        y = self.y[:n][mask]
+        heading = np.sign(np.cos(self.yaw[:n][mask]))
+        heading[heading == 0] = 1.0
+
+        # nearest driving lane that runs in the vehicle's direction
+        d = np.abs(y[:, None] - road._driving_centers[None, :])
+        d[heading[:, None] != road._driving_dirs[None, :]] = np.inf
+        centers = road._driving_centers[np.argmin(d, axis=1)]
+
+        lane_yaw = np.where(heading > 0, 0.0, math.pi)
+        yaw_err = np.arctan2(np.sin(lane_yaw - self.yaw[:n][mask]), np.cos(lane_yaw - self.yaw[:n][mask]))
+        lat_err = (centers - y) * heading
+        self.steer[:n][mask] = np.clip(0.8 * yaw_err + 0.05 * lat_err, -0.5, 0.5)
+
+        speed_err = self.target_speed[:n][mask] - self.v[:n][mask]
+        self.throttle[:n][mask] = np.clip(0.3 * speed_err, 0.0, 0.8)
+        self.brake[:n][mask] = np.clip(-0.3 * speed_err, 0.0, 1.0)
+
+
+# ---------------------------------------------------------
+# Snapshots and Batch Commands
+# ---------------------------------------------------------
+class ActorSnapshot:
+    def __init__(self, actor_id, transform, velocity):
+        self.id = actor_id
+        self._transform = transform
+        self._velocity = velocity
+
+    def get_transform(self):
+        return _copy_transform(self._transform)
+
+    def get_velocity(self):
+        return Vector3D(self._velocity.x, self._velocity.y, self._velocity.z)
+
+    def get_angular_velocity(self):
+        return Vector3D()
+
+    def get_acceleration(self):
+        return Vector3D()
+
+
+class WorldSnapshot:
+    """Actor states as of one frame. Built lazily, per actor, on first lookup."""
+
+    def __init__(self, world):
+        self.id = world.id
+        self.frame = world._frame
+        self.timestamp = Timestamp(world._frame, world._elapsed, world._last_delta)
+        self._world_actors = dict(world._actors)
+        self._actors = {}
+
+    def has_actor(self, actor_id):
+        return actor_id in self._world_actors
+
+    def find(self, actor_id):
+        snap = self._actors.get(actor_id)
+        if snap is None:
+            actor = self._world_actors.get(actor_id)
+            if actor is None:
+                return None
+            snap = ActorSnapshot(actor_id, actor.get_transform(), actor.get_velocity())
+            self._actors[actor_id] = snap
+        return snap
+
+    def __iter__(self):
+        return (self.find(i) for i in self._world_actors)
+
+    def __len__(self):
+        return len(self._world_actors)
+
+
+class command:
+    """carla.command: deferred actor operations for Client.apply_batch."""
+
+    class Response:
+        def __init__(self, actor_id=0, error=""):
+            self.actor_id = actor_id
+            self.error = error
+
+        def has_error(self):
+            return bool(self.error)
+
+    class ApplyVehicleControl:
+        def __init__(self, actor, control):
+            self.actor_id = getattr(actor, "id", actor)
+            self.control = control
+
+        def _run(self, world):
+            world._actors[self.actor_id].apply_control(self.control)
+            return self.actor_id
+
+    class SetVehicleLightState:
+        def __init__(self, actor, light_state):
+            self.actor_id = getattr(actor, "id", actor)
+            self.light_state = light_state
+
+        def _run(self, world):
+            world._actors[self.actor_id].set_light_state(self.light_state)
+            return self.actor_id
+
+    class ApplyTransform:
+        def __init__(self, actor, transform):
+            self.actor_id = getattr(actor, "id", actor)
+            self.transform = transform
+
+        def _run(self, world):
+            world._actors[self.actor_id].set_transform(self.transform)
+            return self.actor_id
+
+    class ApplyTargetVelocity:
+        def __init__(self, actor, velocity):
+            self.actor_id = getattr(actor, "id", actor)
+            self.velocity = velocity
+
+        def _run(self, world):
+            world._actors[self.actor_id].set_target_velocity(self.velocity)
+            return self.actor_id
+
+    class FutureActor:
+        """Placeholder for the id of the actor spawned by the enclosing SpawnActor."""
+
+    class SpawnActor:
+        def __init__(self, blueprint, transform, parent=None):
+            self.blueprint = blueprint
+            self.transform = transform
+            self.parent_id = getattr(parent, "id", parent)
+            self.actor_id = 0
+            self._then = []
+
+        def then(self, cmd):
+            self._then.append(cmd)
+            return self
+
+        def _run(self, world):
+            parent = world._actors[self.parent_id] if self.parent_id else None
+            actor_id = world.spawn_actor(self.blueprint, self.transform, parent).id
+            for cmd in self._then:
+                if cmd.actor_id is command.FutureActor:
+                    cmd.actor_id = actor_id
+                cmd._run(world)
+            return actor_id
+
+    class DestroyActor:
+        def __init__(self, actor):
+            self.actor_id = getattr(actor, "id", actor)
+
+        def _run(self, world):
+            if not world._actors[self.actor_id].destroy():
+                raise RuntimeError(f"actor {self.actor_id} already destroyed")
+            return self.actor_id
+
+    class SetAutopilot:
+        def __init__(self, actor, enabled, tm_port=8000):
+            self.actor_id = getattr(actor, "id", actor)
+            self.enabled = enabled
+            self.tm_port = tm_port
+
+        def _run(self, world):
+            world._actors[self.actor_id].set_autopilot(self.enabled, self.tm_port)
+            return self.actor_id
+
+
+# ---------------------------------------------------------
+# World, Traffic Manager and Client
+# ---------------------------------------------------------
+_episode_ids = itertools.count(1)
+
+
+class World:
+    def __init__(self, client, town_name):
+        self._client = client
+        self._map = Map(town_name)
+        self._settings = WorldSettings()
+        self._actors = {}
+        self._vehicles = _VehicleStates()
+        self._sensors = []
+        self._lights = []
+        self._walker_controllers = []
+        self._nav_rng = random.Random(0)
+        self._cross_factor = 0.0
+        self._frame = 0
+        self._elapsed = 0.0
+        self._last_delta = 0.0
+        self._snapshot = None
+        self._ids = 0
+        self.id = next(_episode_ids)    # unique per load, like CARLA's episode id
+
+        self._spectator = Actor(self, ActorBlueprint("spectator"), Transform())
+        self._actors[self._spectator.id] = self._spectator
+        self._spawn_traffic_lights()
+
+    def _next_id(self):
+        self._ids += 1
+        return self._ids
+
+    def _spawn_traffic_lights(self):
+        m = self._map
+        for k, jx in enumerate(m._junctions):
+            group = []
+            for direction in (-1, 1):
+                edge = max(abs(l["center"]) + l["width"] / 2 for l in m._lanes.values())
+                y = edge + 1.0 if direction < 0 else -(edge + 1.0)
+                x = jx - 10.0 if direction < 0 else jx + 10.0
+                tl = TrafficLight(self, Transform(Location(x, y, 0.0)), k, direction)
+                self._actors[tl.id] = tl
+                self._lights.append(tl)
+                group.append(tl)
+            for tl in group:
+                tl._group = group
+            group[0].set_state(TrafficLightState.Green)
+            group[1].set_state(TrafficLightState.Red)
+
+    def _remove(self, actor):
+        self._actors.pop(actor.id, None)
+        if actor in self._sensors:
+            self._sensors.remove(actor)
+
+    def get_map(self):
+        return self._map
+
+    def get_blueprint_library(self):
+        return BlueprintLibrary()
+
+    def get_spectator(self):
+        return self._spectator
+
+    def get_settings(self):
+        s = self._settings
+        return WorldSettings(s.synchronous_mode, s.no_rendering_mode, s.fixed_delta_seconds)
+
+    def apply_settings(self, settings):
+        self._settings = WorldSettings(settings.synchronous_mode, settings.no_rendering_mode,
+                                       settings.fixed_delta_seconds)
+        return self._frame
+
+    def get_actors(self, actor_ids=None):
+        if actor_ids is None:
+            return ActorList(self._actors.values())
+        return ActorList(self._actors[i] for i in actor_ids if i in self._actors)
+
+    def get_actor(self, actor_id):
+        return self._actors.get(actor_id)
+
+    def _overlaps(self, transform):
+        st = self._vehicles
+        n = st.count
+        if n == 0:
+            return False
+        d2 = (st.x[:n] - transform.location.x)**2 + (st.y[:n] - transform.location.y)**2
+        return bool(np.any(st.alive[:n] & (d2 < 2.0**2)))
+
+    def try_spawn_actor(self, blueprint, transform, attach_to=None):
+        try:
+            return self.spawn_actor(blueprint, transform, attach_to)
+        except RuntimeError:
+            return None
+
+    def spawn_actor(self, blueprint, transform, attach_to=None):
+        if blueprint.id.startswith("vehicle."):
+            if self._overlaps(transform):
+                raise RuntimeError("Spawn failed because of collision at spawn position")
+            actor = Vehicle(self, blueprint, transform)
+        elif blueprint.id.startswith("sensor."):
+            actor = Sensor(self, blueprint, transform, attach_to)
+            self._sensors.append(actor)
+        elif blueprint.id == "controller.ai.walker":
+            actor = WalkerAIController(self, blueprint, transform, attach_to)
+        else:
+            actor = Actor(self, blueprint, transform, attach_to)
+        self._actors[actor.id] = actor
+        return actor
+
+    def _delta(self):
+        return self._settings.fixed_delta_seconds or DEFAULT_DELTA_SECONDS
+
+    def tick(self, seconds=10.0):
+        dt = self._delta()
+        self._vehicles.step(dt, self._map)
+        for controller in self._walker_controllers:
+            controller._step(dt)
+        for tl in self._lights:
+            tl._advance(dt)
+        self._frame += 1
+        self._elapsed += dt
+        self._last_delta = dt
+        for sensor in list(self._sensors):
+            sensor._on_tick(self._frame, self._elapsed, dt)
+        return self._frame
+
+    def wait_for_tick(self, seconds=10.0):
+        self.tick()
+        return Timestamp(self._frame, self._elapsed, self._last_delta)
+
+    def get_snapshot(self):
+        if self._snapshot is None or self._snapshot.frame != self._frame:
+            self._snapshot = WorldSnapshot(self)
+        return self._snapshot
+
+    def set_pedestrians_seed(self, seed):
+        self._nav_rng = random.Random(seed)
+
+    def set_pedestrians_cross_factor(self, percentage):
+        self._cross_factor = float(percentage)
+
+    def get_random_location_from_navigation(self):
+        """A point on one of the two sidewalks along the road."""
+        m, rng = self._map, self._nav_rng
+        edge = max(abs(l["center"]) + l["width"] / 2 for l in m._lanes.values()) + SIDEWALK_OFFSET
+        return Location(rng.uniform(0.0, m.length), edge if rng.random() < 0.5 else -edge, 0.0)
+
+    def freeze_all_traffic_lights(self, frozen):
+        for tl in self._lights:
+            tl.freeze(frozen)
+
+    def reset_all_traffic_lights(self):
+        for tl in self._lights:
+            tl._group[0].reset_group()
+
+    def get_traffic_light(self, landmark):
+        return None
+
+
+class TrafficManager:
+    def __init__(self, client, port):
+        self._client = client
+        self._port = port
+        self.synchronous = False
+        self.seed = None
+
+    def get_port(self):
+        return self._port
+
+    def set_synchronous_mode(self, mode=True):
+        self.synchronous = bool(mode)
+
+    def set_random_device_seed(self, seed):
+        self.seed = seed
+
+    def set_global_distance_to_leading_vehicle(self, distance):
+        pass
+
+    def global_percentage_speed_difference(self, percentage):
+        world = self._client._world
+        if world is not None:
+            n = world._vehicles.count
+            world._vehicles.target_speed[:n] = 30.0 / 3.6 * (1.0 - percentage / 100.0)
+
+    def set_hybrid_physics_mode(self, enabled=True):
+        pass
+
+
+class SimClock:
+    """
+    time()/sleep() pair driven by simulation time, so code written against
+    the `time` module can run faster than real time on this backend.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def time(self):
+        world = self._client._world
+        return world._elapsed if world is not None else 0.0
+
+    def sleep(self, seconds):
+        world = self._client._world
+        if world is None:
+            return
+        for _ in range(int(round(seconds / world._delta()))):
+            world.tick()
+
+
+class Client:
+    def __init__(self, host="localhost", port=2000, worker_threads=0):
+        self.host = host
+        self.port = port
+        self._timeout = 5.0
+        self._world = None
+        self._traffic_managers = {}
+        self.clock = SimClock(self)
+
+    def set_timeout(self, seconds):
+        self._timeout = seconds
+
+    def get_client_version(self):
+        return "0.9.16-kinematic"
+
+    def get_server_version(self):
+        return "0.9.16-kinematic"
+
+    def get_available_maps(self):
+        return [f"/Game/Carla/Maps/{name}" for name in TOWNS]
+
+    def load_world(self, map_name, reset_settings=True):
+        self._world = World(self, os.path.basename(map_name))
+        return self._world
+
+    def reload_world(self, reset_settings=True):
+        if self._world is None:
+            raise RuntimeError("no world loaded")
+        return self.load_world(self._world._map.town, reset_settings)
+
+    def get_world(self):
+        if self._world is None:
+            self._world = World(self, "Town01")
+        return self._world
+
+    def apply_batch(self, commands):
+        self.apply_batch_sync(commands)
+
+    def apply_batch_sync(self, commands, do_tick=False):
+        world = self.get_world()
+        responses = []
+        for cmd in commands:
+            try:
+                responses.append(command.Response(cmd._run(world)))
+            except (KeyError, RuntimeError, AttributeError) as e:
+                responses.append(command.Response(getattr(cmd, "actor_id", 0), str(e) or type(e).__name__))
+        if do_tick:
+            world.tick()
+        return responses
+
+    def get_trafficmanager(self, client_connection=8000):
+        if client_connection not in self._traffic_managers:
+            self._traffic_managers[client_connection] = TrafficManager(self, client_connection)
+        return self._traffic_managers[client_connection]
@@ -0,0 +1,266 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+import psutil
+
+# ---------------------------------------------------------
+# Shared Face-Landmark Models
+# ---------------------------------------------------------
+# The dlib face detector and 68-point shape predictor (~100 MB) are loaded
+# once per process by load_models() and reused by extract_features(), the
+# EAR / PUC / MAR / MOE extractor from the classifier notebook. For N
+# workers there are two ways to avoid N copies:
+#
+#   fork    the parent loads the models, then forks the pool; workers
+#           share the predictor's pages copy-on-write and load nothing
+#   socket  one process loads the models and serve()s them on
+#           127.0.0.1; LandmarkClient sends frames and gets features
+#           back (for platforms without fork, e.g. Windows, or notebooks)
+#
+#     python landmark_service.py --workers 4 frames/*.png
+#     python landmark_service.py --serve           # prints address + key
+#
+# Every worker reports its model load time and memory: rss, and uss (the
+# pages only that process holds), which stays small when the predictor
+# is shared. shape_predictor_68_face_landmarks.dat goes in MLModel/ (see
+# the note there), or point LANDMARK_PREDICTOR at it.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PREDICTOR_PATH = os.environ.get(
+    "LANDMARK_PREDICTOR", os.path.join(BASE_DIR, "MLModel", "shape_predictor_68_face_landmarks.dat"))
+FEATURES = ["EAR", "PUC", "MAR", "MOE"]
+SERVICE_PORT = int(os.environ.get("LANDMARK_PORT", "0"))    # 0: any free port
+
+_models = None
+_load_s = 0.0
+_loaded_by = None                # pid that loaded the models (not a fork child)
+
+
+def load_models(path=PREDICTOR_PATH):
+    """(detector, predictor), loaded on first call in this process or inherited from the parent."""
+    global _models, _load_s, _loaded_by
+    if _models is None:
+        import dlib
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; see MLModel/shape_predictor_68_face_landmarks")
+        start = time.perf_counter()
+        _models = (dlib.get_frontal_face_detector(), dlib.shape_predictor(path))
+        _load_s = time.perf_counter() - start
+        _loaded_by = os.getpid()
+    return _models
+
+
+def memory_report():
+    """This process: pid, model load time (0 when inherited) and memory in MB."""
+    proc = psutil.Process()
+    try:
+        uss = proc.memory_full_info().uss
+    except (psutil.AccessDenied, AttributeError):
+        uss = None
+    return {
+        "pid": os.getpid(),
+        "load_s": _load_s if _loaded_by == os.getpid() else 0.0,
+        "inherited": _models is not None and _loaded_by != os.getpid(),
+        "rss_mb": proc.memory_info().rss / 2**20,
+        "uss_mb": None if uss is None else uss / 2**20,
+    }
+
+
+# ---------------------------------------------------------
+# Features
+# ---------------------------------------------------------
+def _points(parts):
+    return np.array([[p.x, p.y] for p in parts], dtype=np.float32)
+
+
+def _eye_aspect_ratio(eye):
+    c = np.linalg.norm(eye[0] - eye[3])
+    if c == 0:
+        return 0.0
+    return float((np.linalg.norm(eye[1] - eye[5]) + np.linalg.norm(eye[2] - eye[4])) / (2.0 * c))
+
+
+def _pupil_to_eye_center(eye):
+    return float(np.linalg.norm(eye.mean(axis=0) - (eye[0] + eye[3]) / 2.0))
+
+
+def _mouth_aspect_ratio(mouth):
+    horizontal = np.linalg.norm(mouth[12] - mouth[16])
+    if horizontal == 0:
+        return 0.0
+    vertical = (np.linalg.norm(mouth[13] - mouth[19]) + np.linalg.norm(mouth[14] - mouth[18])
+                + np.linalg.norm(mouth[15] - mouth[17]))
+    return float(vertical / (3.0 * horizontal))
+
+
+def _gray(frame):
+    import cv2
+
+    img = np.asarray(frame)
+    if img.dtype == np.uint8 and img.ndim == 2:
+        return img               # already gray, e.g. FramePreprocessor.gray: no copy
+    if img.dtype.kind == "f" and img.max() <= 1.0:
+        img = img * 255.0
+    img = np.clip(img, 0, 255).astype(np.uint8)
+    if img.ndim == 3 and img.shape[2] == 1:
+        return img[..., 0]
+    if img.ndim == 3:
+        return cv2.cvtColor(img[..., :3], cv2.COLOR_BGR2GRAY)
+    return img
+
+
+def extract_features(frame):
+    """BGR or gray image -> np.array([EAR, PUC, MAR, MOE]) for the first face, or None."""
+    detector, predictor = load_models()
+    gray = _gray(frame)
+    faces = detector(gray)
+    if len(faces) == 0:
+        return None
+    parts = _points(predictor(gray, faces[0]).parts())
+    if len(parts) < 68:
+        return None
+
+    left, right, mouth = parts[36:42], parts[42:48], parts[48:68]
+    ear = (_eye_aspect_ratio(left) + _eye_aspect_ratio(right)) / 2.0
+    puc = (_pupil_to_eye_center(left) + _pupil_to_eye_center(right)) / 2.0
+    mar = _mouth_aspect_ratio(mouth)
+    moe = mar / (ear if ear != 0 else 1e-6)
+    return np.array([ear, puc, mar, moe], dtype=np.float32)
+
+
+def _read_image(path):
+    import cv2
+    img = cv2.imread(path)
+    if img is None:
+        raise FileNotFoundError(path)
+    return img
+
+
+# ---------------------------------------------------------
+# Fork-Shared Worker Pool
+# ---------------------------------------------------------
+def _pool_task(path):
+    features = extract_features(_read_image(path))
+    return path, features, memory_report()
+
+
+def extract_parallel(paths, workers=4):
+    """
+    Features for every image path using `workers` forked processes that
+    share the parent's models. Returns ({path: features or None},
+    {pid: memory_report}) with the parent under pid os.getpid().
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise RuntimeError("fork is not available here; use serve() and LandmarkClient instead")
+    load_models()                # before forking, so the children inherit it
+    results, reports = {}, {os.getpid(): memory_report()}
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        for path, features, report in pool.imap_unordered(_pool_task, paths, chunksize=8):
+            results[path] = features
+            reports[report["pid"]] = report
+    return results, reports
+
+
+# ---------------------------------------------------------
+# Local Socket Service
+# ---------------------------------------------------------
+def serve(port=SERVICE_PORT, authkey=None, ready=None):
+    """
+    Load the models and answer {"frame": array} requests with features
+    until interrupted. Each connection gets a thread; dlib calls run one
+    at a time. A frame that fails is answered with {"error": message}, so
+    the client raises instead of waiting. ready(address, authkey) is
+    called once listening.
+    """
+    load_models()
+    authkey = authkey or os.urandom(16)
+    listener = Listener(("127.0.0.1", port), authkey=authkey)
+    lock = threading.Lock()
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    msg = conn.recv()
+                except (OSError, EOFError):
+                    return
+                if msg.get("type") == "report":
+                    conn.send(memory_report())
+                    continue
+                try:
+                    with lock:
+                        reply = extract_features(msg["frame"])
+                except Exception as e:
+                    reply = {"error": f"{type(e).__name__}: {e}"}
+                conn.send(reply)
+
+    if ready is not None:
+        ready(listener.address, authkey)
+    try:
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    finally:
+        listener.close()
+
+
+class LandmarkClient:
+    """extract_features() against a serve() process; loads no model itself."""
+
+    def __init__(self, address, authkey):
+        start = time.perf_counter()
+        self.conn = Client(tuple(address), authkey=authkey)
+        self.connect_s = time.perf_counter() - start
+
+    def extract_features(self, frame):
+        self.conn.send({"type": "frame", "frame": np.asarray(frame)})
+        reply = self.conn.recv()
+        if isinstance(reply, dict) and "error" in reply:
+            raise RuntimeError(f"landmark service: {reply['error']}")
+        return reply
+
+    def server_report(self):
+        self.conn.send({"type": "report"})
+        return self.conn.recv()
+
+    def close(self):
+        self.conn.close()
+
+
+def print_reports(reports):
+    print(f"{'pid':>8} {'load s':>8} {'rss MB':>8} {'uss MB':>8}  model")
+    for r in reports.values():
+        uss = "n/a" if r["uss_mb"] is None else f"{r['uss_mb']:.1f}"
+        source = "inherited (fork)" if r["inherited"] else ("loaded" if r["load_s"] else "none")
+        print(f"{r['pid']:>8} {r['load_s']:>8.2f} {r['rss_mb']:>8.1f} {uss:>8}  {source}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract EAR/PUC/MAR/MOE with shared dlib models.")
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--serve", action="store_true", help="serve the models on 127.0.0.1 instead")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(ready=lambda address, key: print(f"Serving on {address[0]}:{address[1]} authkey={key.hex()}"))
+        sys.exit(0)
+    if not args.images:
+        parser.error("no images given")
+
+    start = time.perf_counter()
+    features, reports = extract_parallel(args.images, args.workers)
+    elapsed = time.perf_counter() - start
+    for path, f in sorted(features.items()):
+        values = "no face" if f is None else ", ".join(f"{n}={v:.3f}" for n, v in zip(FEATURES, f))
+        print(f"{os.path.basename(path)}: {values}")
+    print(f"\n{len(features)} images in {elapsed:.2f} s with {args.workers} workers\n")
+    print_reports(reports)
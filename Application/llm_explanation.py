@@ -1,10 +1,17 @@
+import asyncio
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import requests
 import numpy as np
 
 API_KEY = os.getenv("MISTRAL_API_KEY", "xGbwkJFTpe7BpsA0iyH462sYW8QPXFNs")
 MODEL = "mistral-tiny"
-API_URL = "https://api.mistral.ai/v1/chat/completions"
+API_URL = os.getenv("MISTRAL_API_URL", "https://api.mistral.ai/v1/chat/completions")
 
 
 def mistral_chat(prompt):
@@ -75,4 +82,213 @@ Keep your response:
 
 def generate_explanation(result_json):
     prompt = build_prompt(result_json)
-    return mistral_chat(prompt)
\ No newline at end of file
+    return mistral_chat(prompt)
+
+# ---------------------------------------------------------
+# Async Batch Explanations
+# ---------------------------------------------------------
+# explain_many() generates explanations for many result dicts at once
+# (a folder of assets/Json results, a fleet of drivers). Identical prompts
+# from build_prompt are sent once and the answer is shared by every key
+# that produced them. At most `concurrency` requests are in flight, each
+# on a pooled requests.Session in a worker thread; a 429 (or 5xx) pauses
+# every request until its Retry-After has passed, then retries with
+# backoff. Errors come back as "LLM Error: ..." strings, like mistral_chat.
+#
+#     async for key, text in explain_many(results, concurrency=8): ...
+#     explanations = explain_batch(results)                # blocking
+#
+#     python llm_explanation.py assets/Json --mock       # local mock server
+
+MAX_CONCURRENCY = 8
+MAX_RETRIES = 5
+BACKOFF_S = 0.5                  # first retry delay without Retry-After; doubles
+REQUEST_TIMEOUT_S = 30
+
+
+class _RateGate:
+    """Shared pause after a 429, plus an optional minimum spacing between requests."""
+
+    def __init__(self, min_interval=0.0):
+        self.min_interval = min_interval
+        self._resume_at = 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._resume_at, self._next_slot)
+            self._next_slot = start + self.min_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+def _retry_after(resp, attempt):
+    try:
+        return max(0.0, float(resp.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return BACKOFF_S * 2 ** attempt
+
+
+def _post(session, prompt):
+    return session.post(
+        API_URL,
+        headers={"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"},
+        json={"model": MODEL, "messages": [{"role": "user", "content": prompt}]},
+        timeout=REQUEST_TIMEOUT_S,
+    )
+
+
+async def _chat_async(prompt, session, executor, semaphore, gate):
+    loop = asyncio.get_running_loop()
+    for attempt in range(MAX_RETRIES + 1):
+        await gate.wait()
+        async with semaphore:
+            try:
+                resp = await loop.run_in_executor(executor, _post, session, prompt)
+            except requests.RequestException as e:
+                return f"LLM Error: {e}"
+        if resp.status_code == 429 or resp.status_code >= 500:
+            gate.pause(_retry_after(resp, attempt))
+            continue
+        if resp.status_code != 200:
+            return f"LLM Error: {resp.text}"
+        try:
+            return resp.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            # one malformed reply must not abort the rest of the batch
+            return f"LLM Error: malformed response ({type(e).__name__}: {e})"
+    return f"LLM Error: HTTP {resp.status_code} after {MAX_RETRIES} retries"
+
+
+async def explain_many(results, concurrency=MAX_CONCURRENCY, min_interval=0.0):
+    """
+    Async generator of (key, explanation) in completion order. results is
+    a {key: result_json} dict or an iterable of (key, result_json) pairs.
+    Keys that share a prompt are yielded together when it completes.
+    """
+    items = results.items() if isinstance(results, dict) else results
+    keys_by_prompt = {}
+    for key, result_json in items:
+        keys_by_prompt.setdefault(build_prompt(result_json), []).append(key)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    gate = _RateGate(min_interval)
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        pending = {
+            asyncio.ensure_future(_chat_async(prompt, session, executor, semaphore, gate)): keys
+            for prompt, keys in keys_by_prompt.items()
+        }
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    text = task.result()
+                    for key in pending.pop(task):
+                        yield key, text
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def explain_batch(results, concurrency=MAX_CONCURRENCY, min_interval=0.0, on_result=None):
+    """Blocking wrapper: {key: explanation}. on_result(key, text) is called as each arrives."""
+    async def collect():
+        out = {}
+        async for key, text in explain_many(results, concurrency, min_interval):
+            out[key] = text
+            if on_result is not None:
+                on_result(key, text)
+        return out
+
+    return asyncio.run(collect())
+
+
+def load_results(folder):
+    """{file name: result_json} for every .json file in folder (e.g. assets/Json)."""
+    results = {}
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".json"):
+            with open(os.path.join(folder, name), encoding="utf-8") as f:
+                results[name] = json.load(f)
+    return results
+
+
+# ---------------------------------------------------------
+# Local Mock Server
+# ---------------------------------------------------------
+def serve_mock(port=0, latency_s=0.2, rate_limit_every=0, retry_after_s=0.5):
+    """
+    Chat-completions stand-in on 127.0.0.1 that answers after latency_s
+    and, if rate_limit_every > 0, returns 429 with Retry-After on every
+    n-th request. Returns the server; its .url is the endpoint to use and
+    its .calls counts the requests received.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            with server.lock:
+                server.calls += 1
+                n = server.calls
+            if rate_limit_every and n % rate_limit_every == 0:
+                self.send_response(429)
+                self.send_header("Retry-After", str(retry_after_s))
+                self.end_headers()
+                return
+            time.sleep(latency_s)
+            prompt = body["messages"][0]["content"]
+            state = prompt.split("Predicted class:", 1)[-1].splitlines()[0].strip()
+            payload = json.dumps({"choices": [{"message": {"content": f"Mock advice for {state}."}}]})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.calls = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate explanations for a folder of result JSON files.")
+    parser.add_argument("folder", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 "assets", "Json"))
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--min-interval", type=float, default=0.0, help="s between request starts")
+    parser.add_argument("--mock", action="store_true", help="send to a local mock server instead")
+    parser.add_argument("--repeat", type=int, default=1, help="copies of each result (fleet-size test)")
+    args = parser.parse_args()
+
+    results = load_results(args.folder)
+    if args.repeat > 1:
+        results = {f"{k}#{i}": v for k, v in results.items() for i in range(args.repeat)}
+    if args.mock:
+        mock = serve_mock(rate_limit_every=7)
+        API_URL = mock.url
+
+    start = time.perf_counter()
+    texts = explain_batch(results, args.concurrency, args.min_interval,
+                          on_result=lambda key, text: print(f"{key}: {text}"))
+    elapsed = time.perf_counter() - start
+    prompts = len({build_prompt(r) for r in results.values()})
+    print(f"\n{len(texts)} explanations from {prompts} distinct prompts in {elapsed:.2f} s")
+    if args.mock:
+        print(f"Mock server saw {mock.calls} requests")
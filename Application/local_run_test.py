@@ -1,5 +1,7 @@
+import os
 import carla
-from carla_simulation import start_carla, stop_carla, run_scenario
+from carla_simulation import start_carla, stop_carla, run_scenario, CARLA_HOST, CARLA_PORT
+from instrumentation import Instrumentation, METRICS_PORT
 
 # ============================================================
 # LOCAL TEST RUNNER
@@ -17,18 +19,24 @@ if __name__ == "__main__":
     print(f"Town: {town}")
     print("===========================================\n")
 
+    # Live metrics on http://127.0.0.1:9400/metrics while the scenario runs
+    instr = Instrumentation()
+    instr.serve(METRICS_PORT)
+
     # 1. Launch CARLA
     carla_process = start_carla()
 
     try:
         # 2. Connect to CARLA server
-        client = carla.Client("localhost", 2000)
+        client = carla.Client(CARLA_HOST, CARLA_PORT)
         client.set_timeout(60.0)
 
         print("Connected to CARLA. Running scenario...\n")
 
         # 3. Run simulation
-        run_scenario(client,town,scenario_id,driver_class)
+        folder = run_scenario(client,town,scenario_id,driver_class, tracer=instr)
+        instr.export_trace(os.path.join(folder, "trace.json"))
+        print(f"Trace saved to {folder}/trace.json (open in chrome://tracing or ui.perfetto.dev)")
 
     except Exception as e:
         print("\nERROR DURING SIMULATION:")
@@ -36,6 +44,7 @@ if __name__ == "__main__":
 
     finally:
         # 4. Stop CARLA
+        instr.stop()
         print("\nStopping CARLA...")
         stop_carla(carla_process)
         print("CARLA Stopped.")
@@ -0,0 +1,122 @@
+import time
+from collections import defaultdict
+
+import numpy as np
+
+# ---------------------------------------------------------
+# Control-Loop Phase Timing
+# ---------------------------------------------------------
+# run_scenario wraps each phase of its tick in `tracer.span(name)` and
+# reports a few loop events through the rest of the Tracer interface.
+# NULL_TRACER (the default) does nothing; PhaseTimer records how long
+# every span took so benchmark_loop.py can report percentiles;
+# instrumentation.Instrumentation adds live metrics and trace export.
+
+PERCENTILES = (50, 95, 99)
+HISTOGRAM_EDGES_US = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000]
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Tracer:
+    """Interface run_scenario talks to. Everything but span() is optional."""
+
+    def span(self, name):
+        raise NotImplementedError
+
+    def event(self, name, **args):
+        """Something happened in the scenario (warning, takeover, ...)."""
+
+    def sensor_frame(self, frame, sim_time, image=None):
+        """A camera image for simulator frame `frame` was processed."""
+
+    def sample(self, t, steer, throttle, brake, speed):
+        """The values logged to controls.csv for this tick."""
+
+    def tick_done(self, frame):
+        """world.tick() returned simulator frame `frame`."""
+
+
+class _NullTracer(Tracer):
+    _span = _NullSpan()
+
+    def span(self, name):
+        return self._span
+
+
+NULL_TRACER = _NullTracer()
+
+
+class _TimedSpan:
+    __slots__ = ("_timer", "_name", "_start")
+
+    def __init__(self, timer, name):
+        self._timer = timer
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        self._timer.record(self._name, self._start, end)
+        return False
+
+
+class PhaseTimer(Tracer):
+    """Collects span durations (ns) per phase name, plus "loop": tick_done to tick_done."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.first_start = None
+        self.last_end = None
+        self._last_tick = None
+
+    def span(self, name):
+        return _TimedSpan(self, name)
+
+    def record(self, name, start, end):
+        self.samples[name].append(end - start)
+        if self.first_start is None or start < self.first_start:
+            self.first_start = start
+        if self.last_end is None or end > self.last_end:
+            self.last_end = end
+
+    def tick_done(self, frame):
+        now = time.perf_counter_ns()
+        if self._last_tick is not None:
+            self.record("loop", self._last_tick, now)
+        self._last_tick = now
+
+    def ticks_per_second(self, tick_phase="tick"):
+        ticks = len(self.samples.get(tick_phase, ()))
+        if not ticks or self.first_start is None:
+            return 0.0
+        return ticks / ((self.last_end - self.first_start) / 1e9)
+
+    def summary(self):
+        """{phase: {count, mean_us, p50_us, p95_us, p99_us, max_us, histogram}}"""
+        out = {}
+        for name, values in self.samples.items():
+            us = np.asarray(values, dtype=np.float64) / 1000.0
+            counts, _ = np.histogram(us, bins=[0] + HISTOGRAM_EDGES_US + [np.inf])
+            entry = {
+                "count": int(us.size),
+                "mean_us": float(us.mean()),
+                "max_us": float(us.max()),
+                "histogram": {
+                    "edges_us": HISTOGRAM_EDGES_US,
+                    "counts": [int(c) for c in counts],
+                },
+            }
+            for p in PERCENTILES:
+                entry[f"p{p}_us"] = float(np.percentile(us, p))
+            out[name] = entry
+        return out
@@ -0,0 +1,331 @@
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from landmark_service import FEATURES
+
+# ---------------------------------------------------------
+# Model Selection Harness
+# ---------------------------------------------------------
+# Runs the Training.ipynb candidates (GaussianNB, DecisionTree,
+# RandomForest, MLP and, with TensorFlow installed, the CNN) over their
+# hyperparameter grids in parallel and writes one comparison table.
+#
+# The extracted feature CSV ("Extract features.csv": EAR, PUC, MAR, MOE,
+# drowsy) is parsed once into .npy files next to it; every worker opens
+# them with mmap_mode="r", so N processes share one copy through the page
+# cache. The train/test split is made once and shared too, and
+# SelectKBest / StandardScaler live inside each candidate's pipeline, so
+# they are fitted on the training folds only.
+#
+# Every row has holdout accuracy, 5-fold CV on the training split and the
+# inference latency for one sample (median and p95 of single-row
+# predict() calls, as the classifier runs in the vehicle, frame by frame).
+# Candidates over the latency budget are listed last whatever their score.
+#
+#     python model_selection.py "Dataset/Extract features.csv" --workers 4
+#     python model_selection.py features.csv --models rf mlp --budget-ms 2
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LABEL = "drowsy"
+TEST_SIZE = 0.2
+CV_FOLDS = 5
+SEED = 42
+LATENCY_SAMPLES = 200            # single-row predict() calls per candidate
+LATENCY_BUDGET_MS = 5.0          # per sample; the loop runs at 20 Hz
+
+TABLE_FIELDS = [
+    "model", "params", "accuracy", "cv_mean", "cv_std",
+    "latency_ms_p50", "latency_ms_p95", "fit_s", "within_budget", "error",
+]
+
+
+# ---------------------------------------------------------
+# Feature Cache
+# ---------------------------------------------------------
+def _cache_paths(csv_path):
+    stem = os.path.splitext(csv_path)[0]
+    return stem + ".X.npy", stem + ".y.npy"
+
+
+def build_cache(csv_path):
+    """Parse the feature CSV into X / y .npy files, unless they are newer than it."""
+    x_path, y_path = _cache_paths(csv_path)
+    if (os.path.exists(x_path) and os.path.exists(y_path)
+            and os.path.getmtime(x_path) >= os.path.getmtime(csv_path)):
+        return x_path, y_path
+
+    with open(csv_path, newline="") as f:
+        reader = csv.DictReader(f)
+        rows = [r for r in reader if all(r.get(k) not in (None, "") for k in FEATURES + [LABEL])]
+    X = np.array([[float(r[k]) for k in FEATURES] for r in rows], dtype=np.float32)
+    y = np.array([int(float(r[LABEL])) for r in rows], dtype=np.int8)
+    np.save(x_path, X)
+    np.save(y_path, y)
+    print(f"Cached {len(y)} samples from {os.path.basename(csv_path)}")
+    return x_path, y_path
+
+
+def load_cache(csv_path):
+    """(X, y) as read-only memory maps."""
+    x_path, y_path = build_cache(csv_path)
+    return np.load(x_path, mmap_mode="r"), np.load(y_path, mmap_mode="r")
+
+
+# ---------------------------------------------------------
+# Candidates
+# ---------------------------------------------------------
+def _naive_bayes(params):
+    from sklearn.naive_bayes import GaussianNB
+    return GaussianNB(**params)
+
+
+def _decision_tree(params):
+    from sklearn.feature_selection import SelectKBest, chi2
+    from sklearn.pipeline import make_pipeline
+    from sklearn.tree import DecisionTreeClassifier
+
+    params = dict(params)
+    k = params.pop("k", "all")
+    return make_pipeline(SelectKBest(chi2, k=k),
+                         DecisionTreeClassifier(min_samples_split=5, random_state=SEED, **params))
+
+
+def _random_forest(params):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.feature_selection import SelectKBest, chi2
+    from sklearn.pipeline import make_pipeline
+
+    params = dict(params)
+    k = params.pop("k", "all")
+    return make_pipeline(SelectKBest(chi2, k=k),
+                         RandomForestClassifier(min_samples_split=5, min_samples_leaf=2, n_jobs=1,
+                                                random_state=SEED, **params))
+
+
+def _mlp(params):
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    return make_pipeline(StandardScaler(),
+                         MLPClassifier(max_iter=1000, early_stopping=True, random_state=SEED, **params))
+
+
+def _cnn(params):
+    from sklearn.base import BaseEstimator, ClassifierMixin
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    class CNNClassifier(BaseEstimator, ClassifierMixin):
+        """The notebook's 2x2 Conv2D network behind the sklearn fit/predict interface."""
+
+        def __init__(self, epochs=100, batch_size=32, learning_rate=1e-5):
+            self.epochs = epochs
+            self.batch_size = batch_size
+            self.learning_rate = learning_rate
+
+        def fit(self, X, y):
+            import tensorflow as tf
+            from tensorflow.keras import Sequential
+            from tensorflow.keras.layers import BatchNormalization, Conv2D, Dense, Dropout, Flatten
+
+            tf.random.set_seed(SEED)
+            model = Sequential([
+                Conv2D(32, kernel_size=(2, 2), activation="relu", input_shape=(2, 2, 1)),
+                BatchNormalization(),
+                Flatten(),
+                Dense(128, activation="relu"),
+                BatchNormalization(),
+                Dropout(0.5),
+                Dense(64, activation="relu"),
+                BatchNormalization(),
+                Dense(1, activation="sigmoid"),
+            ])
+            model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=self.learning_rate),
+                          loss="binary_crossentropy", metrics=["accuracy"])
+            model.fit(np.asarray(X).reshape(-1, 2, 2, 1), np.asarray(y),
+                      epochs=self.epochs, batch_size=self.batch_size, verbose=0)
+            self.model_ = model
+            self.classes_ = np.array([0, 1])
+            return self
+
+        def predict(self, X):
+            # Calling the model directly skips predict()'s per-call dataset setup
+            prob = self.model_(np.asarray(X, dtype=np.float32).reshape(-1, 2, 2, 1), training=False)
+            return (np.asarray(prob).reshape(-1) > 0.5).astype(int)
+
+    return make_pipeline(StandardScaler(), CNNClassifier(**params))
+
+
+# name -> (builder, grid); every combination of the grid is one candidate
+CANDIDATES = {
+    "nb": (_naive_bayes, {"var_smoothing": [1e-9, 1e-8, 1e-7]}),
+    "dt": (_decision_tree, {"k": [2, "all"], "max_depth": [3, 5, 8], "min_samples_leaf": [1, 2, 5]}),
+    "rf": (_random_forest, {"k": [2, "all"], "n_estimators": [50, 100], "max_depth": [5, 10]}),
+    "mlp": (_mlp, {"hidden_layer_sizes": [(32,), (100,)], "alpha": [1e-3, 1e-2]}),
+    "cnn": (_cnn, {"epochs": [100], "learning_rate": [1e-5, 1e-4]}),
+}
+
+
+def expand_grid(names):
+    """[(model, params), ...] for every grid point of the named candidates."""
+    jobs = []
+    for name in names:
+        _, grid = CANDIDATES[name]
+        keys = sorted(grid)
+        for values in itertools.product(*(grid[k] for k in keys)):
+            jobs.append((name, dict(zip(keys, values))))
+    return jobs
+
+
+def _tensorflow_available():
+    try:
+        import importlib.util
+        return importlib.util.find_spec("tensorflow") is not None
+    except (ImportError, ValueError):
+        return False
+
+
+# ---------------------------------------------------------
+# Workers
+# ---------------------------------------------------------
+_data = None                     # (X, y, train_idx, test_idx) in each worker
+
+
+def _init_worker(csv_path, train_idx, test_idx):
+    global _data
+    X, y = load_cache(csv_path)
+    _data = (X, y, train_idx, test_idx)
+
+
+def measure_latency(estimator, X, samples=LATENCY_SAMPLES):
+    """(p50, p95) ms of predict() on one row at a time, cycling through X."""
+    rows = [np.array(X[i % len(X)]).reshape(1, -1) for i in range(samples)]
+    estimator.predict(rows[0])   # warm up
+    times = np.empty(samples)
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        estimator.predict(row)
+        times[i] = time.perf_counter() - start
+    return float(np.percentile(times, 50) * 1e3), float(np.percentile(times, 95) * 1e3)
+
+
+def evaluate(name, params):
+    """One grid point: CV on the training split, holdout accuracy and latency."""
+    from sklearn.metrics import accuracy_score
+    from sklearn.model_selection import StratifiedKFold, cross_val_score
+
+    X, y, train_idx, test_idx = _data
+    X_train, y_train = X[train_idx], y[train_idx]     # fancy indexing copies out of the map
+    X_test, y_test = X[test_idx], y[test_idx]
+    row = {"model": name, "params": params, "error": ""}
+    try:
+        build, _ = CANDIDATES[name]
+        folds = StratifiedKFold(CV_FOLDS, shuffle=True, random_state=SEED)
+        cv = cross_val_score(build(params), X_train, y_train, cv=folds, n_jobs=1)
+
+        estimator = build(params)
+        start = time.perf_counter()
+        estimator.fit(X_train, y_train)
+        row["fit_s"] = time.perf_counter() - start
+        row["accuracy"] = float(accuracy_score(y_test, estimator.predict(X_test)))
+        row["cv_mean"], row["cv_std"] = float(cv.mean()), float(cv.std())
+        row["latency_ms_p50"], row["latency_ms_p95"] = measure_latency(estimator, X_test)
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+# ---------------------------------------------------------
+# Grid Runner
+# ---------------------------------------------------------
+def split_indices(y):
+    from sklearn.model_selection import train_test_split
+
+    idx = np.arange(len(y))
+    return train_test_split(idx, test_size=TEST_SIZE, random_state=SEED, stratify=np.asarray(y))
+
+
+def run_grid(csv_path, names=None, workers=None, budget_ms=LATENCY_BUDGET_MS):
+    """Evaluate every grid point of the named candidates; returns the ranked rows."""
+    if names is None:
+        names = [n for n in CANDIDATES if n != "cnn" or _tensorflow_available()]
+    jobs = expand_grid(names)
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+
+    X, y = load_cache(csv_path)
+    train_idx, test_idx = split_indices(y)
+    print(f"{len(y)} samples ({len(train_idx)} train / {len(test_idx)} test), "
+          f"{len(jobs)} candidates on {workers} workers")
+
+    # One BLAS / OpenMP thread per worker, or the processes oversubscribe the cores
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+
+    rows = []
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(csv_path, train_idx, test_idx)) as pool:
+        futures = [pool.submit(evaluate, name, params) for name, params in jobs]
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            if row["error"]:
+                print(f"   {row['model']} {row['params']}: {row['error']}")
+            else:
+                print(f"   {row['model']} {row['params']}: acc {row['accuracy']:.3f}, "
+                      f"cv {row['cv_mean']:.3f}, {row['latency_ms_p50']:.3f} ms")
+    return rank(rows, budget_ms)
+
+
+def rank(rows, budget_ms=LATENCY_BUDGET_MS):
+    """Within the latency budget first, then by CV mean, then by latency."""
+    for row in rows:
+        row["within_budget"] = not row["error"] and row["latency_ms_p95"] <= budget_ms
+    return sorted(rows, key=lambda r: (not r["within_budget"], -r.get("cv_mean", 0.0),
+                                       r.get("latency_ms_p50", float("inf"))))
+
+
+def write_table(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=TABLE_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: row.get(k, "") for k in TABLE_FIELDS})
+
+
+def print_table(rows):
+    print(f"\n{'model':<5} {'acc':>6} {'cv':>6} {'±':>6} {'p50 ms':>8} {'p95 ms':>8}  params")
+    for r in rows:
+        if r["error"]:
+            print(f"{r['model']:<5} {'error':>6}  {r['params']}  {r['error']}")
+            continue
+        mark = "" if r["within_budget"] else "  (over budget)"
+        print(f"{r['model']:<5} {r['accuracy']:>6.3f} {r['cv_mean']:>6.3f} {r['cv_std']:>6.3f} "
+              f"{r['latency_ms_p50']:>8.3f} {r['latency_ms_p95']:>8.3f}  {r['params']}{mark}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare the drowsiness classifiers in parallel.")
+    parser.add_argument("features", help="extracted feature CSV (EAR, PUC, MAR, MOE, drowsy)")
+    parser.add_argument("--models", nargs="+", choices=sorted(CANDIDATES),
+                        help="default: all (cnn only with TensorFlow installed)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--budget-ms", type=float, default=LATENCY_BUDGET_MS,
+                        help="p95 single-sample latency allowed in the vehicle")
+    parser.add_argument("--out", default=os.path.join(BASE_DIR, "MLModel", "model_selection.csv"))
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = run_grid(args.features, args.models, args.workers, args.budget_ms)
+    print_table(table)
+    write_table(table, args.out)
+    print(f"\n{len(table)} candidates in {time.perf_counter() - start:.1f} s; table saved to {args.out}")
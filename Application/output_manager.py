@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+import time
+import uuid
+
+# ---------------------------------------------------------
+# Run Output Directories
+# ---------------------------------------------------------
+# Every run writes into its own directory under <output_root>/runs/, named
+# <label>-<YYYYmmdd-HHMMSS>-<id>, so nothing is deleted or renamed while a
+# run starts or ends. A run is complete once its manifest.json exists; the
+# manifest and the per-label pointers in <output_root>/latest/ are written
+# to a temp file and os.replace()d into place, which is atomic.
+#
+#     run = OutputRun.create("output", "Scenario2-Town04-critical_drowsiness")
+#     ... write run.path/controls.csv, run.images ...
+#     run.finalize("Scenario2-Town04-critical_ai_takeover", final_state="critical_ai_takeover")
+#     latest_run("output", "Scenario2-Town04-critical_ai_takeover")   # -> run.path
+#
+# apply_retention() prunes old runs by age and total size; limits default
+# to CARLA_OUTPUT_MAX_AGE_DAYS / CARLA_OUTPUT_MAX_GB when set.
+
+MANIFEST = "manifest.json"
+RUNS_DIR = "runs"
+LATEST_DIR = "latest"
+INCOMPLETE_GRACE = 6 * 3600      # s before an unfinished run counts as abandoned
+
+
+def _env_float(name):
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+def write_json_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class OutputRun:
+    def __init__(self, output_root, path, label, started):
+        self.output_root = output_root
+        self.path = path
+        self.label = label
+        self.started = started
+        self.images = os.path.join(path, "images")
+
+    @classmethod
+    def create(cls, output_root, label):
+        started = time.time()
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}-{uuid.uuid4().hex[:6]}"
+        path = os.path.join(output_root, RUNS_DIR, f"{label}-{run_id}")
+        os.makedirs(os.path.join(path, "images"))
+        return cls(output_root, path, label, started)
+
+    def finalize(self, label=None, **fields):
+        """Write manifest.json and point latest/<label> at this run. Returns the manifest."""
+        label = label or self.label
+        images = [n for n in os.listdir(self.images) if n.endswith(".png")] if os.path.isdir(self.images) else []
+        manifest = {
+            "label": label,
+            "status": "complete",
+            "started": self.started,
+            "finished": time.time(),
+            "frames": len(images),
+            "size_bytes": dir_size(self.path),
+            **fields,
+        }
+        write_json_atomic(os.path.join(self.path, MANIFEST), manifest)
+
+        latest_dir = os.path.join(self.output_root, LATEST_DIR)
+        os.makedirs(latest_dir, exist_ok=True)
+        write_json_atomic(os.path.join(latest_dir, f"{label}.json"), {
+            "path": os.path.relpath(self.path, self.output_root),
+            "finished": manifest["finished"],
+        })
+        return manifest
+
+
+def read_manifest(run_path):
+    try:
+        with open(os.path.join(run_path, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def latest_run(output_root, label):
+    """Path of the newest complete run for `label`, or None."""
+    try:
+        with open(os.path.join(output_root, LATEST_DIR, f"{label}.json")) as f:
+            path = os.path.join(output_root, json.load(f)["path"])
+    except (OSError, ValueError, KeyError):
+        return None
+    return path if os.path.isdir(path) else None
+
+
+def list_runs(output_root):
+    """[{path, manifest, mtime}] for every run directory, newest first."""
+    runs_dir = os.path.join(output_root, RUNS_DIR)
+    if not os.path.isdir(runs_dir):
+        return []
+
+    runs = []
+    for name in os.listdir(runs_dir):
+        path = os.path.join(runs_dir, name)
+        if not os.path.isdir(path):
+            continue
+        manifest = read_manifest(path)
+        mtime = manifest["finished"] if manifest else os.path.getmtime(path)
+        runs.append({"path": path, "manifest": manifest, "mtime": mtime})
+    runs.sort(key=lambda r: r["mtime"], reverse=True)
+    return runs
+
+
+# ---------------------------------------------------------
+# Retention
+# ---------------------------------------------------------
+def apply_retention(output_root, max_bytes=None, max_age_days=None, now=None):
+    """
+    Delete runs older than max_age_days, then the oldest runs until the
+    total is under max_bytes. Runs a latest/ pointer refers to are kept,
+    and unfinished runs are only touched once INCOMPLETE_GRACE has passed
+    (so a run in progress is never removed). Returns the deleted paths.
+    """
+    if max_bytes is None:
+        max_gb = _env_float("CARLA_OUTPUT_MAX_GB")
+        max_bytes = max_gb * 1024**3 if max_gb is not None else None
+    if max_age_days is None:
+        max_age_days = _env_float("CARLA_OUTPUT_MAX_AGE_DAYS")
+    if max_bytes is None and max_age_days is None:
+        return []
+
+    now = now or time.time()
+    runs = list_runs(output_root)
+
+    protected = set()
+    latest_dir = os.path.join(output_root, LATEST_DIR)
+    if os.path.isdir(latest_dir):
+        for name in os.listdir(latest_dir):
+            if name.endswith(".json"):
+                path = latest_run(output_root, name[:-5])
+                if path:
+                    protected.add(os.path.normpath(path))
+
+    candidates = []
+    for run in runs:
+        if os.path.normpath(run["path"]) in protected:
+            continue
+        if run["manifest"] is None and now - run["mtime"] < INCOMPLETE_GRACE:
+            continue
+        candidates.append(run)
+
+    doomed = []
+    if max_age_days is not None:
+        cutoff = now - max_age_days * 86400
+        doomed = [r for r in candidates if r["mtime"] < cutoff]
+
+    if max_bytes is not None:
+        sizes = {r["path"]: (r["manifest"] or {}).get("size_bytes") or dir_size(r["path"]) for r in runs}
+        total = sum(sizes.values()) - sum(sizes[r["path"]] for r in doomed)
+        for run in reversed(candidates):           # oldest first
+            if total <= max_bytes:
+                break
+            if run not in doomed:
+                doomed.append(run)
+                total -= sizes[run["path"]]
+
+    deleted = []
+    for run in doomed:
+        # Locked files (e.g. an open image viewer) are left for the next pass
+        shutil.rmtree(run["path"], ignore_errors=True)
+        if not os.path.exists(run["path"]):
+            deleted.append(run["path"])
+    return deleted
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="List or prune scenario run outputs.")
+    parser.add_argument("--output", default="output")
+    parser.add_argument("--max-gb", type=float)
+    parser.add_argument("--max-age-days", type=float)
+    args = parser.parse_args()
+
+    if args.max_gb is None and args.max_age_days is None:
+        for run in list_runs(args.output):
+            m = run["manifest"]
+            status = f"{m['frames']} frames, {m['size_bytes'] / 1e6:.1f} MB" if m else "incomplete"
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(run['mtime']))}  {run['path']}  ({status})")
+    else:
+        max_bytes = args.max_gb * 1024**3 if args.max_gb is not None else None
+        deleted = apply_retention(args.output, max_bytes, args.max_age_days)
+        print(f"Deleted {len(deleted)} run(s)")
+        for path in deleted:
+            print("  " + path)
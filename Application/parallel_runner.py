@@ -0,0 +1,307 @@
+import csv
+import os
+import socket
+import subprocess
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from capture_profiles import CAPTURE_PROFILES
+from output_manager import OutputRun, apply_retention
+from run_index import add_run, remove_runs
+
+# ---------------------------------------------------------
+# Variables Initialization
+# ---------------------------------------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_RPC_PORT = 2000
+BASE_TM_PORT = 8000
+PORT_STRIDE = 3          # rpc, streaming (rpc + 1) and CARLA's secondary port (rpc + 2)
+SERVER_READY_TIMEOUT = 120
+
+SUMMARY_FIELDS = [
+    "job", "scenario_id", "town", "driver_class", "status",
+    "folder", "duration_s", "rpc_port", "error",
+]
+
+
+# ---------------------------------------------------------
+# Port Allocation
+# ---------------------------------------------------------
+def port_is_free(port, host="127.0.0.1"):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind((host, port))
+        except OSError:
+            return False
+    return True
+
+
+def allocate_ports(count, base_rpc=BASE_RPC_PORT, base_tm=BASE_TM_PORT, stride=PORT_STRIDE):
+    """
+    Reserve `count` server slots. Each slot gets an RPC port, the streaming
+    port CARLA expects next to it, and its own Traffic Manager port.
+    Ranges that are already bound on this machine are skipped.
+    """
+    slots = []
+    rpc = base_rpc
+    tm = base_tm
+
+    while len(slots) < count:
+        block = [rpc + k for k in range(stride)]
+        if all(port_is_free(p) for p in block) and port_is_free(tm):
+            slots.append({
+                "index": len(slots),
+                "rpc_port": rpc,
+                "streaming_port": rpc + 1,
+                "tm_port": tm,
+            })
+        rpc += stride
+        tm += 1
+
+        if rpc > 65000:
+            raise RuntimeError(f"Could not allocate {count} CARLA port ranges.")
+
+    return slots
+
+
+def wait_for_port(port, host="127.0.0.1", timeout=SERVER_READY_TIMEOUT):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1.0):
+                return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+# ---------------------------------------------------------
+# Server Launchers
+# ---------------------------------------------------------
+def launch_carla_server(slot):
+    from carla_simulation import start_carla
+    return start_carla(slot["rpc_port"], slot["streaming_port"], wait=0)
+
+
+def launch_fake_server(slot):
+    """
+    Stand-in for a CARLA server: a child process that only holds the slot's
+    RPC and streaming ports open. Useful to exercise allocation, readiness
+    and teardown without Unreal.
+    """
+    return subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--fake-server",
+        str(slot["rpc_port"]), str(slot["streaming_port"]),
+    ])
+
+
+def _serve_fake(ports):
+    sockets = []
+    for port in ports:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(("127.0.0.1", port))
+        s.listen()
+        sockets.append(s)
+    while True:
+        time.sleep(3600)
+
+
+def stop_server(process):
+    from carla_simulation import stop_carla
+    stop_carla(process)
+
+
+def stop_fake_server(process):
+    process.kill()
+    process.wait()
+
+
+# ---------------------------------------------------------
+# Scenario Runners (executed inside worker processes)
+# ---------------------------------------------------------
+def carla_runner(slot, job, output_root):
+    import carla
+    from carla_simulation import run_scenario, CARLA_HOST
+
+    client = carla.Client(CARLA_HOST, slot["rpc_port"])
+    client.set_timeout(60.0)
+    return run_scenario(client, job["town"], job["scenario_id"], job["driver_class"],
+                        output_root=output_root, tm_port=slot["tm_port"], capture=job.get("capture"),
+                        retention=False)
+
+
+def fake_runner(slot, job, output_root):
+    """Writes the same folder layout as run_scenario, without a simulator."""
+    safe_state = job["driver_class"].replace(" ", "_")
+    run = OutputRun.create(output_root, f"Scenario{job['scenario_id']}-{job['town']}-{safe_state}")
+
+    with open(os.path.join(run.path, "controls.csv"), "w", newline="") as f:
+        logger = csv.writer(f)
+        logger.writerow(["time", "steer", "throttle", "brake", "speed_kmh", "driver_state"])
+        logger.writerow([time.time(), 0.0, 0.0, 0.0, 0.0, job["driver_class"]])
+
+    manifest = run.finalize(scenario_id=job["scenario_id"], town=job["town"],
+                            driver_class=job["driver_class"], final_state=job["driver_class"])
+    add_run(output_root, run.path, manifest)
+    return run.path
+
+
+# ---------------------------------------------------------
+# Worker Process
+# ---------------------------------------------------------
+_worker = {}
+
+
+def _init_worker(slot_queue, runner):
+    # Every worker owns exactly one server for its whole life
+    _worker["slot"] = slot_queue.get()
+    _worker["runner"] = runner
+
+
+def _run_job(job, output_root):
+    # Jobs share output_root: run folders are unique, and runs.sqlite takes
+    # concurrent inserts, so every run is indexed and kept like a single one
+    slot = _worker["slot"]
+
+    result = {
+        "job": job["job"],
+        "scenario_id": job["scenario_id"],
+        "town": job["town"],
+        "driver_class": job["driver_class"],
+        "rpc_port": slot["rpc_port"],
+        "folder": "",
+        "error": "",
+    }
+
+    start = time.time()
+    try:
+        result["folder"] = _worker["runner"](slot, job, output_root)
+        result["status"] = "ok"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+    result["duration_s"] = round(time.time() - start, 3)
+
+    return result
+
+
+# ---------------------------------------------------------
+# Batch Summary
+# ---------------------------------------------------------
+def write_summary(batch_dir, results):
+    """
+    Write one summary.csv for the batch. The run folders themselves stay in
+    <output_root>/runs with every other run; the summary points at them.
+    """
+    os.makedirs(batch_dir, exist_ok=True)
+    summary_path = os.path.join(batch_dir, "summary.csv")
+    with open(summary_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for result in sorted(results, key=lambda r: r["job"]):
+            writer.writerow({k: result.get(k, "") for k in SUMMARY_FIELDS})
+
+    return summary_path
+
+
+# ---------------------------------------------------------
+# Run Scenario Batch
+# ---------------------------------------------------------
+def run_parallel(jobs, servers=4, output_root="output", launcher=launch_carla_server,
+                 stopper=stop_server, runner=carla_runner, base_rpc=BASE_RPC_PORT):
+    """
+    Run a list of scenario jobs across `servers` CARLA instances.
+
+    jobs: iterable of (scenario_id, town, driver_class) tuples or dicts.
+    Runs land in <output_root>/runs like single runs (indexed, kept by
+    retention, pointed to by latest/); batch_dir only holds summary.csv.
+    Returns (batch_dir, results). Use launch_fake_server / stop_fake_server /
+    fake_runner to exercise the executor without CARLA.
+    """
+    jobs = [
+        dict(zip(("scenario_id", "town", "driver_class"), j)) if not isinstance(j, dict) else dict(j)
+        for j in jobs
+    ]
+    for k, job in enumerate(jobs):
+        job["job"] = k
+
+    servers = max(1, min(servers, len(jobs)))
+    output_root = os.path.abspath(output_root)
+    batch_dir = os.path.join(output_root, time.strftime("batch-%Y%m%d-%H%M%S"))
+
+    slots = allocate_ports(servers, base_rpc=base_rpc)
+    print(f"Starting {servers} servers on RPC ports {[s['rpc_port'] for s in slots]}...")
+    processes = [launcher(slot) for slot in slots]
+
+    results = []
+    manager = None
+    try:
+        for slot in slots:
+            if not wait_for_port(slot["rpc_port"]):
+                raise RuntimeError(f"Server on port {slot['rpc_port']} did not come up.")
+        print("All servers ready.")
+
+        ctx = multiprocessing.get_context("spawn")
+        manager = ctx.Manager()
+        slot_queue = manager.Queue()
+        for slot in slots:
+            slot_queue.put(slot)
+
+        with ProcessPoolExecutor(max_workers=servers, mp_context=ctx,
+                                 initializer=_init_worker,
+                                 initargs=(slot_queue, runner)) as pool:
+            futures = [pool.submit(_run_job, job, output_root) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f"[{len(results)}/{len(jobs)}] Scenario {result['scenario_id']} "
+                      f"{result['town']} {result['driver_class']} → {result['status']}")
+    finally:
+        if manager is not None:
+            manager.shutdown()
+        for process in processes:
+            try:
+                stopper(process)
+            except Exception as e:
+                print("Server shutdown error:", e)
+
+    # Workers skip retention, so N processes never prune the same tree at once
+    deleted = apply_retention(output_root)
+    if deleted:
+        remove_runs(output_root, deleted)
+        print(f"Retention: removed {len(deleted)} old run(s)")
+
+    summary_path = write_summary(batch_dir, results)
+    print(f"\nBatch complete. Summary written to: {summary_path}\n")
+    return batch_dir, results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--fake-server":
+        _serve_fake([int(p) for p in sys.argv[2:]])
+    else:
+        import argparse
+
+        parser = argparse.ArgumentParser(description="Run CARLA scenarios in parallel.")
+        parser.add_argument("--servers", type=int, default=4)
+        parser.add_argument("--scenarios", type=int, nargs="+", default=[1, 2, 3, 4, 5, 6])
+        parser.add_argument("--classes", nargs="+",
+                            default=["alert", "slightly drowsy", "very drowsy", "critical drowsiness"])
+        parser.add_argument("--capture", choices=sorted(CAPTURE_PROFILES), default=None,
+                            help="capture profile (default: CARLA_CAPTURE_PROFILE or record)")
+        parser.add_argument("--fake", action="store_true",
+                            help="use stand-in servers and runner instead of CARLA")
+        args = parser.parse_args()
+
+        towns = {1: "Town01", 2: "Town04", 3: "Town01", 4: "Town05", 5: "Town05", 6: "Town04"}
+        jobs = [{"scenario_id": sid, "town": towns[sid], "driver_class": cls, "capture": args.capture}
+                for sid in args.scenarios for cls in args.classes]
+
+        if args.fake:
+            run_parallel(jobs, args.servers, launcher=launch_fake_server,
+                         stopper=stop_fake_server, runner=fake_runner)
+        else:
+            run_parallel(jobs, args.servers)
@@ -0,0 +1,277 @@
+import contextlib
+import csv
+import io
+import os
+import sys
+import time
+
+# ---------------------------------------------------------
+# Record / Replay of Controller Inputs
+# ---------------------------------------------------------
+# run_scenario records, per tick, everything the scenario controllers read:
+# the scenario time, whether OK was pressed and when, and the ego (and NPC) state
+# from the tick's snapshot. That goes to states.csv next to controls.csv.
+# replay_run() feeds those rows back through the scenario_*_control
+# functions without a simulator or rendering, and diffs their output
+# against the logged controls:
+#
+#     python replay.py output/runs/Scenario2-Town04-critical_drowsiness-...
+#     python replay.py --all output        # every recorded run; exit 1 on divergence
+#
+# Replay is open loop: the vehicle follows the recording whatever the
+# controller returns, so the first diverging tick points at the change.
+# Scenario 2 needs the road network; for CARLA runs the town's OpenDRIVE
+# is saved once to <output_root>/maps/<town>.xodr and loaded offline with
+# carla.Map, for kinematic stand-in runs the stand-in map is rebuilt.
+
+STATES_FILE = "states.csv"
+MAPS_DIR = "maps"
+ACTOR_FIELDS = ["x", "y", "z", "pitch", "yaw", "roll", "vx", "vy", "vz"]
+STATE_HEADER = (["t", "ok_pressed", "ok_time"] + [f"ego_{f}" for f in ACTOR_FIELDS]
+                + [f"npc_{f}" for f in ACTOR_FIELDS])
+CONTROL_CHANNELS = ["steer", "throttle", "brake"]
+
+
+def _actor_row(actor):
+    if actor is None:
+        return [""] * len(ACTOR_FIELDS)
+    tr = actor.get_transform()
+    v = actor.get_velocity()
+    return [tr.location.x, tr.location.y, tr.location.z,
+            tr.rotation.pitch, tr.rotation.yaw, tr.rotation.roll, v.x, v.y, v.z]
+
+
+class StateRecorder:
+    """Writes states.csv during a run (floats keep full precision)."""
+
+    def __init__(self, run_folder):
+        self._file = open(os.path.join(run_folder, STATES_FILE), "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(STATE_HEADER)
+
+    def record(self, t, ok_pressed, vehicle, npc=None, ok_time=None):
+        self._writer.writerow([t, int(bool(ok_pressed)), "" if ok_time is None else ok_time]
+                              + _actor_row(vehicle) + _actor_row(npc))
+
+    def close(self):
+        self._file.close()
+
+
+def save_town_map(output_root, world, town_name):
+    """Keep the town's OpenDRIVE once per output root, for offline replay."""
+    path = os.path.join(output_root, MAPS_DIR, f"{town_name}.xodr")
+    if os.path.exists(path):
+        return path
+    carla_map = world.get_map()
+    if not hasattr(carla_map, "to_opendrive"):
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(carla_map.to_opendrive())
+    return path
+
+
+# ---------------------------------------------------------
+# Replay Stand-ins for Actors and World
+# ---------------------------------------------------------
+class _ReplayActor:
+    """Returns the recorded state; keeps whatever the controller sends."""
+
+    def __init__(self, carla_module):
+        self._carla = carla_module
+        self._transform = None
+        self._velocity = None
+        self._control = None
+        self.light_state = None
+
+    def _load(self, row, prefix):
+        c = self._carla
+        v = [float(row[f"{prefix}_{f}"]) for f in ACTOR_FIELDS]
+        self._transform = c.Transform(c.Location(x=v[0], y=v[1], z=v[2]),
+                                      c.Rotation(pitch=v[3], yaw=v[4], roll=v[5]))
+        self._velocity = c.Vector3D(x=v[6], y=v[7], z=v[8])
+
+    def get_transform(self):
+        return self._transform
+
+    def get_location(self):
+        return self._transform.location
+
+    def get_velocity(self):
+        return self._velocity
+
+    def get_control(self):
+        return self._control if self._control is not None else self._carla.VehicleControl()
+
+    def apply_control(self, control):
+        self._control = control
+
+    def set_light_state(self, light_state):
+        self.light_state = light_state
+
+
+class _NoActors(list):
+    def filter(self, pattern):
+        return self
+
+
+class _ReplayWorld:
+    def __init__(self, carla_map):
+        self._map = carla_map
+
+    def get_map(self):
+        return self._map
+
+    def get_actors(self, actor_ids=None):
+        return _NoActors()
+
+
+def _load_map(carla_module, run_dir, town, backend):
+    if backend == "kinematic":
+        return carla_module.Map(town)
+    output_root = os.path.dirname(os.path.dirname(os.path.abspath(run_dir)))
+    path = os.path.join(output_root, MAPS_DIR, f"{town}.xodr")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return carla_module.Map(town, f.read())
+
+
+def _read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+# ---------------------------------------------------------
+# Replay
+# ---------------------------------------------------------
+def replay_run(run_dir, tolerance=1e-9, quiet=True):
+    """
+    Replay one recorded run through the current controllers. Returns a
+    dict with the tick count, max |diff| per control channel, the first
+    diverging tick (or None) and the speed-up over the recorded duration.
+    """
+    from output_manager import read_manifest
+
+    manifest = read_manifest(run_dir)
+    if manifest is None:
+        raise ValueError(f"{run_dir} has no manifest.json (unfinished run?)")
+    states_path = os.path.join(run_dir, STATES_FILE)
+    if not os.path.exists(states_path):
+        raise ValueError(f"{run_dir} was recorded without {STATES_FILE}")
+
+    backend = manifest.get("carla_backend", "carla")
+    if backend == "kinematic":
+        import kinematic_carla
+        kinematic_carla.install()
+    os.environ.setdefault("CARLA_SIM_MUTE", "1")
+
+    import carla
+    import carla_simulation as cs
+
+    if backend == "kinematic" and carla.__name__ != "kinematic_carla":
+        raise RuntimeError("the real carla module is already loaded; replay stand-in runs in their own process")
+
+    scenario_id = manifest["scenario_id"]
+    driver_class = manifest["driver_class"]
+    states = _read_csv(states_path)
+    controls = _read_csv(os.path.join(run_dir, "controls.csv"))
+
+    world = _ReplayWorld(_load_map(carla, run_dir, manifest["town"], backend))
+    if scenario_id == 2 and world.get_map() is None:
+        raise ValueError(f"no saved map for {manifest['town']}; scenario 2 needs it to replay")
+
+    vehicle = _ReplayActor(carla)
+    vehicle.driver_cancelled = False
+    npc = _ReplayActor(carla) if scenario_id == 6 else None
+
+    max_diff = {ch: 0.0 for ch in CONTROL_CHANNELS}
+    first_divergence = None
+    start = time.perf_counter()
+
+    out = io.StringIO() if quiet else sys.stdout
+    with contextlib.redirect_stdout(out):
+        for i, (row, logged) in enumerate(zip(states, controls)):
+            t = float(row["t"])
+            ok = row["ok_pressed"] == "1"
+            ok_time = float(row["ok_time"]) if row.get("ok_time") else None   # older runs: none
+            vehicle._load(row, "ego")
+            if npc is not None:
+                npc._load(row, "npc")
+
+            if scenario_id == 1:
+                got = cs.scenario_1_control(vehicle, t, driver_class, ok, ok_time)
+            elif scenario_id == 2:
+                got = cs.scenario_2_control(vehicle, t, driver_class, ok, world, ok_time)
+            elif scenario_id == 3:
+                got = cs.scenario_3_control(vehicle, t)
+            elif scenario_id == 4:
+                got = cs.scenario_4_control(vehicle, t)
+            elif scenario_id == 5:
+                got = cs.scenario_5_control(vehicle, t, ok, world, ok_time)
+            elif scenario_id == 6:
+                got = cs.scenario_6_control(vehicle, npc, t)
+            else:
+                raise ValueError(f"Scenario {scenario_id} not implemented.")
+
+            for ch, value in zip(CONTROL_CHANNELS, got[:3]):
+                diff = abs(float(value) - float(logged[ch]))
+                max_diff[ch] = max(max_diff[ch], diff)
+                if diff > tolerance and first_divergence is None:
+                    first_divergence = {"tick": i, "t": t, "channel": ch,
+                                        "logged": float(logged[ch]), "replayed": float(value)}
+
+    elapsed = time.perf_counter() - start
+    duration = float(states[-1]["t"]) if states else 0.0
+    return {
+        "run": run_dir,
+        "scenario_id": scenario_id,
+        "driver_class": driver_class,
+        "ticks": min(len(states), len(controls)),
+        "max_diff": max_diff,
+        "first_divergence": first_divergence,
+        "elapsed_s": elapsed,
+        "speedup": duration / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def recorded_runs(output_root):
+    from output_manager import list_runs
+    return [r["path"] for r in list_runs(output_root)
+            if r["manifest"] and os.path.exists(os.path.join(r["path"], STATES_FILE))]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay recorded runs through the scenario controllers.")
+    parser.add_argument("runs", nargs="*", help="run directories")
+    parser.add_argument("--all", metavar="OUTPUT_ROOT", help="replay every recorded run under this root")
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    parser.add_argument("--verbose", action="store_true", help="show the controllers' prints")
+    args = parser.parse_args()
+
+    runs = list(args.runs)
+    if args.all:
+        runs += recorded_runs(args.all)
+    if not runs:
+        parser.error("no runs given")
+
+    failed = 0
+    for run_dir in runs:
+        try:
+            result = replay_run(run_dir, args.tolerance, quiet=not args.verbose)
+        except (ValueError, RuntimeError) as e:
+            print(f"SKIP  {run_dir}: {e}")
+            continue
+
+        name = os.path.basename(os.path.normpath(run_dir))
+        div = result["first_divergence"]
+        if div is None:
+            print(f"OK    {name}: {result['ticks']} ticks, {result['speedup']:.0f}x real time")
+        else:
+            failed += 1
+            print(f"DIFF  {name}: tick {div['tick']} (t={div['t']:.2f} s) {div['channel']} "
+                  f"logged {div['logged']:.4f}, replayed {div['replayed']:.4f}")
+
+    sys.exit(1 if failed else 0)
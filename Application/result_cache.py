@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+from capture_profiles import resolve_profile
+from output_manager import dir_size, read_manifest
+
+# ---------------------------------------------------------
+# Simulation Result Cache
+# ---------------------------------------------------------
+# A finished run is a function of its inputs: scenario, town, driver
+# class, capture profile, background traffic and its seed, the scripted
+# driver inputs, the backend, and the code and server build that ran it.
+# fingerprint() hashes all of these (the sources in SOURCE_FILES and the
+# files in ASSET_FILES by content) into one key; store() remembers which
+# run folder a key produced, and lookup() hands that folder back instead
+# of starting CARLA again:
+#
+#     key, parts = fingerprint(2, "Town04", "critical drowsiness", capture="preview")
+#     folder = lookup("output", key)
+#     if folder is None:
+#         folder = run_scenario(client, "Town04", 2, "critical drowsiness", capture="preview")
+#         store("output", key, folder, parts)
+#
+#     python result_cache.py --list
+#     python result_cache.py --invalidate --scenario 2     # or --all
+#     python result_cache.py --evict --max-mb 500
+#
+# Runs where a human pressed OK (keyboard, gamepad, dashboard button) are
+# not stored, since the same inputs would not reproduce them. Any edit to
+# a listed source changes the key, so stale results are never returned;
+# --invalidate forgets entries by hand (their runs stay in the history).
+# evict() deletes the least recently used cached runs until they fit in
+# CARLA_CACHE_MAX_MB; runs outside the cache are left to apply_retention.
+
+CACHE_FILE = "result_cache.sqlite"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_FILES = [
+    "carla_simulation.py", "takeover_params.py", "takeover_planner.py", "actor_state.py",
+    "actor_registry.py", "hazard_monitor.py", "traffic.py", "traffic_lights.py", "capture_profiles.py",
+    "driver_input.py", "output_manager.py",
+]
+KINEMATIC_FILES = ["kinematic_carla.py"]
+ASSET_FILES = [os.path.join("CARLA_0.9.16", "CarlaUE4.exe")]   # server build: size and mtime only
+REPRODUCIBLE_SOURCES = {"script"}     # inputs.csv sources a repeat run replays by itself
+MAX_BYTES = float(os.environ.get("CARLA_CACHE_MAX_MB", "2048")) * 2**20
+BUSY_TIMEOUT_S = 30
+
+_file_hashes = {}                # path -> ((mtime, size), digest)
+
+
+# ---------------------------------------------------------
+# Fingerprint
+# ---------------------------------------------------------
+def _file_hash(path, content=True):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _file_hashes.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    if content:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    else:
+        digest = f"{st.st_size}-{st.st_mtime_ns}"     # GBs: not worth reading
+    _file_hashes[path] = (stamp, digest)
+    return digest
+
+
+def _script_events(inputs):
+    """A driver input script (CSV path or (t, name) list) as a sorted [[t, name]] list; None for none."""
+    from driver_input import ScriptedSource
+
+    if inputs is None:
+        return None
+    if not isinstance(inputs, (str, list, tuple)):
+        raise TypeError(f"Cannot fingerprint inputs of type {type(inputs).__name__}; "
+                        "pass a script path or a list of (t, name) events.")
+    return sorted([float(t), str(name)] for t, name in ScriptedSource(inputs).events)
+
+
+def fingerprint(scenario_id, town, driver_class, capture=None, traffic=None, inputs=None,
+                backend="carla"):
+    """
+    (key, parts): the hex key of a run's inputs and the dict it was hashed
+    from. inputs is a script path or a list of (t, name) events; both are
+    hashed by their events, so the same script gives the same key either way.
+    """
+    from traffic import TRAFFIC_SEED, parse_traffic
+
+    profile_name, profile = resolve_profile(capture)
+    sources = SOURCE_FILES + (KINEMATIC_FILES if backend == "kinematic" else [])
+    parts = {
+        "scenario_id": int(scenario_id),
+        "town": town,
+        "driver_class": driver_class,
+        "capture": [profile_name, profile],
+        "traffic": list(parse_traffic(traffic)),
+        "traffic_seed": TRAFFIC_SEED,
+        "inputs": _script_events(inputs),
+        "backend": backend,
+        "sources": {name: _file_hash(os.path.join(BASE_DIR, name)) for name in sources},
+        "assets": {name: _file_hash(os.path.join(BASE_DIR, name), content=False) for name in ASSET_FILES},
+    }
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:32], parts
+
+
+def reproducible(run_path):
+    """True if every driver input the run saw came from a script (or there was none)."""
+    try:
+        with open(os.path.join(run_path, "inputs.csv"), newline="") as f:
+            rows = f.read().splitlines()[1:]
+    except OSError:
+        return False
+    return all(row.split(",")[2] in REPRODUCIBLE_SOURCES for row in rows if row)
+
+
+# ---------------------------------------------------------
+# Store
+# ---------------------------------------------------------
+def cache_path(output_root):
+    return os.path.join(output_root, CACHE_FILE)
+
+
+def connect(output_root):
+    os.makedirs(output_root, exist_ok=True)
+    conn = sqlite3.connect(cache_path(output_root), timeout=BUSY_TIMEOUT_S)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, path TEXT, "
+                 "scenario_id INTEGER, town TEXT, driver_class TEXT, parts TEXT, size_bytes INTEGER, "
+                 "created REAL, last_used REAL, hits INTEGER DEFAULT 0)")
+    return conn
+
+
+def lookup(output_root, key):
+    """The cached run folder for key, or None. Entries whose folder is gone are dropped."""
+    if not os.path.exists(cache_path(output_root)):
+        return None
+    with connect(output_root) as conn:
+        row = conn.execute("SELECT path FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            path = None
+        else:
+            path = os.path.join(output_root, row["path"])
+            if read_manifest(path) is None:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                path = None
+            else:
+                conn.execute("UPDATE results SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                             (time.time(), key))
+    conn.close()
+    return path
+
+
+def store(output_root, key, run_path, parts):
+    """Remember run_path as the result of key; False if the run is not reproducible."""
+    if read_manifest(run_path) is None or not reproducible(run_path):
+        return False
+    now = time.time()
+    with connect(output_root) as conn:
+        conn.execute("INSERT OR REPLACE INTO results (key, path, scenario_id, town, driver_class, parts, "
+                     "size_bytes, created, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (key, os.path.relpath(run_path, output_root), parts["scenario_id"], parts["town"],
+                      parts["driver_class"], json.dumps(parts, default=str), dir_size(run_path), now, now))
+    conn.close()
+    evict(output_root)
+    return True
+
+
+def entries(output_root):
+    """Cached results as dicts, most recently used first."""
+    if not os.path.exists(cache_path(output_root)):
+        return []
+    conn = connect(output_root)
+    try:
+        return [dict(r) for r in conn.execute("SELECT * FROM results ORDER BY last_used DESC")]
+    finally:
+        conn.close()
+
+
+def invalidate(output_root, scenario_id=None, town=None, driver_class=None, everything=False):
+    """Forget matching entries (their run folders stay). Returns how many were dropped."""
+    clauses, args = [], []
+    for column, value in (("scenario_id", scenario_id), ("town", town), ("driver_class", driver_class)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            args.append(value)
+    if not clauses and not everything:
+        raise ValueError("Pass a filter, or everything=True to clear the whole cache.")
+    if not os.path.exists(cache_path(output_root)):
+        return 0
+    sql = "DELETE FROM results" + (" WHERE " + " AND ".join(clauses) if clauses else "")
+    with connect(output_root) as conn:
+        dropped = conn.execute(sql, args).rowcount
+    conn.close()
+    return dropped
+
+
+def evict(output_root, max_bytes=MAX_BYTES):
+    """Delete least recently used cached runs until the rest fit in max_bytes. Returns their paths."""
+    rows = entries(output_root)
+    total = sum(r["size_bytes"] or 0 for r in rows)
+    doomed = []
+    while rows and total > max_bytes:
+        row = rows.pop()
+        total -= row["size_bytes"] or 0
+        doomed.append(row)
+    if not doomed:
+        return []
+
+    from run_index import remove_runs
+
+    paths = [os.path.join(output_root, r["path"]) for r in doomed]
+    with connect(output_root) as conn:
+        conn.executemany("DELETE FROM results WHERE key = ?", [(r["key"],) for r in doomed])
+    conn.close()
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+    remove_runs(output_root, paths)
+    return paths
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect and prune the simulation result cache.")
+    parser.add_argument("--output", default="output")
+    parser.add_argument("--list", action="store_true")
+    parser.add_argument("--invalidate", action="store_true", help="forget the entries matching the filters")
+    parser.add_argument("--all", action="store_true", help="with --invalidate: every entry")
+    parser.add_argument("--scenario", type=int)
+    parser.add_argument("--town")
+    parser.add_argument("--driver-class")
+    parser.add_argument("--evict", action="store_true", help="delete LRU cached runs over --max-mb")
+    parser.add_argument("--max-mb", type=float, default=MAX_BYTES / 2**20)
+    args = parser.parse_args()
+
+    if args.invalidate:
+        if not (args.all or args.scenario or args.town or args.driver_class):
+            parser.error("--invalidate needs --scenario, --town, --driver-class or --all")
+        dropped = invalidate(args.output, args.scenario, args.town, args.driver_class, everything=args.all)
+        print(f"Invalidated {dropped} cached result(s)")
+    if args.evict:
+        evicted = evict(args.output, args.max_mb * 2**20)
+        print(f"Evicted {len(evicted)} cached run(s)")
+    if args.list or not (args.invalidate or args.evict):
+        rows = entries(args.output)
+        print(f"{'key':<12} {'scenario':>8} {'town':<7} {'driver class':<20} {'MB':>7} {'hits':>5}  last used")
+        for r in rows:
+            print(f"{r['key'][:12]:<12} {r['scenario_id']:>8} {r['town']:<7} {r['driver_class']:<20} "
+                  f"{(r['size_bytes'] or 0) / 2**20:>7.1f} {r['hits']:>5}  "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(r['last_used']))}")
+        print(f"\n{len(rows)} cached result(s), {sum(r['size_bytes'] or 0 for r in rows) / 2**20:.1f} MB")
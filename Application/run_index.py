@@ -0,0 +1,261 @@
+import csv
+import math
+import os
+import sqlite3
+import subprocess
+
+from output_manager import list_runs, read_manifest
+from replay import STATES_FILE
+
+# ---------------------------------------------------------
+# SQLite Run Index
+# ---------------------------------------------------------
+# run_scenario summarises every run as it finalizes (takeover time, time
+# and distance to stop, peak brake, closest NPC gap, ...), stores the
+# summary in the run's manifest.json and inserts one row into
+# <output_root>/runs.sqlite. Cross-run questions become one query instead
+# of opening every controls.csv:
+#
+#     python run_index.py --state critical_ai_takeover --town Town04 --min-stop-s 6
+#     python run_index.py --where "min_npc_gap_m < 3" --limit 20
+#     python run_index.py --rebuild        # (re)index every finished run on disk
+#
+# The index is only a cache of the manifests: --rebuild recreates it, and
+# runs removed by apply_retention are dropped from it. WAL mode and a busy
+# timeout let parallel_runner's processes insert at the same time.
+
+INDEX_FILE = "runs.sqlite"
+STOP_SPEED_KMH = 1.0             # below this the vehicle counts as stopped
+BUSY_TIMEOUT_S = 30
+
+COLUMNS = [
+    ("path", "TEXT PRIMARY KEY"),          # relative to output_root
+    ("label", "TEXT"),
+    ("scenario_id", "INTEGER"),
+    ("town", "TEXT"),
+    ("driver_class", "TEXT"),
+    ("final_state", "TEXT"),
+    ("started", "REAL"),
+    ("finished", "REAL"),
+    ("duration_s", "REAL"),
+    ("frames", "INTEGER"),
+    ("takeover_s", "REAL"),                # scenario time the takeover began
+    ("stop_time_s", "REAL"),               # takeover -> standstill
+    ("stopping_distance_m", "REAL"),
+    ("peak_brake", "REAL"),
+    ("max_speed_kmh", "REAL"),
+    ("min_npc_gap_m", "REAL"),
+    ("reaction_time_s", "REAL"),
+    ("world_reused", "INTEGER"),
+    ("capture_profile", "TEXT"),
+    ("carla_backend", "TEXT"),
+    ("code_version", "TEXT"),
+]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+_INSERT = (f"INSERT OR REPLACE INTO runs ({', '.join(COLUMN_NAMES)}) "
+           f"VALUES ({', '.join('?' * len(COLUMN_NAMES))})")
+SUMMARY_FIELDS = [
+    "duration_s", "takeover_s", "stop_time_s", "stopping_distance_m",
+    "peak_brake", "max_speed_kmh", "min_npc_gap_m",
+]
+
+_code_version = None
+
+
+def code_version():
+    """git describe of the checkout (cached per process), or CODE_VERSION / "unknown"."""
+    global _code_version
+    if _code_version is None:
+        try:
+            out = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                                 text=True, timeout=10, cwd=os.path.dirname(os.path.abspath(__file__)))
+            _code_version = out.stdout.strip() if out.returncode == 0 else ""
+        except (OSError, subprocess.SubprocessError):
+            _code_version = ""
+        _code_version = _code_version or os.environ.get("CODE_VERSION", "unknown")
+    return _code_version
+
+
+# ---------------------------------------------------------
+# Run Summary
+# ---------------------------------------------------------
+def _floats(row, prefix):
+    try:
+        return [float(row[f"{prefix}_{k}"]) for k in ("x", "y", "z", "vx", "vy", "vz")]
+    except (KeyError, ValueError):
+        return None
+
+
+def summarize(run_path, takeover_s=None):
+    """Summary metrics of a run from its states.csv and controls.csv (None where not applicable)."""
+    summary = dict.fromkeys(SUMMARY_FIELDS)
+    summary["takeover_s"] = takeover_s
+
+    peak_brake = None
+    try:
+        with open(os.path.join(run_path, "controls.csv"), newline="") as f:
+            for row in csv.DictReader(f):
+                brake = float(row["brake"])
+                peak_brake = brake if peak_brake is None else max(peak_brake, brake)
+    except (OSError, KeyError, ValueError):
+        pass
+    summary["peak_brake"] = peak_brake
+
+    try:
+        with open(os.path.join(run_path, STATES_FILE), newline="") as f:
+            rows = list(csv.DictReader(f))
+    except OSError:
+        return summary
+    if not rows:
+        return summary
+
+    max_speed, min_gap, distance, prev = 0.0, None, 0.0, None
+    for row in rows:
+        t = float(row["t"])
+        ego = _floats(row, "ego")
+        if ego is None:
+            continue
+        speed = math.sqrt(ego[3]**2 + ego[4]**2 + ego[5]**2) * 3.6
+        max_speed = max(max_speed, speed)
+
+        npc = _floats(row, "npc")
+        if npc is not None:
+            gap = math.dist(ego[:3], npc[:3])
+            min_gap = gap if min_gap is None else min(min_gap, gap)
+
+        if takeover_s is not None and t >= takeover_s and summary["stop_time_s"] is None:
+            if prev is not None and prev[0] >= takeover_s:
+                distance += math.dist(prev[1][:3], ego[:3])
+            if speed < STOP_SPEED_KMH:
+                summary["stop_time_s"] = t - takeover_s
+                summary["stopping_distance_m"] = distance
+        prev = (t, ego)
+
+    summary["duration_s"] = float(rows[-1]["t"])
+    summary["max_speed_kmh"] = max_speed
+    summary["min_npc_gap_m"] = min_gap
+    return summary
+
+
+# ---------------------------------------------------------
+# Index
+# ---------------------------------------------------------
+def index_path(output_root):
+    return os.path.join(output_root, INDEX_FILE)
+
+
+def connect(output_root):
+    os.makedirs(output_root, exist_ok=True)
+    conn = sqlite3.connect(index_path(output_root), timeout=BUSY_TIMEOUT_S)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS runs ({', '.join(f'{n} {t}' for n, t in COLUMNS)})")
+    conn.execute("CREATE INDEX IF NOT EXISTS runs_lookup ON runs (final_state, town, scenario_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS runs_finished ON runs (finished)")
+    return conn
+
+
+def _row(output_root, run_path, manifest):
+    summary = manifest.get("summary") or summarize(run_path)
+    values = {**manifest, **summary, "path": os.path.relpath(run_path, output_root)}
+    if values.get("world_reused") is not None:
+        values["world_reused"] = int(values["world_reused"])
+    return [values.get(name) for name in COLUMN_NAMES]
+
+
+def add_run(output_root, run_path, manifest=None):
+    """Insert or replace one finished run. Returns False if it has no manifest yet."""
+    manifest = manifest or read_manifest(run_path)
+    if manifest is None:
+        return False
+    with connect(output_root) as conn:
+        conn.execute(_INSERT, _row(output_root, run_path, manifest))
+    conn.close()
+    return True
+
+
+def remove_runs(output_root, run_paths):
+    if not run_paths or not os.path.exists(index_path(output_root)):
+        return
+    with connect(output_root) as conn:
+        conn.executemany("DELETE FROM runs WHERE path = ?",
+                         [(os.path.relpath(p, output_root),) for p in run_paths])
+    conn.close()
+
+
+def rebuild(output_root):
+    """Drop the index and re-add every finished run from its manifest. Returns the count."""
+    runs = [r for r in list_runs(output_root) if r["manifest"] is not None]
+    with connect(output_root) as conn:
+        conn.execute("DELETE FROM runs")
+        conn.executemany(_INSERT, [_row(output_root, r["path"], r["manifest"]) for r in runs])
+    conn.close()
+    return len(runs)
+
+
+def query(output_root, scenario_id=None, town=None, final_state=None, driver_class=None,
+          min_stop_s=None, where=None, params=(), order="finished DESC", limit=None):
+    """
+    Indexed runs as dicts (path made absolute again), newest first. The
+    keyword filters are ANDed with an optional raw SQL `where` clause.
+    """
+    if not os.path.exists(index_path(output_root)):
+        return []
+    clauses, args = [], []
+    for column, value in (("scenario_id", scenario_id), ("town", town),
+                          ("final_state", final_state), ("driver_class", driver_class)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            args.append(value)
+    if min_stop_s is not None:
+        clauses.append("stop_time_s > ?")
+        args.append(min_stop_s)
+    if where:
+        clauses.append(f"({where})")
+        args.extend(params)
+
+    sql = "SELECT * FROM runs"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {order}"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+
+    conn = connect(output_root)
+    try:
+        rows = [dict(r) for r in conn.execute(sql, args)]
+    finally:
+        conn.close()
+    for row in rows:
+        row["path"] = os.path.join(output_root, row["path"])
+    return rows
+
+
+def _fmt(value, spec=".2f"):
+    return "-" if value is None else format(value, spec)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the SQLite index of scenario runs.")
+    parser.add_argument("--output", default="output")
+    parser.add_argument("--rebuild", action="store_true", help="re-index every finished run first")
+    parser.add_argument("--scenario", type=int)
+    parser.add_argument("--town")
+    parser.add_argument("--state", help="final state, e.g. critical_ai_takeover")
+    parser.add_argument("--min-stop-s", type=float, help="takeover-to-stop time above this")
+    parser.add_argument("--where", help="extra SQL condition on the runs table")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f"Indexed {rebuild(args.output)} run(s) into {index_path(args.output)}")
+    rows = query(args.output, args.scenario, args.town, args.state, min_stop_s=args.min_stop_s,
+                 where=args.where, limit=args.limit)
+    print(f"{'label':<48} {'takeover':>8} {'stop s':>7} {'stop m':>7} {'brake':>6} {'npc m':>6}  version")
+    for r in rows:
+        print(f"{r['label']:<48} {_fmt(r['takeover_s']):>8} {_fmt(r['stop_time_s']):>7} "
+              f"{_fmt(r['stopping_distance_m'], '.1f'):>7} {_fmt(r['peak_brake']):>6} "
+              f"{_fmt(r['min_npc_gap_m'], '.1f'):>6}  {r['code_version']}")
+    print(f"\n{len(rows)} run(s)")
@@ -0,0 +1,358 @@
+import glob
+import json
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Listener
+
+import psutil
+
+from driver_input import ScriptedSource, default_input
+from frame_store import thumbnail_from_image
+from loop_profiler import Tracer, NULL_TRACER
+
+# ---------------------------------------------------------
+# Background Simulation Worker
+# ---------------------------------------------------------
+# start_worker() runs one scenario in its own process. The worker wraps
+# run_scenario with a TelemetryPublisher (a loop_profiler.Tracer) that
+# serves throttled snapshots over a multiprocessing.connection socket on
+# 127.0.0.1:
+#
+#     {"type": "sample", "t", "steer", "throttle", "brake", "speed", "frame"}
+#     {"type": "event", "name", ...}        # warning / takeover / driver_ok / run_end / done / error
+#     {"type": "thumbnail", "t", "rgb"}      # small uint8 array, THUMBNAIL_HZ
+#
+# Subscribers can send {"type": "input", "name": "ok"} back (the
+# dashboard's OK button); it reaches the run's DriverInput as a
+# "dashboard" event, timestamped on arrival.
+#
+# Every worker registers itself in <output_root>/workers/<run_id>.json, so
+# any dashboard can list_workers() and Subscriber() to several runs at
+# once. The simulation thread never blocks on subscribers: samples are
+# conflated to the newest one and a sender thread ships them.
+
+SNAPSHOT_HZ = 5
+THUMBNAIL_HZ = 1
+THUMBNAIL_WIDTH = 160
+EVENT_HISTORY = 200              # events replayed to late subscribers
+SUBSCRIBER_WAIT = 10.0           # s the worker waits for its first subscriber
+WORKERS_DIR = "workers"
+
+
+class TelemetryPublisher(Tracer):
+    def __init__(self, info, snapshot_hz=SNAPSHOT_HZ, thumbnail_hz=THUMBNAIL_HZ, inputs=None):
+        self.info = info
+        self.inputs = inputs
+        self.authkey = secrets.token_bytes(16)
+        self.listener = Listener(("127.0.0.1", 0), authkey=self.authkey)
+        self.address = self.listener.address
+
+        self._period = 1.0 / snapshot_hz
+        self._thumb_period = 1.0 / thumbnail_hz
+        self._next_thumb = 0.0
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._connected = threading.Event()
+        self._history = deque(maxlen=EVENT_HISTORY)
+        self._pending = []
+        self._sample = None
+        self._thumbnail = None
+        self._frame = None
+        self._closed = threading.Event()
+
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        self._sender = threading.Thread(target=self._send_loop, daemon=True)
+        self._sender.start()
+
+    # -----------------------------------------------------
+    # Tracer interface (called from the simulation loop)
+    # -----------------------------------------------------
+    def span(self, name):
+        return NULL_TRACER.span(name)
+
+    def event(self, name, **args):
+        msg = {"type": "event", "name": name, "wall": time.time(), **args}
+        with self._lock:
+            self._history.append(msg)
+            self._pending.append(msg)
+
+    def sample(self, t, steer, throttle, brake, speed):
+        self._sample = {"type": "sample", "t": t, "steer": steer, "throttle": throttle,
+                        "brake": brake, "speed": speed, "frame": self._frame}
+
+    def tick_done(self, frame):
+        self._frame = frame
+
+    def sensor_frame(self, frame, sim_time, image=None):
+        now = time.monotonic()
+        if image is not None and now >= self._next_thumb:
+            self._next_thumb = now + self._thumb_period
+            self._thumbnail = {"type": "thumbnail", "t": sim_time, "rgb": thumbnail_from_image(image, THUMBNAIL_WIDTH)}
+
+    # -----------------------------------------------------
+    # Connections
+    # -----------------------------------------------------
+    def wait_for_subscriber(self, timeout=SUBSCRIBER_WAIT):
+        return self._connected.wait(timeout)
+
+    def _accept_loop(self):
+        while not self._closed.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError):
+                if self._closed.is_set():
+                    return
+                continue
+            with self._lock:
+                try:
+                    conn.send([{"type": "hello", **self.info}] + list(self._history))
+                except (OSError, EOFError):
+                    continue
+                self._subscribers.append(conn)
+            if self.inputs is not None:
+                threading.Thread(target=self._receive_loop, args=(conn,), daemon=True).start()
+            self._connected.set()
+
+    def _receive_loop(self, conn):
+        while not self._closed.is_set():
+            try:
+                msg = conn.recv()
+            except (OSError, EOFError, TypeError):
+                return   # TypeError: the connection was closed under a blocked recv
+            if isinstance(msg, dict) and msg.get("type") == "input":
+                self.inputs.push(msg.get("name", "ok"), "dashboard")
+
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if self._sample is not None:
+            batch.append(self._sample)
+            self._sample = None
+        if self._thumbnail is not None:
+            batch.append(self._thumbnail)
+            self._thumbnail = None
+        if not batch:
+            return
+
+        with self._lock:
+            for conn in list(self._subscribers):
+                try:
+                    conn.send(batch)
+                except (OSError, EOFError):
+                    self._subscribers.remove(conn)
+                    conn.close()
+
+    def _send_loop(self):
+        while not self._closed.wait(self._period):
+            self._flush()
+        self._flush()
+
+    def close(self):
+        self._closed.set()
+        self._sender.join()
+        self.listener.close()
+        with self._lock:
+            for conn in self._subscribers:
+                conn.close()
+            self._subscribers = []
+
+
+# ---------------------------------------------------------
+# Worker Registry
+# ---------------------------------------------------------
+def _registry_path(output_root, run_id):
+    return os.path.join(output_root, WORKERS_DIR, f"{run_id}.json")
+
+
+def _write_registry(output_root, run_id, entry):
+    from output_manager import write_json_atomic
+    os.makedirs(os.path.join(output_root, WORKERS_DIR), exist_ok=True)
+    write_json_atomic(_registry_path(output_root, run_id), entry)
+
+
+def list_workers(output_root="output", include_finished=False):
+    """Registry entries of workers on this machine, newest first. Dead workers are skipped."""
+    entries = []
+    for path in glob.glob(os.path.join(output_root, WORKERS_DIR, "*.json")):
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            continue
+        running = entry["status"] == "running" and psutil.pid_exists(entry["pid"])
+        if running or (include_finished and entry["status"] != "running"):
+            entries.append(entry)
+    entries.sort(key=lambda e: e["started"], reverse=True)
+    return entries
+
+
+# ---------------------------------------------------------
+# Worker Process
+# ---------------------------------------------------------
+def _worker_main(job, output_root, backend, ready):
+    if backend == "kinematic":
+        import kinematic_carla
+        kinematic_carla.install()
+        os.environ.setdefault("CARLA_SIM_MUTE", "1")
+
+    from carla_simulation import run_scenario
+    import result_cache
+
+    run_id = job["run_id"]
+    inputs = default_input()
+    if job.get("inputs"):
+        inputs.add_source(ScriptedSource(job["inputs"]))
+    publisher = TelemetryPublisher({"run_id": run_id, **job}, inputs=inputs)
+    entry = {
+        **job, "pid": os.getpid(), "status": "running", "started": time.time(),
+        "address": list(publisher.address), "authkey": publisher.authkey.hex(), "backend": backend,
+    }
+    _write_registry(output_root, run_id, entry)
+    ready.put(entry)
+    publisher.wait_for_subscriber()
+
+    server = None
+    try:
+        if job.get("cache"):
+            key, parts = result_cache.fingerprint(job["scenario_id"], job["town"], job["driver_class"],
+                                                  job.get("capture"), inputs=job.get("inputs"),
+                                                  backend=backend)
+            folder = result_cache.lookup(output_root, key)
+            if folder is not None:
+                entry.update(status="done", folder=os.path.abspath(folder), cached=True)
+                publisher.event("cache_hit", folder=entry["folder"])
+                publisher.event("done", folder=entry["folder"])
+                return
+
+        if backend == "kinematic":
+            client = kinematic_carla.Client()
+            clock, tm_port = client.clock, None
+        else:
+            import carla
+            from carla_simulation import CARLA_HOST
+            from parallel_runner import allocate_ports, launch_carla_server, wait_for_port
+
+            slot = allocate_ports(1)[0]
+            publisher.event("server_starting", rpc_port=slot["rpc_port"])
+            server = launch_carla_server(slot)
+            if not wait_for_port(slot["rpc_port"]):
+                raise RuntimeError(f"CARLA did not open port {slot['rpc_port']}")
+            client = carla.Client(CARLA_HOST, slot["rpc_port"])
+            client.set_timeout(60.0)
+            clock, tm_port = time, slot["tm_port"]
+
+        kwargs = {"output_root": output_root, "clock": clock, "tracer": publisher,
+                  "capture": job.get("capture"), "inputs": inputs}
+        if tm_port is not None:
+            kwargs["tm_port"] = tm_port
+        folder = run_scenario(client, job["town"], job["scenario_id"], job["driver_class"], **kwargs)
+        if job.get("cache"):
+            result_cache.store(output_root, key, folder, parts)
+
+        entry.update(status="done", folder=os.path.abspath(folder))
+        publisher.event("done", folder=entry["folder"])
+    except Exception as e:
+        entry.update(status="failed", error=str(e))
+        publisher.event("error", message=str(e))
+    finally:
+        if server is not None:
+            from parallel_runner import stop_server
+            stop_server(server)
+        entry["finished"] = time.time()
+        _write_registry(output_root, run_id, entry)
+        publisher.close()
+
+
+def start_worker(scenario_id, town, driver_class, output_root="output", backend="carla",
+                 capture=None, inputs=None, timeout=30.0, cache=False):
+    """
+    Launch a scenario in a background process. Returns (process, registry
+    entry); pass the entry to Subscriber to receive its telemetry.
+    inputs: optional "t,name" script (see driver_input.py).
+    cache: return an identical earlier run instead of simulating, and
+    store this one (see result_cache.py).
+    """
+    job = {
+        "run_id": f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}",
+        "scenario_id": scenario_id, "town": town, "driver_class": driver_class, "capture": capture,
+        "inputs": inputs, "cache": cache,
+    }
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    process = ctx.Process(target=_worker_main, args=(job, output_root, backend, ready), daemon=True)
+    process.start()
+    return process, ready.get(timeout=timeout)
+
+
+# ---------------------------------------------------------
+# Subscriber
+# ---------------------------------------------------------
+class Subscriber:
+    """Client side of a worker's channel. poll() never blocks."""
+
+    def __init__(self, entry, history=3000):
+        self.entry = entry
+        self.run_id = entry["run_id"]
+        self.conn = Client(tuple(entry["address"]), authkey=bytes.fromhex(entry["authkey"]))
+        self.samples = deque(maxlen=history)
+        self.events = []
+        self.latest = None
+        self.thumbnail = None
+        self.phase = "starting"
+        self.folder = None
+        self.closed = False
+
+    def poll(self):
+        """Apply every message waiting on the channel; returns how many arrived."""
+        count = 0
+        while not self.closed:
+            try:
+                if not self.conn.poll():
+                    break
+                batch = self.conn.recv()
+            except (OSError, EOFError):
+                self.close()
+                break
+            for msg in batch:
+                self._apply(msg)
+                count += 1
+        return count
+
+    def _apply(self, msg):
+        kind = msg["type"]
+        if kind == "sample":
+            self.latest = msg
+            self.samples.append(msg)
+            if self.phase == "starting":
+                self.phase = "driving"
+        elif kind == "thumbnail":
+            self.thumbnail = msg["rgb"]
+        elif kind == "event":
+            self.events.append(msg)
+            if msg["name"] in ("warning", "driver_ok", "takeover"):
+                self.phase = msg["name"]
+            elif msg["name"] == "done":
+                self.phase = "done"
+                self.folder = msg["folder"]
+            elif msg["name"] == "error":
+                self.phase = "failed"
+
+    def send_input(self, name="ok"):
+        """Press a driver button in the worker's run (e.g. the OK button)."""
+        if self.closed:
+            return False
+        try:
+            self.conn.send({"type": "input", "name": name})
+        except (OSError, EOFError):
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.conn.close()
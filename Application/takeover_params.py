@@ -0,0 +1,47 @@
+# ---------------------------------------------------------
+# Takeover Parameters
+# ---------------------------------------------------------
+# Timing, distance and gain constants used by the scenario controllers in
+# carla_simulation.py. They live here so takeover_sweep.py evaluates the
+# exact values the controllers run with.
+
+# Scenarios 1 & 2: critical drowsiness
+WARNING_DELAY = 5.0            # s after start before the critical warning
+OK_WINDOW = 3.0                # s the driver has to press OK
+
+# Scenario 1: urban stop
+S1_CRUISE_SPEED = 30.0         # km/h
+S1_SLOWDOWN_DURATION = 5.0     # s from takeover to standstill
+
+# Scenario 2: highway shoulder stop
+S2_CRUISE_SPEED = 90.0         # km/h
+S2_LOOKAHEAD_CENTERED = 10.0   # m, once centred in the target lane
+S2_LOOKAHEAD_CHANGE = 12.0     # m, while changing lanes / centring
+S2_GAIN_CENTERED = 0.2         # steer per rad of heading error
+S2_GAIN_CENTERING = 0.6
+S2_GAIN_CHANGING = 0.4
+S2_STEER_LIMIT = 0.5
+S2_STOP_DURATION_IN_LANE = 6.0
+S2_STOP_DURATION_CHANGING = 10.0
+S2_TRACKER = "stanley"         # or "lookahead": the per-tick waypoint steering (gains above)
+S2_CHANGE_PER_LANE = 30.0      # m of road per lane crossed on the planned path
+S2_CHANGE_MIN = 25.0           # m
+S2_STANLEY_GAIN = 1.5          # cross-track gain, 1/s
+S2_STANLEY_SOFTENING = 2.0     # m/s, keeps the cross-track term finite near standstill
+S2_HOLD_BRAKE = 0.5            # brake once the planned stop is reached
+
+# Scenario 5: red light
+S5_CRUISE_SPEED = 40.0         # km/h
+S5_WARNING_TIME = 9.5          # s
+S5_OK_WINDOW = 2.0             # s
+S5_STOP_DURATION = 2.0         # s
+S5_MAX_BRAKE = 0.4
+
+# Scenario 6: oncoming vehicle
+S6_CRUISE_SPEED = 90.0         # km/h
+S6_WARNING_DISTANCE = 50.0     # m
+S6_DRIFT_DISTANCE = 40.0       # m
+S6_EVADE_DISTANCE = 25.0       # m
+S6_EVADE_STEER = 0.012
+S6_RETURN_STEER = -0.0017
+S6_NPC_DRIFT_STEER = -0.0135
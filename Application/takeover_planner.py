@@ -0,0 +1,231 @@
+import math
+
+import numpy as np
+
+from takeover_params import (
+    S2_CHANGE_MIN, S2_CHANGE_PER_LANE, S2_STANLEY_GAIN, S2_STANLEY_SOFTENING, S2_STEER_LIMIT,
+    S2_STOP_DURATION_CHANGING, S2_STOP_DURATION_IN_LANE,
+)
+
+# ---------------------------------------------------------
+# Planned Shoulder Stop (Scenario 2 Takeover)
+# ---------------------------------------------------------
+# plan_takeover() runs once, on the tick the AI takes over. It walks the
+# road ahead every PATH_SAMPLE m (waypoint.next plus a walk to the
+# rightmost driving / shoulder lane, the only map queries of the
+# maneuver) and builds the whole maneuver: a lane change to the shoulder
+# with a quintic lateral blend, then the stop, resampled every PATH_STEP
+# m with a target speed per point. The speed profile brakes gently
+# (S2_STOP_DURATION_CHANGING) while changing lanes and firmly
+# (S2_STOP_DURATION_IN_LANE) once in the target lane, as the per-tick
+# controller did.
+#
+# Each tick TakeoverPlan.track() finds the nearest path point in O(1):
+# the points are evenly spaced and the vehicle only moves forward, so
+# the along-path offset from the last point gives the index directly.
+# A Stanley law on the front axle turns heading and cross-track error
+# into steer:
+#
+#     plan = plan_takeover(world.get_map(), vehicle.get_transform(), speed_kmh)
+#     steer, target_kmh, stopped = plan.track(vehicle.get_transform(), speed_kmh)
+#
+#     python takeover_planner.py      # planned vs per-tick lookahead, on the stand-in
+#
+# scenario_2_control uses it unless takeover_params.S2_TRACKER is
+# "lookahead", the waypoint-per-tick steering it replaced.
+
+PATH_SAMPLE = 2.0                # m between waypoint queries while planning
+PATH_STEP = 0.5                  # m between points of the planned path
+FRONT_AXLE = 1.4                 # m ahead of the actor origin (Model 3)
+MAX_STEER_ANGLE = math.radians(70.0)   # front wheel angle at steer = 1.0
+
+
+def _target_lane_types():
+    import carla                 # imported late: CLI runs install the stand-in first
+    return carla.LaneType.Driving, carla.LaneType.Shoulder
+
+
+def _rightmost(wp, lane_types):
+    """(rightmost driving / shoulder lane next to wp, lanes crossed to get there)."""
+    lanes = 0
+    while True:
+        right = wp.get_right_lane()
+        if right is None or right.lane_type not in lane_types:
+            return wp, lanes
+        wp, lanes = right, lanes + 1
+
+
+def _blend(u):
+    # quintic smoothstep: zero lateral speed and acceleration at both ends
+    u = min(max(u, 0.0), 1.0)
+    return u * u * u * (10.0 - 15.0 * u + 6.0 * u * u)
+
+
+class TakeoverPlan:
+    """A planned path (x, y, yaw per point, PATH_STEP apart) with target speeds in m/s."""
+
+    def __init__(self, x, y, yaw, speed, target_lane_id, change_length):
+        self.x = x.tolist()
+        self.y = y.tolist()
+        self.yaw = yaw.tolist()
+        self.speed = speed.tolist()
+        self._cos = np.cos(yaw).tolist()
+        self._sin = np.sin(yaw).tolist()
+        self.target_lane_id = target_lane_id
+        self.change_length = change_length
+        self.length = PATH_STEP * (len(self.x) - 1)
+        self.cursor = 0
+
+    def __len__(self):
+        return len(self.x)
+
+    def nearest(self, x, y):
+        """Index of the path point nearest (x, y); never behind the previous one."""
+        i, last = self.cursor, len(self.x) - 1
+        along = (x - self.x[i]) * self._cos[i] + (y - self.y[i]) * self._sin[i]
+        i = min(max(i + int(round(along / PATH_STEP)), self.cursor), last)
+        # On a curve the projection can be a point short
+        while i < last and ((x - self.x[i + 1])**2 + (y - self.y[i + 1])**2
+                            < (x - self.x[i])**2 + (y - self.y[i])**2):
+            i += 1
+        self.cursor = i
+        return i
+
+    def track(self, transform, speed_kmh):
+        """(steer, target speed in km/h, stopped) for the vehicle at transform."""
+        yaw = math.radians(transform.rotation.yaw)
+        fx = transform.location.x + FRONT_AXLE * math.cos(yaw)
+        fy = transform.location.y + FRONT_AXLE * math.sin(yaw)
+        i = self.nearest(fx, fy)
+
+        heading = self.yaw[i] - yaw
+        heading = math.atan2(math.sin(heading), math.cos(heading))
+        # > 0: the path is to the right (CARLA's y points right, steer > 0 turns right)
+        cross = (fx - self.x[i]) * self._sin[i] - (fy - self.y[i]) * self._cos[i]
+        angle = heading + math.atan2(S2_STANLEY_GAIN * cross, S2_STANLEY_SOFTENING + speed_kmh / 3.6)
+        steer = max(-S2_STEER_LIMIT, min(S2_STEER_LIMIT, angle / MAX_STEER_ANGLE))
+        target = self.speed[i]
+        return steer, target * 3.6, target == 0.0
+
+
+def plan_takeover(carla_map, transform, speed_kmh):
+    """Plan the lane change to the rightmost lane and the stop, from transform at speed_kmh."""
+    v0 = max(speed_kmh / 3.6, 0.1)
+    lane_types = _target_lane_types()
+    start = carla_map.get_waypoint(transform.location)
+    target, lanes = _rightmost(start, lane_types)
+    # an off-centre start still gets a short blend back to the centre line
+    change = max(S2_CHANGE_MIN, lanes * S2_CHANGE_PER_LANE)
+
+    a_change = v0 / S2_STOP_DURATION_CHANGING
+    a_stop = v0 / S2_STOP_DURATION_IN_LANE
+    v1_sq = max(0.0, v0 * v0 - 2.0 * a_change * change)
+    length = change + v1_sq / (2.0 * a_stop) + PATH_SAMPLE
+
+    # Road samples: current lane centre (plus the start offset) blended into the rightmost lane
+    c0 = start.transform.location
+    dx, dy = transform.location.x - c0.x, transform.location.y - c0.y
+    xs, ys = [transform.location.x], [transform.location.y]
+    wp, s = start, 0.0
+    while s < length:
+        following = wp.next(PATH_SAMPLE)
+        if not following:
+            break                        # road ends: the stop is squeezed into what there is
+        wp, s = following[0], s + PATH_SAMPLE
+        c = wp.transform.location
+        r = _rightmost(wp, lane_types)[0].transform.location
+        b = _blend(s / change)
+        xs.append((1.0 - b) * (c.x + dx) + b * r.x)
+        ys.append((1.0 - b) * (c.y + dy) + b * r.y)
+
+    # Resample evenly by arc length, so the index of a point is its distance / PATH_STEP
+    xs, ys = np.array(xs), np.array(ys)
+    arc = np.concatenate(([0.0], np.cumsum(np.hypot(np.diff(xs), np.diff(ys)))))
+    s = np.arange(0.0, arc[-1] + 1e-9, PATH_STEP)
+    x, y = np.interp(s, arc, xs), np.interp(s, arc, ys)
+    if len(s) > 1:
+        yaw = np.arctan2(np.gradient(y), np.gradient(x))
+    else:
+        yaw = np.array([math.radians(transform.rotation.yaw)])
+
+    v_sq = v0 * v0 - 2.0 * a_change * np.minimum(s, change) - 2.0 * a_stop * np.maximum(s - change, 0.0)
+    speed = np.sqrt(np.clip(v_sq, 0.0, None))
+    speed = np.minimum(speed, np.sqrt(2.0 * a_stop * (s[-1] - s)))    # at rest by the end
+    speed[-1] = 0.0
+    return TakeoverPlan(x, y, yaw, speed, target.lane_id, change)
+
+
+# ---------------------------------------------------------
+# Planned vs Per-Tick Lookahead
+# ---------------------------------------------------------
+def _takeover_run(tracker, output_root):
+    import csv
+    import os
+    import time
+
+    import carla
+    import carla_simulation as cs
+
+    timings = []
+    control = cs.scenario_2_control
+
+    def timed(vehicle, t, *args):
+        start = time.perf_counter()
+        out = control(vehicle, t, *args)
+        if hasattr(vehicle, "takeover_start_time"):
+            timings.append(time.perf_counter() - start)
+        return out
+
+    cs.S2_TRACKER, cs.scenario_2_control = tracker, timed
+    try:
+        client = carla.Client("localhost", 2000)
+        folder = cs.run_scenario(client, "Town04", 2, "critical drowsiness", output_root=output_root,
+                                 clock=client.clock, capture="off")
+    finally:
+        cs.scenario_2_control = control
+
+    with open(os.path.join(folder, "controls.csv"), newline="") as f:
+        rows = [r for r in csv.DictReader(f)]
+    steer = np.array([float(r["steer"]) for r in rows])[-len(timings):]
+    rate = np.abs(np.diff(steer))
+    with open(os.path.join(folder, "states.csv"), newline="") as f:
+        last = list(csv.DictReader(f))[-1]
+    world_map = carla.Map("Town04")
+    final = world_map.get_waypoint(carla.Location(float(last["ego_x"]), float(last["ego_y"]), 0.0),
+                                   lane_type=carla.LaneType.Driving | carla.LaneType.Shoulder)
+    offset = math.hypot(float(last["ego_x"]) - final.transform.location.x,
+                        float(last["ego_y"]) - final.transform.location.y)
+    return {
+        "tracker": tracker,
+        "ticks": len(timings),
+        "us_per_tick": 1e6 * float(np.mean(timings[1:])) if len(timings) > 1 else float("nan"),
+        "first_tick_ms": 1e3 * timings[0] if timings else float("nan"),
+        "steer_rate_mean": float(rate.mean()),
+        "steer_rate_max": float(rate.max()),
+        "sign_changes": int(np.sum(np.diff(np.sign(steer[np.abs(steer) > 1e-3])) != 0)),
+        "final_lane": final.lane_id,
+        "final_offset_m": offset,
+        "final_speed_kmh": math.sqrt(float(last["ego_vx"])**2 + float(last["ego_vy"])**2) * 3.6,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Compare the planned takeover with per-tick lookahead steering.")
+    parser.add_argument("--output", default=os.path.join(tempfile.gettempdir(), "takeover_planner"))
+    args = parser.parse_args()
+
+    import kinematic_carla
+    kinematic_carla.install()
+    os.environ.setdefault("CARLA_SIM_MUTE", "1")
+
+    results = [_takeover_run(tracker, args.output) for tracker in ("lookahead", "stanley")]
+    print(f"\n{'tracker':<10} {'ticks':>5} {'us/tick':>8} {'plan ms':>8} {'dsteer avg':>10} "
+          f"{'dsteer max':>10} {'flips':>5} {'lane':>5} {'offset m':>8} {'end km/h':>8}")
+    for r in results:
+        print(f"{r['tracker']:<10} {r['ticks']:>5} {r['us_per_tick']:>8.1f} {r['first_tick_ms']:>8.2f} "
+              f"{r['steer_rate_mean']:>10.4f} {r['steer_rate_max']:>10.4f} {r['sign_changes']:>5} "
+              f"{r['final_lane']:>5} {r['final_offset_m']:>8.2f} {r['final_speed_kmh']:>8.1f}")
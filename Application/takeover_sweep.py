@@ -0,0 +1,529 @@
+import csv
+import itertools
+import math
+import time
+import warnings
+
+import numpy as np
+
+import takeover_params as tp
+from takeover_planner import FRONT_AXLE, PATH_SAMPLE
+from kinematic_carla import (
+    WHEELBASE, MAX_STEER, MAX_ACCEL, MAX_POWER_PER_KG, MAX_BRAKE, DRAG, ROLLING,
+)
+
+# ---------------------------------------------------------
+# Monte Carlo Sweep of Takeover Parameters
+# ---------------------------------------------------------
+# Re-implements the takeover logic of the scenario controllers with NumPy
+# arrays over a batch of simulated vehicles: one row per (parameter
+# combination, driver sample). Vehicle dynamics are the same kinematic
+# model kinematic_carla uses, so results line up with stand-in runs.
+#
+#     python takeover_sweep.py urban_stop --grid ok_window=2,3,4 \
+#         slowdown_duration=3,5,7 --samples 2000 --response lognormal:1.2,0.5
+#
+# Scenarios 1, 2 and 5 have no fixed obstacle or stop line in their
+# geometry, so hazard_distance (m from the warning point to the obstacle /
+# stop line) is unknown by default and min_gap / collision_rate are left
+# out. Give it with --grid to rate a particular layout:
+#
+#     python takeover_sweep.py red_light --grid hazard_distance=40,60,80
+
+DT = 0.05
+HORIZON = 30.0
+CHUNK_SIZE = 250_000       # vehicles simulated at once
+STOP_SPEED = 0.1           # m/s; below this a vehicle counts as stopped
+UNKNOWN = float("nan")     # hazard_distance not given: no gap metrics
+
+SCENARIOS = {
+    "urban_stop": {          # scenario 1, critical drowsiness
+        "warning_delay": tp.WARNING_DELAY,
+        "ok_window": tp.OK_WINDOW,
+        "slowdown_duration": tp.S1_SLOWDOWN_DURATION,
+        "cruise_speed": tp.S1_CRUISE_SPEED,
+        "hazard_distance": UNKNOWN,
+    },
+    "highway_shoulder": {    # scenario 2, critical drowsiness
+        "warning_delay": tp.WARNING_DELAY,
+        "ok_window": tp.OK_WINDOW,
+        "cruise_speed": tp.S2_CRUISE_SPEED,
+        "gain_centered": tp.S2_GAIN_CENTERED,
+        "gain_centering": tp.S2_GAIN_CENTERING,
+        "gain_changing": tp.S2_GAIN_CHANGING,
+        "steer_limit": tp.S2_STEER_LIMIT,
+        "lookahead_centered": tp.S2_LOOKAHEAD_CENTERED,
+        "lookahead_change": tp.S2_LOOKAHEAD_CHANGE,
+        "stop_duration_in_lane": tp.S2_STOP_DURATION_IN_LANE,
+        "stop_duration_changing": tp.S2_STOP_DURATION_CHANGING,
+        "stanley": float(tp.S2_TRACKER == "stanley"),    # 0: per-tick lookahead steering
+        "change_per_lane": tp.S2_CHANGE_PER_LANE,
+        "change_min": tp.S2_CHANGE_MIN,
+        "stanley_gain": tp.S2_STANLEY_GAIN,
+        "stanley_softening": tp.S2_STANLEY_SOFTENING,
+        "hold_brake": tp.S2_HOLD_BRAKE,
+        "lanes_to_shoulder": 3,
+        "lane_width": 3.5,
+        "hazard_distance": UNKNOWN,
+    },
+    "red_light": {           # scenario 5
+        "warning_time": tp.S5_WARNING_TIME,
+        "ok_window": tp.S5_OK_WINDOW,
+        "stop_duration": tp.S5_STOP_DURATION,
+        "max_brake": tp.S5_MAX_BRAKE,
+        "cruise_speed": tp.S5_CRUISE_SPEED,
+        "hazard_distance": UNKNOWN,
+    },
+    "oncoming": {            # scenario 6
+        "warning_distance": tp.S6_WARNING_DISTANCE,
+        "drift_distance": tp.S6_DRIFT_DISTANCE,
+        "evade_distance": tp.S6_EVADE_DISTANCE,
+        "evade_steer": tp.S6_EVADE_STEER,
+        "return_steer": tp.S6_RETURN_STEER,
+        "npc_drift_steer": tp.S6_NPC_DRIFT_STEER,
+        "cruise_speed": tp.S6_CRUISE_SPEED,
+        "npc_speed": 20.0,
+        "npc_start_gap": 120.0,
+        "lane_offset": 3.5,
+    },
+}
+
+METRICS = ["responded", "takeover", "stopping_distance", "stop_time",
+           "peak_decel", "min_gap", "peak_lateral_accel"]
+GAP_SUMMARY = ["min_gap_p5", "min_gap_min", "collision_rate"]
+
+
+# ---------------------------------------------------------
+# Driver Response Times
+# ---------------------------------------------------------
+def sample_response_times(spec, n, rng):
+    """
+    spec examples:
+        "lognormal:1.2,0.5"  median 1.2 s, log-sigma 0.5
+        "normal:1.5,0.4"     truncated at 0
+        "uniform:0.5,4"
+        "fixed:2.5"
+        "none"               driver never presses OK
+    """
+    kind, _, args = spec.partition(":")
+    vals = [float(a) for a in args.split(",")] if args else []
+
+    if kind == "lognormal":
+        return rng.lognormal(math.log(vals[0]), vals[1], n)
+    if kind == "normal":
+        return np.maximum(0.0, rng.normal(vals[0], vals[1], n))
+    if kind == "uniform":
+        return rng.uniform(vals[0], vals[1], n)
+    if kind == "fixed":
+        return np.full(n, vals[0])
+    if kind == "none":
+        return np.full(n, np.inf)
+    raise ValueError(f"Unknown response time distribution '{spec}'")
+
+
+# ---------------------------------------------------------
+# Vehicle Dynamics
+# ---------------------------------------------------------
+def _accel(v, throttle, brake):
+    drive = throttle * np.minimum(MAX_ACCEL, MAX_POWER_PER_KG / np.maximum(v, 1.0))
+    return drive - brake * MAX_BRAKE - DRAG * v * v - ROLLING * (v > 0)
+
+
+def _cruise(speed_kmh, cruise_kmh, throttle_on):
+    below = speed_kmh < cruise_kmh
+    return np.where(below, throttle_on, 0.0), np.where(below, 0.0, 0.2)
+
+
+def _new_metrics(n):
+    return {
+        "responded": np.zeros(n, dtype=bool),
+        "takeover": np.zeros(n, dtype=bool),
+        "stopping_distance": np.full(n, np.nan),
+        "stop_time": np.full(n, np.nan),
+        "peak_decel": np.zeros(n),
+        "min_gap": np.full(n, np.inf),
+        "peak_lateral_accel": np.zeros(n),
+    }
+
+
+def _record_stop(m, stopped_now, t, s, to_s, to_t):
+    # stopping_distance / stop_time stay NaN if the vehicle never comes to rest
+    newly = stopped_now & np.isnan(m["stopping_distance"])
+    m["stopping_distance"][newly] = s[newly] - to_s[newly]
+    m["stop_time"][newly] = t - to_t[newly]
+
+
+# ---------------------------------------------------------
+# Scenario Models
+# ---------------------------------------------------------
+def _simulate_urban_stop(p, rt, dt=DT, horizon=HORIZON):
+    n = rt.shape[0]
+    m = _new_metrics(n)
+    v = np.zeros(n)
+    s = np.zeros(n)
+    warn_s = np.full(n, np.nan)
+    to_t = np.full(n, np.nan)
+    to_s = np.full(n, np.nan)
+    to_v = np.zeros(n)
+
+    m["responded"] = rt < p["ok_window"]
+
+    for k in range(int(horizon / dt)):
+        t = k * dt
+        speed = v * 3.6
+        throttle, brake = _cruise(speed, p["cruise_speed"], 0.45)
+
+        warned = t >= p["warning_delay"]
+        warn_s = np.where(warned & np.isnan(warn_s), s, warn_s)
+
+        start = warned & ~m["responded"] & (t - p["warning_delay"] >= p["ok_window"]) & np.isnan(to_t)
+        to_t = np.where(start, t, to_t)
+        to_s = np.where(start, s, to_s)
+        to_v = np.where(start, speed, to_v)
+        active = ~np.isnan(to_t)
+        m["takeover"] |= active
+
+        # scenario_1_control: linear target-speed decay, proportional brake
+        initial = np.maximum(to_v, 1e-6)
+        target = np.maximum(0.0, initial - initial / p["slowdown_duration"] * (t - to_t))
+        over = speed > target
+        throttle = np.where(active, np.where(over, 0.0, 0.05), throttle)
+        brake = np.where(active, np.where(over, np.minimum(1.0, (speed - target) / initial), 0.0), brake)
+
+        a = _accel(v, throttle, brake)
+        v_new = np.maximum(0.0, v + a * dt)
+        m["peak_decel"] = np.maximum(m["peak_decel"], np.where(active, (v - v_new) / dt, 0.0))
+        v = v_new
+        s += v * dt
+
+        tracked = active & ~np.isnan(warn_s)
+        gap = p["hazard_distance"] - (s - warn_s)
+        m["min_gap"] = np.where(tracked, np.minimum(m["min_gap"], gap), m["min_gap"])
+        _record_stop(m, active & (v < STOP_SPEED), t, s, to_s, to_t)
+
+    m["min_gap"][~m["takeover"]] = np.nan
+    return m
+
+
+def _simulate_red_light(p, rt, dt=DT, horizon=HORIZON):
+    n = rt.shape[0]
+    m = _new_metrics(n)
+    v = np.zeros(n)
+    s = np.zeros(n)
+    warn_s = np.full(n, np.nan)
+    to_t = np.full(n, np.nan)
+    to_s = np.full(n, np.nan)
+    to_v = np.zeros(n)
+
+    # scenario_5_control: pressing OK only silences the alarm, the AI stop still runs
+    m["responded"] = rt < p["ok_window"]
+
+    for k in range(int(horizon / dt)):
+        t = k * dt
+        speed = v * 3.6
+        throttle, brake = _cruise(speed, p["cruise_speed"], 0.60)
+
+        warned = t >= p["warning_time"]
+        warn_s = np.where(warned & np.isnan(warn_s), s, warn_s)
+
+        start = warned & (t - p["warning_time"] >= p["ok_window"]) & np.isnan(to_t)
+        to_t = np.where(start, t, to_t)
+        to_s = np.where(start, s, to_s)
+        to_v = np.where(start, speed, to_v)
+        active = ~np.isnan(to_t)
+        m["takeover"] |= active
+
+        initial = np.maximum(to_v, 1e-6)
+        target = np.maximum(0.0, initial * (1 - (t - to_t) / p["stop_duration"]))
+        over = speed > target
+        throttle = np.where(active, 0.0, throttle)
+        brake = np.where(active, np.where(over, np.minimum(p["max_brake"], (speed - target) / initial),
+                                          p["max_brake"]), brake)
+
+        a = _accel(v, throttle, brake)
+        v_new = np.maximum(0.0, v + a * dt)
+        m["peak_decel"] = np.maximum(m["peak_decel"], np.where(active, (v - v_new) / dt, 0.0))
+        v = v_new
+        s += v * dt
+
+        gap = p["hazard_distance"] - (s - warn_s)
+        m["min_gap"] = np.where(warned, np.minimum(m["min_gap"], gap), m["min_gap"])
+        _record_stop(m, active & (v < STOP_SPEED), t, s, to_s, to_t)
+
+    return m
+
+
+def _simulate_highway_shoulder(p, rt, dt=DT, horizon=HORIZON):
+    n = rt.shape[0]
+    m = _new_metrics(n)
+    w = p["lane_width"]
+    x = np.zeros(n)
+    y = np.zeros(n)                       # 0 = centre of the starting lane, +y = right
+    yaw = np.zeros(n)
+    v = np.zeros(n)
+    y_target = p["lanes_to_shoulder"] * w
+    warn_x = np.full(n, np.nan)
+    to_t = np.full(n, np.nan)
+    to_x = np.full(n, np.nan)
+    to_y = np.zeros(n)
+    to_v = np.zeros(n)
+    stanley = p["stanley"] > 0.5
+    change = np.maximum(p["change_min"], p["lanes_to_shoulder"] * p["change_per_lane"])
+
+    m["responded"] = rt < p["ok_window"]
+
+    for k in range(int(horizon / dt)):
+        t = k * dt
+        speed = v * 3.6
+        throttle, brake = _cruise(speed, p["cruise_speed"], 0.55)
+        steer = np.zeros(n)
+
+        warned = t >= p["warning_delay"]
+        warn_x = np.where(warned & np.isnan(warn_x), x, warn_x)
+
+        start = warned & ~m["responded"] & (t - p["warning_delay"] >= p["ok_window"]) & np.isnan(to_t)
+        to_t = np.where(start, t, to_t)
+        to_x = np.where(start, x, to_x)
+        to_y = np.where(start, y, to_y)
+        to_v = np.where(start, speed, to_v)
+        active = ~np.isnan(to_t)
+        m["takeover"] |= active
+        planned = active & stanley
+        active = active & ~stanley
+
+        # scenario_2_control: lane lookup, lookahead point, heading-error gains
+        lane_center = np.round(y / w) * w
+        lateral = np.abs(y - lane_center)
+        in_target = np.abs(lane_center - y_target) < 1e-6
+        centered = in_target & (lateral < w * 0.5)
+        lookahead = np.where(centered, p["lookahead_centered"], p["lookahead_change"])
+        target_y = np.where(centered, lane_center, y_target)
+        angle = np.arctan2(target_y - y, lookahead) - yaw
+        angle = np.arctan2(np.sin(angle), np.cos(angle))
+        gain = np.where(centered, p["gain_centered"], np.where(in_target, p["gain_centering"], p["gain_changing"]))
+        steer = np.where(active, np.clip(angle * gain, -p["steer_limit"], p["steer_limit"]), steer)
+
+        initial = np.maximum(to_v, 1e-6)
+        duration = np.where(in_target & (lateral < w * 0.3), p["stop_duration_in_lane"], p["stop_duration_changing"])
+        target = np.maximum(0.0, initial - initial / duration * (t - to_t))
+        throttle = np.where(active, np.where(speed > target + 2, 0.0, np.where(speed < target - 2, 0.2, 0.1)), throttle)
+        brake = np.where(active & (speed > target + 2), np.minimum(1.0, (speed - target) / 50.0),
+                         np.where(active, 0.0, brake))
+
+        # takeover_planner: quintic lane change + stopping profile, Stanley on the front axle
+        fx = x + FRONT_AXLE * np.cos(yaw)
+        fy = y + FRONT_AXLE * np.sin(yaw)
+        u = np.clip((fx - to_x) / change, 0.0, 1.0)
+        path_y = to_y + (y_target - to_y) * u**3 * (10.0 - 15.0 * u + 6.0 * u * u)
+        path_yaw = np.arctan((y_target - to_y) * 30.0 * u * u * (1.0 - u)**2 / change)
+        heading = np.arctan2(np.sin(path_yaw - yaw), np.cos(path_yaw - yaw))
+        angle = heading + np.arctan2(p["stanley_gain"] * (path_y - fy), p["stanley_softening"] + v)
+        steer = np.where(planned, np.clip(angle / MAX_STEER, -p["steer_limit"], p["steer_limit"]), steer)
+
+        v0 = np.maximum(to_v / 3.6, 0.1)
+        a_change = v0 / p["stop_duration_changing"]
+        a_stop = v0 / p["stop_duration_in_lane"]
+        length = change + np.maximum(0.0, v0 * v0 - 2.0 * a_change * change) / (2.0 * a_stop) + PATH_SAMPLE
+        along = np.maximum(fx - to_x, 0.0)
+        v_sq = v0 * v0 - 2.0 * a_change * np.minimum(along, change) - 2.0 * a_stop * np.maximum(along - change, 0.0)
+        planned_v = np.minimum(np.sqrt(np.clip(v_sq, 0.0, None)),
+                               np.sqrt(2.0 * a_stop * np.maximum(length - along, 0.0)))
+        target = planned_v * 3.6
+        stopped = planned_v <= 0.0
+        throttle = np.where(planned, np.where(stopped | (speed > target + 2), 0.0,
+                                              np.where(speed < target - 2, 0.2, 0.1)), throttle)
+        brake = np.where(planned & stopped, np.maximum(p["hold_brake"], np.minimum(1.0, speed / 50.0)),
+                         np.where(planned & (speed > target + 2), np.minimum(1.0, (speed - target) / 50.0),
+                                  np.where(planned, 0.0, brake)))
+        active = active | planned
+
+        a = _accel(v, throttle, brake)
+        v_new = np.maximum(0.0, v + a * dt)
+        curvature = np.tan(steer * MAX_STEER) / WHEELBASE
+        m["peak_decel"] = np.maximum(m["peak_decel"], np.where(active, (v - v_new) / dt, 0.0))
+        m["peak_lateral_accel"] = np.maximum(m["peak_lateral_accel"], np.abs(v_new * v_new * curvature))
+        v = v_new
+        yaw += v * curvature * dt
+        x += v * np.cos(yaw) * dt
+        y += v * np.sin(yaw) * dt
+
+        # obstacle sits in the starting lane; it only matters while we are still in it
+        in_start_lane = np.abs(y) < w * 0.5
+        gap = p["hazard_distance"] - (x - warn_x)
+        tracked = active & in_start_lane
+        m["min_gap"] = np.where(tracked, np.minimum(m["min_gap"], gap), m["min_gap"])
+        _record_stop(m, active & (v < STOP_SPEED), t, x, to_x, to_t)
+
+    m["min_gap"][~m["takeover"]] = np.nan
+    return m
+
+
+def _simulate_oncoming(p, rt, dt=DT, horizon=20.0):
+    # scenario 6 has no OK window; response times are ignored
+    n = rt.shape[0]
+    m = _new_metrics(n)
+    ex, ey, eyaw, ev = np.zeros(n), np.zeros(n), np.zeros(n), np.zeros(n)
+    nx = np.full(n, p["npc_start_gap"])
+    ny = np.full(n, -p["lane_offset"])
+    nyaw = np.full(n, math.pi)
+    nv = np.full(n, p["npc_speed"])
+    drift = np.zeros(n, dtype=bool)
+    evade_t = np.full(n, np.nan)
+
+    for k in range(int(horizon / dt)):
+        t = k * dt
+        speed = ev * 3.6
+        dist = np.hypot(nx - ex, ny - ey)
+
+        drift |= dist < p["drift_distance"]
+        m["takeover"] |= dist < p["warning_distance"]
+        evade_t = np.where((dist < p["evade_distance"]) & np.isnan(evade_t), t, evade_t)
+
+        throttle = np.where(speed < p["cruise_speed"], 0.55, 0.0)
+        steer = np.zeros(n)
+        since = t - evade_t
+        evading = since <= 1.0
+        returning = (since > 1.0) & (since <= 2.0)
+        steer = np.where(evading, p["evade_steer"], np.where(returning, p["return_steer"], steer))
+        throttle = np.where(evading, 0.40, np.where(returning, 0.45, throttle))
+
+        e_a = _accel(ev, throttle, 0.0)
+        ev = np.maximum(0.0, ev + e_a * dt)
+        e_curv = np.tan(steer * MAX_STEER) / WHEELBASE
+        m["peak_lateral_accel"] = np.maximum(m["peak_lateral_accel"], np.abs(ev * ev * e_curv))
+        eyaw += ev * e_curv * dt
+        ex += ev * np.cos(eyaw) * dt
+        ey += ev * np.sin(eyaw) * dt
+
+        n_a = _accel(nv, np.where(drift, 0.5, 0.0), 0.0)
+        nv = np.maximum(0.0, nv + n_a * dt)
+        nyaw += nv * np.tan(np.where(drift, p["npc_drift_steer"], 0.0) * MAX_STEER) / WHEELBASE * dt
+        nx += nv * np.cos(nyaw) * dt
+        ny += nv * np.sin(nyaw) * dt
+
+        m["min_gap"] = np.minimum(m["min_gap"], np.hypot(nx - ex, ny - ey))
+
+    return m
+
+
+SIMULATORS = {
+    "urban_stop": _simulate_urban_stop,
+    "highway_shoulder": _simulate_highway_shoulder,
+    "red_light": _simulate_red_light,
+    "oncoming": _simulate_oncoming,
+}
+
+
+# ---------------------------------------------------------
+# Sweep Driver
+# ---------------------------------------------------------
+def _combinations(scenario, grid):
+    defaults = SCENARIOS[scenario]
+    unknown = set(grid) - set(defaults)
+    if unknown:
+        raise ValueError(f"Unknown parameters for {scenario}: {sorted(unknown)}")
+    names = list(grid)
+    combos = []
+    for values in itertools.product(*(grid[k] for k in names)):
+        combo = dict(defaults)
+        combo.update(zip(names, values))
+        combos.append(combo)
+    return names, combos
+
+
+def _summarize(m, gap_known=True):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        gap = m["min_gap"]
+        summary = {
+            "ok_rate": float(np.mean(m["responded"])),
+            "takeover_rate": float(np.mean(m["takeover"])),
+            "stop_dist_mean": float(np.nanmean(m["stopping_distance"])),
+            "stop_dist_p95": float(np.nanpercentile(m["stopping_distance"], 95)),
+            "stop_time_mean": float(np.nanmean(m["stop_time"])),
+            "peak_decel_mean": float(np.mean(m["peak_decel"])),
+            "peak_decel_max": float(np.max(m["peak_decel"])),
+            "min_gap_p5": float(np.nanpercentile(gap, 5)),
+            "min_gap_min": float(np.nanmin(gap)),
+            "collision_rate": float(np.mean(gap[~np.isnan(gap)] <= 0.0)) if np.any(~np.isnan(gap)) else 0.0,
+            "peak_lat_accel_max": float(np.max(m["peak_lateral_accel"])),
+        }
+    if not gap_known:
+        for key in GAP_SUMMARY:
+            del summary[key]
+    return summary
+
+
+def run_sweep(scenario, grid=None, samples=1000, response="lognormal:1.2,0.5", seed=0, dt=DT):
+    """
+    Evaluate every combination in `grid` ({param: [values]}) against
+    `samples` drivers drawn from `response`. Returns one dict per
+    combination with the swept parameters and aggregated metrics; the
+    gap metrics only where hazard_distance is known.
+    """
+    if scenario not in SIMULATORS:
+        raise ValueError(f"Unknown scenario '{scenario}'. Choose from {sorted(SIMULATORS)}")
+
+    names, combos = _combinations(scenario, grid or {})
+    rng = np.random.default_rng(seed)
+    rows = []
+
+    per_chunk = max(1, CHUNK_SIZE // samples)
+    for c0 in range(0, len(combos), per_chunk):
+        batch = combos[c0:c0 + per_chunk]
+        n = len(batch) * samples
+
+        # one array per parameter, each combination repeated `samples` times
+        params = {k: np.repeat(np.array([c[k] for c in batch], dtype=float), samples) for k in batch[0]}
+        rt = sample_response_times(response, n, rng)
+        metrics = SIMULATORS[scenario](params, rt, dt=dt)
+
+        for i, combo in enumerate(batch):
+            sl = slice(i * samples, (i + 1) * samples)
+            row = {k: combo[k] for k in names}
+            row["samples"] = samples
+            gap_known = not math.isnan(combo.get("hazard_distance", 0.0))
+            row.update(_summarize({k: v[sl] for k, v in metrics.items()}, gap_known))
+            rows.append(row)
+
+    return rows
+
+
+def write_rows(rows, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _parse_grid(items):
+    grid = {}
+    for item in items or []:
+        name, _, values = item.partition("=")
+        grid[name] = [float(v) for v in values.split(",")]
+    return grid
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Monte Carlo sweep of takeover parameters.")
+    parser.add_argument("scenario", choices=sorted(SIMULATORS))
+    parser.add_argument("--grid", nargs="*", help="param=v1,v2,... (see SCENARIOS for names)")
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--response", default="lognormal:1.2,0.5")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the table to this CSV file")
+    args = parser.parse_args()
+
+    start = time.time()
+    rows = run_sweep(args.scenario, _parse_grid(args.grid), args.samples, args.response, args.seed)
+    elapsed = time.time() - start
+
+    for row in rows:
+        print(", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+    print(f"\n{len(rows)} combinations x {args.samples} drivers in {elapsed:.2f} s")
+
+    if args.out:
+        write_rows(rows, args.out)
+        print(f"Saved to {args.out}")
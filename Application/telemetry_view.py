@@ -0,0 +1,112 @@
+import csv
+
+import numpy as np
+
+# ---------------------------------------------------------
+# Telemetry Loading, Downsampling and Paging
+# ---------------------------------------------------------
+# Helpers behind step 5 of dashboard.py. The dashboard wraps load_controls
+# and plot_series in st.cache_data, so a run's controls.csv is parsed once
+# and every rerun only ships ~PLOT_POINTS points per chart and one page of
+# table rows to the browser.
+
+NUMERIC_COLUMNS = ["time", "steer", "throttle", "brake", "speed_kmh"]
+PLOT_POINTS = 1500
+PAGE_SIZES = [50, 100, 250, 500]
+
+
+def load_controls(csv_path):
+    """
+    controls.csv -> {column: numpy array}. "time" is made relative to the
+    first row; "driver_state" stays a string array.
+    """
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+
+    columns = {}
+    for i, name in enumerate(header):
+        values = [row[i] for row in rows]
+        if name in NUMERIC_COLUMNS:
+            columns[name] = np.asarray(values, dtype=np.float64)
+        else:
+            columns[name] = np.asarray(values, dtype=object)
+
+    if "time" in columns and len(columns["time"]):
+        columns["time"] = columns["time"] - columns["time"][0]
+    return columns
+
+
+# ---------------------------------------------------------
+# Largest-Triangle-Three-Buckets
+# ---------------------------------------------------------
+def lttb_indices(x, y, n_out):
+    """
+    Indices of the n_out points LTTB keeps: the first and last point, plus
+    the point in each bucket forming the largest triangle with the point
+    kept before it and the mean of the next bucket. Peaks and steps
+    survive, unlike with plain striding.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i + 1], edges[i + 2]
+        else:
+            next_lo, next_hi = n - 1, n
+        cx = x[next_lo:next_hi].mean()
+        cy = y[next_lo:next_hi].mean()
+
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+
+    return keep
+
+
+def plot_series(data, columns, n_out=PLOT_POINTS):
+    """
+    {"time": ..., column: ...} downsampled for one chart. Each column keeps
+    its own LTTB points and the chart uses their union, so every series is
+    exact at every plotted time.
+    """
+    t = data["time"]
+    keep = np.unique(np.concatenate([lttb_indices(t, data[c], n_out) for c in columns]))
+    out = {"time": t[keep]}
+    for c in columns:
+        out[c] = data[c][keep]
+    return out
+
+
+# ---------------------------------------------------------
+# Table Paging
+# ---------------------------------------------------------
+def page_count(data, page_size):
+    rows = len(next(iter(data.values()))) if data else 0
+    return max(1, -(-rows // page_size))
+
+
+def table_page(data, page, page_size):
+    """Rows [page * page_size, (page + 1) * page_size) as {column: list}."""
+    start = page * page_size
+    return {name: values[start:start + page_size].tolist() for name, values in data.items()}
+
+
+def summary(data):
+    """min / mean / max per numeric column, for the header metrics."""
+    out = {}
+    for name in NUMERIC_COLUMNS:
+        if name in data and len(data[name]):
+            v = data[name]
+            out[name] = {"min": float(v.min()), "mean": float(v.mean()), "max": float(v.max())}
+    return out
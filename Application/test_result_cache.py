@@ -0,0 +1,39 @@
+import pytest
+
+import kinematic_carla
+
+kinematic_carla.install()             # fingerprint() imports traffic, which imports carla
+
+from result_cache import fingerprint
+
+# ---------------------------------------------------------
+# Fingerprint Keys
+# ---------------------------------------------------------
+# The cache hands back an earlier run whenever the keys match, so two runs
+# with different driver inputs must never share a key.
+
+CASE = (2, "Town04", "critical drowsiness")
+
+
+def key(inputs):
+    return fingerprint(*CASE, inputs=inputs)[0]
+
+
+def test_different_scripts_give_different_keys():
+    keys = {key(None), key([(3.0, "ok")]), key([(4.0, "ok")]), key([(3.0, "ok"), (6.0, "ok")])}
+    assert len(keys) == 4
+
+
+def test_same_inputs_give_same_key(tmp_path):
+    script = tmp_path / "inputs.csv"
+    script.write_text("t,name\n6,ok\n3.0,ok\n")
+    assert key([(3.0, "ok"), (6.0, "ok")]) == key([(6, "ok"), (3, "ok")])
+    assert key([[3.0, "ok"], [6.0, "ok"]]) == key(str(script))
+    assert key(None) == key(None)
+
+
+def test_unknown_inputs_are_rejected():
+    from driver_input import DriverInput
+
+    with pytest.raises(TypeError):
+        fingerprint(*CASE, inputs=DriverInput())
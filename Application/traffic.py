@@ -0,0 +1,169 @@
+import os
+import random
+
+import carla
+
+# ---------------------------------------------------------
+# Background Traffic
+# ---------------------------------------------------------
+# TrafficLayer fills the town around a scenario with N autopilot vehicles
+# and M walkers. Everything is spawned through the run's ActorRegistry
+# in a few apply_batch_sync calls: vehicles with SetAutopilot chained in
+# the same batch, then the walkers, then one controller.ai.walker per
+# walker. So the traffic goes away with the ego in the registry's
+# single destroy batch. The Traffic Manager runs in synchronous mode with
+# a fixed seed (as do walker destinations), so a scenario with traffic is
+# repeatable.
+#
+#     traffic = TrafficLayer(client, world, registry, tm_port)
+#     traffic.spawn(vehicles=100, walkers=50, avoid=[spawn_point.location])
+#     ... run ...
+#     traffic.stop()                 # walker controllers, before destroy_all
+#
+# run_scenario(..., traffic=100) or traffic=(100, 50) does this for a run;
+# CARLA_TRAFFIC="100,50" sets a default. When the map's spawn points run
+# out, extra vehicles are placed on driving-lane waypoints away from
+# junctions. benchmark_loop.py --traffic 0 50 100 200 300 measures how
+# the loop scales.
+
+TRAFFIC_SEED = int(os.environ.get("CARLA_TRAFFIC_SEED", "42"))
+FIXED_DELTA = 0.05               # s; synchronous step while traffic runs
+EGO_CLEARANCE = 25.0             # m kept free around the ego / scenario NPC spawns
+EXTRA_SPACING = 12.0             # m between waypoint spawns beyond the spawn points
+SPAWN_LIFT = 0.3                 # m above the waypoint, so vehicles do not spawn into the road
+WALK_SPEED = 1.4                 # m/s
+RUN_SPEED = 3.0
+RUNNERS = 0.1                    # share of walkers that run
+CROSSING = 0.05                  # share of walkers that cross roads
+
+
+def parse_traffic(traffic):
+    """(vehicles, walkers) from None, N, (N, M), {"vehicles": N, "walkers": M} or "N,M"."""
+    if traffic is None:
+        traffic = os.environ.get("CARLA_TRAFFIC") or 0
+    if isinstance(traffic, str):
+        traffic = [int(v) for v in traffic.split(",") if v.strip()]
+    if isinstance(traffic, dict):
+        return int(traffic.get("vehicles", 0)), int(traffic.get("walkers", 0))
+    if isinstance(traffic, (list, tuple)):
+        return (int(traffic[0]) if traffic else 0), (int(traffic[1]) if len(traffic) > 1 else 0)
+    return int(traffic), 0
+
+
+class TrafficLayer:
+    def __init__(self, client, world, registry, tm_port=8000, seed=TRAFFIC_SEED):
+        self.client = client
+        self.world = world
+        self.registry = registry
+        self.tm_port = tm_port
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.vehicle_ids = []
+        self.walker_ids = []
+        self.controllers = []
+
+    # -----------------------------------------------------
+    # Setup
+    # -----------------------------------------------------
+    def enable_sync(self):
+        settings = self.world.get_settings()
+        if not settings.synchronous_mode or settings.fixed_delta_seconds != FIXED_DELTA:
+            settings.synchronous_mode = True
+            settings.fixed_delta_seconds = FIXED_DELTA
+            self.world.apply_settings(settings)
+
+        tm = self.client.get_trafficmanager(self.tm_port)
+        tm.set_synchronous_mode(True)
+        tm.set_random_device_seed(self.seed)
+        if hasattr(self.world, "set_pedestrians_seed"):
+            self.world.set_pedestrians_seed(self.seed)
+
+    def _clear(self, location, avoid):
+        return all(location.distance(a) > EGO_CLEARANCE for a in avoid)
+
+    def vehicle_spawns(self, count, avoid=()):
+        """Up to count transforms: shuffled spawn points first, then lane waypoints."""
+        carla_map = self.world.get_map()
+        points = [p for p in carla_map.get_spawn_points() if self._clear(p.location, avoid)]
+        self.rng.shuffle(points)
+        if len(points) >= count:
+            return points[:count]
+
+        extra = []
+        for wp in carla_map.generate_waypoints(EXTRA_SPACING):
+            loc = wp.transform.location
+            if wp.lane_type != carla.LaneType.Driving or wp.is_junction or not self._clear(loc, avoid):
+                continue
+            extra.append(carla.Transform(carla.Location(x=loc.x, y=loc.y, z=loc.z + SPAWN_LIFT),
+                                         wp.transform.rotation))
+        self.rng.shuffle(extra)
+        return points + extra[:count - len(points)]
+
+    # -----------------------------------------------------
+    # Spawning
+    # -----------------------------------------------------
+    def spawn(self, vehicles=0, walkers=0, avoid=()):
+        """Spawn the traffic; returns (vehicles spawned, walkers spawned)."""
+        if vehicles <= 0 and walkers <= 0:
+            return 0, 0
+        self.enable_sync()
+        bp_lib = self.world.get_blueprint_library()
+
+        if vehicles > 0:
+            blueprints = [bp for bp in bp_lib.filter("vehicle.*")
+                          if not bp.has_attribute("number_of_wheels")
+                          or bp.get_attribute("number_of_wheels").as_int() == 4]
+            batch = []
+            for transform in self.vehicle_spawns(vehicles, avoid):
+                bp = self.rng.choice(blueprints)
+                if bp.has_attribute("role_name"):
+                    bp.set_attribute("role_name", "autopilot")
+                batch.append((bp, transform))
+            self.vehicle_ids = self.registry.spawn_batch(batch, autopilot=True, tm_port=self.tm_port)
+
+        if walkers > 0:
+            self._spawn_walkers(walkers, bp_lib)
+
+        print(f"Traffic: {len(self.vehicle_ids)} of {vehicles} vehicles, "
+              f"{len(self.walker_ids)} of {walkers} walkers (seed {self.seed})")
+        return len(self.vehicle_ids), len(self.walker_ids)
+
+    def _spawn_walkers(self, count, bp_lib):
+        walker_bps = list(bp_lib.filter("walker.pedestrian.*"))
+        batch, speeds = [], []
+        for _ in range(count * 2):           # navigation sometimes has no point to give
+            if len(batch) == count:
+                break
+            location = self.world.get_random_location_from_navigation()
+            if location is None:
+                continue
+            bp = self.rng.choice(walker_bps)
+            if bp.has_attribute("is_invincible"):
+                bp.set_attribute("is_invincible", "false")
+            batch.append((bp, carla.Transform(location)))
+            speeds.append(RUN_SPEED if self.rng.random() < RUNNERS else WALK_SPEED)
+        self.walker_ids = self.registry.spawn_batch(batch)
+
+        controller_bp = bp_lib.find("controller.ai.walker")
+        controller_ids = self.registry.spawn_batch(
+            [(controller_bp, carla.Transform(), walker_id) for walker_id in self.walker_ids])
+        self.world.tick()                    # controllers exist on the server after one tick
+
+        self.world.set_pedestrians_cross_factor(CROSSING)
+        self.controllers = list(self.world.get_actors(controller_ids))
+        for controller, speed in zip(self.controllers, speeds):
+            controller.start()
+            controller.go_to_location(self.world.get_random_location_from_navigation())
+            controller.set_max_speed(speed)
+
+    def stop(self):
+        """Stop the walker controllers; destroying is left to the registry."""
+        for controller in self.controllers:
+            try:
+                controller.stop()
+            except RuntimeError:
+                pass                         # already gone with the world
+        self.controllers = []
+
+    def info(self):
+        return {"vehicles": len(self.vehicle_ids), "walkers": len(self.walker_ids), "seed": self.seed}
@@ -0,0 +1,138 @@
+import carla
+
+# ---------------------------------------------------------
+# Traffic-Light Index
+# ---------------------------------------------------------
+# TrafficLightIndex is built once per world; index_for() keeps it while
+# prepare_world reuses the loaded town. For every light it stores the
+# junction it guards, its group (the lights that cycle together at that
+# junction) and its stop waypoints, keyed by (road_id, lane_id).
+# Changing lights is then scoped to the ego's route: route_lights() walks
+# the ego's lane ahead and picks the lights whose stop line it crosses,
+# without listing every actor in the world, and set_state() changes those
+# lights in one pass, skipping any that are already frozen in the
+# requested state.
+#
+#     lights = index_for(world)
+#     lights.set_route_state(vehicle, "green")        # at load
+#     lights.set_route_state(vehicle, "red", count=1) # scenario 5, mid-run
+#
+# carla.command has no traffic-light command, so a "batch" here is one
+# pass over the few lights that actually change; state and frozen flag are
+# read from the client's snapshot, not the server.
+
+ROUTE_LOOKAHEAD = 400.0    # m; about a scenario's 20 s at cruise speed
+ROUTE_STEP = 5.0           # m between route waypoints
+JUNCTION_SEARCH = 30.0     # m past a stop line to look for its junction
+
+STATE_MAP = {
+    "green": carla.TrafficLightState.Green,
+    "red": carla.TrafficLightState.Red,
+    "yellow": carla.TrafficLightState.Yellow,
+}
+
+
+def _junction_of(waypoint):
+    """Junction a stop waypoint leads into, or -1 if none within JUNCTION_SEARCH."""
+    wp, travelled = waypoint, 0.0
+    while wp is not None and travelled <= JUNCTION_SEARCH:
+        if wp.is_junction:
+            return wp.junction_id
+        nxt = wp.next(2.0)
+        wp = nxt[0] if nxt else None
+        travelled += 2.0
+    return -1
+
+
+class TrafficLightIndex:
+    def __init__(self, world):
+        self.world = world
+        self.map = world.get_map()
+        self.lights = {}          # id -> carla.TrafficLight
+        self.junction = {}        # id -> junction id (-1 if unknown)
+        self.group = {}           # id -> tuple of light ids in the same group
+        self.stop_waypoints = {}  # id -> [carla.Waypoint]
+        self._by_lane = {}        # (road_id, lane_id) -> [(s, light id)]
+
+        for tl in world.get_actors().filter("*traffic_light*"):
+            self.lights[tl.id] = tl
+            self.group[tl.id] = tuple(sorted(g.id for g in tl.get_group_traffic_lights()))
+            stops = tl.get_stop_waypoints()
+            self.stop_waypoints[tl.id] = stops
+            self.junction[tl.id] = _junction_of(stops[0]) if stops else -1
+            for wp in stops:
+                self._by_lane.setdefault((wp.road_id, wp.lane_id), []).append((wp.s, tl.id))
+
+    def __len__(self):
+        return len(self.lights)
+
+    def at_junction(self, junction_id):
+        return [i for i, j in self.junction.items() if j == junction_id]
+
+    # -----------------------------------------------------
+    # Route Lookup
+    # -----------------------------------------------------
+    def route_lights(self, location, distance=ROUTE_LOOKAHEAD, count=None, step=ROUTE_STEP):
+        """
+        Ids of the lights whose stop line lies on the lane ahead of
+        location (a carla.Location or anything with get_location), nearest
+        first, stopping after count lights if given. At a fork the straightest
+        continuation is followed.
+        """
+        if not self._by_lane:
+            return []
+        if hasattr(location, "get_location"):
+            location = location.get_location()
+        wp = self.map.get_waypoint(location)
+        found = []
+        travelled = 0.0
+        while wp is not None and travelled <= distance and (count is None or len(found) < count):
+            for s, light_id in self._by_lane.get((wp.road_id, wp.lane_id), ()):
+                if abs(s - wp.s) <= step and light_id not in found:
+                    found.append(light_id)
+            nxt = wp.next(step)
+            if not nxt:
+                break
+            yaw = wp.transform.rotation.yaw
+            wp = min(nxt, key=lambda n: abs((n.transform.rotation.yaw - yaw + 180.0) % 360.0 - 180.0))
+            travelled += step
+        return found if count is None else found[:count]
+
+    # -----------------------------------------------------
+    # State Changes
+    # -----------------------------------------------------
+    def set_state(self, light_ids, state, freeze=True):
+        """Set and freeze the given lights; returns how many actually changed."""
+        if state.lower() not in STATE_MAP:
+            print(f"Invalid state '{state}'. Use 'green', 'red', or 'yellow'")
+            return 0
+        target = STATE_MAP[state.lower()]
+
+        changed = 0
+        for light_id in light_ids:
+            tl = self.lights[light_id]
+            if tl.state == target and tl.is_frozen() == freeze:
+                continue
+            tl.set_state(target)
+            tl.freeze(freeze)
+            changed += 1
+        return changed
+
+    def set_route_state(self, location, state, distance=ROUTE_LOOKAHEAD, count=None):
+        light_ids = self.route_lights(location, distance, count)
+        changed = self.set_state(light_ids, state)
+        print(f"✅ Set {changed} of {len(light_ids)} traffic lights on the route to {state.upper()}")
+        return light_ids
+
+
+_indexes = {}                    # world.id -> TrafficLightIndex
+
+
+def index_for(world):
+    """The world's index, built on first use and kept while the world is reused."""
+    index = _indexes.get(world.id)
+    if index is None:
+        _indexes.clear()
+        index = _indexes[world.id] = TrafficLightIndex(world)
+    return index
+